@@ -0,0 +1,42 @@
+"""
+Agregados diarios para el tablero global (todos los sorteos).
+
+Tablas que se mantienen solas, sin recorrer el historial completo:
+    agg_sorteo  : boletos, monto, abonado y pagados por sorteo
+    agg_cliente : boletos, monto y abonado por cliente (para el top)
+    agg_diario  : por sorteo y día: vendidos, monto vendido, liberados,
+                  cobrado neto y cantidad de movimientos del historial
+
+boletos -> triggers por sentencia (tablas de transición) aplican el delta de
+cada INSERT/UPDATE/DELETE con un upsert por sorteo, cliente y día.
+historial -> un trigger por sentencia suma los movimientos al insertarlos,
+en la misma transacción: el tablero solo lee, nunca refresca nada.
+
+Tablas, funciones, triggers y la carga inicial son la migración 7 de
+migraciones.py (VERSION_MINIMA); aquí quedan las consultas del tablero.
+"""
+VERSION_MINIMA = 7  # Última migración de los agregados
+
+
+# ============================================================================
+#  CONSULTAS DEL TABLERO (TAMAÑO FIJO: NO DEPENDEN DE CUÁNTA HISTORIA HAY)
+# ============================================================================
+SQL_TABLERO_SORTEOS = """
+    SELECT s.id, s.nombre, s.activo, COALESCE(a.boletos, 0), COALESCE(a.monto, 0), COALESCE(a.abonado, 0), COALESCE(a.pagados, 0)
+    FROM sorteos s LEFT JOIN agg_sorteo a ON a.sorteo_id = s.id
+    ORDER BY s.activo DESC, s.id DESC
+"""
+
+SQL_TABLERO_DIAS = """
+    SELECT dia, SUM(vendidos), SUM(monto_vendido), SUM(liberados), SUM(cobrado), SUM(movimientos)
+    FROM agg_diario
+    WHERE dia >= CURRENT_DATE - %s
+    GROUP BY dia ORDER BY dia
+"""
+
+SQL_TABLERO_CLIENTES = """
+    SELECT c.nombre_completo, c.telefono, a.boletos, a.monto, a.abonado
+    FROM agg_cliente a JOIN clientes c ON c.id = a.cliente_id
+    WHERE a.boletos > 0
+    ORDER BY a.monto DESC LIMIT %s
+"""
@@ -0,0 +1,112 @@
+"""
+Almacén en disco de archivos generados (tablas JPG/PDF, Excel, ZIP de PDFs).
+
+La clave es la huella de los datos de entrada (sorteo, ocupación, variante,
+parámetros): misma clave = mismo archivo. Así un archivo dibujado una vez lo
+reusan todos los procesos de Streamlit de la máquina, y sigue ahí después de
+reiniciar.
+    - escritura atómica: archivo temporal en la misma carpeta + os.replace
+      (nadie lee un archivo a medio escribir, aunque dos procesos lo generen a la vez)
+    - lectura con mmap: las páginas las comparte el sistema entre procesos
+    - tamaño acotado: al pasarse de max_bytes se borran los menos usados
+      (leer un archivo actualiza su fecha de modificación). El total se lleva
+      sumando lo que se escribe; la carpeta solo se recorre al arrancar y al
+      pasarse del límite (ahí se recuenta, con lo que escribieron los demás procesos)
+"""
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+
+
+class AlmacenArtefactos:
+    def __init__(self, ruta, max_bytes=512 * 1024 * 1024):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self._candado = threading.Lock()
+        os.makedirs(ruta, exist_ok=True)
+        self._total = self.tamano_total()
+
+    def _archivo(self, clave):
+        # Nombre = sha1 de la clave (cualquier texto sirve de clave, sin tocar rutas);
+        # dos niveles (ab/abcdef...) para no juntar miles de archivos en una carpeta
+        nombre = hashlib.sha1(clave.encode("utf-8")).hexdigest()
+        return os.path.join(self.ruta, nombre[:2], nombre)
+
+    def contiene(self, clave):
+        return os.path.exists(self._archivo(clave))
+
+    def leer(self, clave):
+        """Contenido como memoryview (mmap de solo lectura) o None si no está"""
+        ruta = self._archivo(clave)
+        try:
+            with open(ruta, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0: return memoryview(b"")
+                mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(ruta)  # Recién usado: último en salir al desalojar
+        except FileNotFoundError:
+            return None  # No existe (o otro proceso lo acaba de desalojar)
+        return memoryview(mapa)
+
+    def guardar(self, clave, datos):
+        """Escribe el archivo de forma atómica y desaloja lo viejo si hace falta"""
+        ruta = self._archivo(clave)
+        carpeta = os.path.dirname(ruta)
+        os.makedirs(carpeta, exist_ok=True)
+        try: anterior = os.path.getsize(ruta)  # Misma clave: se reemplaza, no se suma dos veces
+        except FileNotFoundError: anterior = 0
+        fd, temporal = tempfile.mkstemp(dir=carpeta, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(datos)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, ruta)
+        except BaseException:
+            try: os.unlink(temporal)
+            except FileNotFoundError: pass
+            raise
+        with self._candado:
+            self._total += len(datos) - anterior
+            if self._total <= self.max_bytes: return
+        self.desalojar()
+
+    def obtener_o_generar(self, clave, generar):
+        """Lo guardado si ya está; si no, generar() -> bytes (None = no se guarda nada)"""
+        datos = self.leer(clave)
+        if datos is not None: return datos
+        datos = generar()
+        if datos is None: return None
+        self.guardar(clave, datos)
+        return self.leer(clave) or memoryview(datos)
+
+    def _archivos(self):
+        """[(mtime, tamaño, ruta)] de todo lo guardado (los temporales no cuentan)"""
+        filas = []
+        for sub in os.scandir(self.ruta):
+            if not sub.is_dir(): continue
+            for a in os.scandir(sub.path):
+                if a.name.startswith(".tmp-"): continue
+                try: st = a.stat()
+                except FileNotFoundError: continue
+                filas.append((st.st_mtime, st.st_size, a.path))
+        return filas
+
+    def tamano_total(self):
+        return sum(f[1] for f in self._archivos())
+
+    def desalojar(self):
+        """Recuenta la carpeta y borra los menos usados hasta quedar bajo max_bytes. Devuelve cuántos borró"""
+        with self._candado:
+            archivos = self._archivos()
+            total = sum(f[1] for f in archivos)
+            borrados = 0
+            for _mtime, tamano, ruta in sorted(archivos):
+                if total <= self.max_bytes: break
+                try: os.unlink(ruta)
+                except FileNotFoundError: pass  # Otro proceso ya lo borró
+                total -= tamano
+                borrados += 1
+            self._total = total
+            return borrados
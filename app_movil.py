@@ -4,57 +4,289 @@ import io
 import os
 import time
 import math
+import re
+import json
+import functools
+import itertools
+import importlib
+import bisect
+import threading
+import hashlib
+import zipfile
 import urllib.parse
-import pandas as pd
+import streamlit.components.v1 as components
+from streamlit.errors import StreamlitAPIException
 from datetime import datetime
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from PIL import Image, ImageDraw, ImageFont
+from trabajos import GestorTrabajos
+from almacen_artefactos import AlmacenArtefactos
+from cola_offline import ColaOffline
+from sentencias import SQL, RegistroSentencias, Sentencia
+import auditoria
+from auditoria import SQL_INSERTAR_HISTORIAL
+import agregados
+import caja_rapida
+import reporte_cobranza
+import importar_clientes
+import migraciones
 
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(page_title="Sorteos Milán Móvil", page_icon="🎫", layout="centered")
 
+# ============================================================================
+#  PERFILADO POR RERUN (OPCIONAL, PANEL DE DEPURACIÓN)
+# ============================================================================
+# None = perfilado apagado (costo: una comparación por llamada).
+# main() lo reinicia en cada rerun cuando el panel está activo (y fragmento() en
+# los reruns de un solo fragmento).
+_PERFIL = None
+_RERUN_COMPLETO = False  # main() está corriendo: los fragmentos van dentro de su perfil
+PERFIL_LOG = os.environ.get("SORTEOS_PERFIL_LOG", "perfil_movil.jsonl")
+
+def _etiqueta_sql(query):
+    if isinstance(query, Sentencia): return f"sql: [{query.nombre}]"
+    return "sql: " + " ".join(str(query).split())[:70]
+
+def medir(etiqueta, por_consulta=False):
+    """Decorador: acumula tiempo, llamadas y filas en _PERFIL si está activo"""
+    def decorador(fn):
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            if _PERFIL is None:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            resultado = fn(*args, **kwargs)
+            ms = (time.perf_counter() - t0) * 1000
+            clave = _etiqueta_sql(args[0] if args else kwargs.get("query")) if por_consulta else etiqueta
+            reg = _PERFIL["metricas"].setdefault(clave, {"llamadas": 0, "ms": 0.0, "filas": 0})
+            reg["llamadas"] += 1
+            reg["ms"] += ms
+            if isinstance(resultado, list): reg["filas"] += len(resultado)
+            return resultado
+        return envoltura
+    return decorador
+
+def iniciar_perfil():
+    global _PERFIL
+    _PERFIL = {"inicio": time.perf_counter(), "metricas": {}}
+
+def cerrar_perfil(panel):
+    """Guarda el perfil del rerun (JSONL + session_state) y lo muestra en el panel (None = resumen en línea)"""
+    global _PERFIL
+    if _PERFIL is None: return
+    perfil, _PERFIL = _PERFIL, None
+    total_ms = (time.perf_counter() - perfil["inicio"]) * 1000
+    metricas = perfil["metricas"]
+    sql = [m for k, m in metricas.items() if k.startswith("sql: ")]
+    resumen = {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "total_ms": round(total_ms, 1),
+        "consultas": sum(m["llamadas"] for m in sql),
+        "ms_sql": round(sum(m["ms"] for m in sql), 1),
+        "metricas": {k: {**m, "ms": round(m["ms"], 2)} for k, m in metricas.items()},
+    }
+    st.session_state["perfil_ultimo"] = resumen
+    try:
+        with open(PERFIL_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(resumen, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+    if panel is None:
+        # Rerun de un fragmento: no puede dibujar en la barra lateral
+        st.caption(f"🐞 Fragmento: {resumen['total_ms']:,.0f} ms | 🗄️ {resumen['consultas']} consultas ({resumen['ms_sql']:,.0f} ms)")
+        return
+    with panel.container():
+        st.write("### 🐞 Rendimiento del rerun")
+        st.caption(f"⏱️ Total: {resumen['total_ms']:,.0f} ms | 🗄️ {resumen['consultas']} consultas ({resumen['ms_sql']:,.0f} ms)")
+        filas = sorted(
+            ({"Punto": k, "Llamadas": m["llamadas"], "ms": m["ms"], "Filas": m["filas"]} for k, m in resumen["metricas"].items()),
+            key=lambda f: f["ms"], reverse=True
+        )
+        st.dataframe(filas, hide_index=True, use_container_width=True)
+        sentencias = registro_sentencias().estadisticas()
+        if sentencias:
+            st.caption("📌 Sentencias preparadas (acumulado del proceso)")
+            st.dataframe(sentencias, hide_index=True, use_container_width=True)
+
+def fragmento(fn):
+    """
+    st.fragment que, cuando corre solo (sin main()), hace lo mismo que main()
+    alrededor de un rerun: abre y cierra el perfil.
+    """
+    @functools.wraps(fn)
+    def envoltura(*args, **kwargs):
+        if _RERUN_COMPLETO: return fn(*args, **kwargs)
+        if st.session_state.get("perfil_activo"): iniciar_perfil()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            cerrar_perfil(None)
+    return st.fragment(envoltura)
+
 # --- CONEXIÓN A BASE DE DATOS ---
 try:
     DB_URI = st.secrets["SUPABASE_URL"]
 except:
     DB_URI = "TU_URL_DE_SUPABASE_AQUI"
 
+# Réplica de solo lectura (opcional) para reportes y listados pesados
+try:
+    DB_REPLICA_URI = st.secrets.get("SUPABASE_REPLICA_URL") or os.environ.get("SORTEOS_REPLICA_URL")
+except:
+    DB_REPLICA_URI = os.environ.get("SORTEOS_REPLICA_URL")
+
+ESPERA_REINTENTO_BD = 15  # s sin reintentar conectar tras una caída (evita esperar el timeout en cada toque)
+PIN_PRIMARIA_S = 30       # s que las lecturas de la sesión van a la primaria después de escribir (retraso de la réplica)
+ERRORES_CONEXION = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+@st.cache_resource
+def _conexion_bd(dsn):
+    # Si falla lanza excepción: así cache_resource no guarda un None para siempre
+    conn = psycopg2.connect(dsn, connect_timeout=4)
+    if dsn != DB_URI:
+        # Réplica: sin transacciones abiertas que frenen la recuperación del standby
+        conn.set_session(readonly=True, autocommit=True)
+    return conn
+
 @st.cache_resource
-def init_connection():
+def estado_bd():
+    return {}  # {dsn: caída hasta (epoch)}
+
+def init_connection(dsn=None, avisar=True):
+    dsn = dsn or DB_URI
+    if time.time() < estado_bd().get(dsn, 0.0): return None
     try:
-        return psycopg2.connect(DB_URI, connect_timeout=10)
+        conn = _conexion_bd(dsn)
+        if conn.closed:
+            _conexion_bd.clear(dsn)
+            conn = _conexion_bd(dsn)
+        return conn
     except Exception as e:
-        st.error(f"Error conectando a BD: {e}")
+        estado_bd()[dsn] = time.time() + ESPERA_REINTENTO_BD
+        if avisar: st.error(f"Error conectando a BD: {e}")
         return None
 
-def run_query(query, params=None, fetch=True):
-    conn = init_connection()
+def marcar_bd_caida(dsn=None):
+    dsn = dsn or DB_URI
+    estado_bd()[dsn] = time.time() + ESPERA_REINTENTO_BD
+    _conexion_bd.clear(dsn)
+
+@st.cache_resource
+def registro_sentencias():
+    # SORTEOS_PREPARAR=1 solo con conexión directa o pooler en modo sesión (no en modo transacción)
+    return RegistroSentencias(preparar=os.environ.get("SORTEOS_PREPARAR") == "1")
+
+def ejecutar(cur, query, params):
+    """query puede ser texto o una Sentencia del registro (se ejecuta por nombre)"""
+    if isinstance(query, Sentencia): registro_sentencias().ejecutar(cur, query, params)
+    else: cur.execute(query, params)
+
+def _leer_en_replica(query, params):
+    """Lectura en la réplica. None = no se pudo (la consulta se repite en la primaria)"""
+    if not DB_REPLICA_URI or DB_REPLICA_URI == DB_URI: return None
+    if time.time() - st.session_state.get("ultima_escritura", 0.0) < PIN_PRIMARIA_S: return None
+    conn = init_connection(DB_REPLICA_URI, avisar=False)
     if not conn: return None
     try:
-        if conn.closed: conn = init_connection()
         with conn.cursor() as cur:
-            cur.execute(query, params)
+            ejecutar(cur, query, params)
+            return cur.fetchall()
+    except Exception:
+        # Réplica caída o consulta cancelada por conflicto de recuperación
+        if conn.closed: marcar_bd_caida(DB_REPLICA_URI)
+        return None
+
+@medir("sql", por_consulta=True)
+def run_query(query, params=None, fetch=True, cola=None, lectura=False, historial=None):
+    """
+    lectura=True: consulta que tolera datos de hace unos segundos (reportes,
+    listados); va a la réplica si hay, salvo justo después de escribir.
+    cola: para escrituras que deben sobrevivir a una caída de la BD, p. ej.
+    {'tipo': 'VENTA', 'sorteo_id': 1, 'numeros': [5], 'min_filas': 1}
+    historial: (sorteo_id, accion, detalle, monto) de esta escritura, o una lista
+    de filas; van en un solo INSERT en su misma transacción (o viajan con ella
+    en la cola offline)
+    """
+    if lectura and fetch:
+        filas = _leer_en_replica(query, params)
+        if filas is not None: return filas
+
+    conn = init_connection()
+    if not conn:
+        return encolar_escritura(query, params, cola, historial) if (cola and not fetch) else None
+    try:
+        with conn.cursor() as cur:
+            ejecutar(cur, query, params)
             if fetch:
                 return cur.fetchall()
             else:
+                # Su historial se confirma en esta misma transacción
+                auditoria.escribir(cur, historial)
                 conn.commit()
+                st.session_state["ultima_escritura"] = time.time()
                 return True
     except Exception as e:
-        conn.rollback() 
+        if conn.closed or isinstance(e, psycopg2.InterfaceError):
+            # Se perdió la conexión: la próxima vez se reconecta (o se encola)
+            marcar_bd_caida()
+            if cola and not fetch: return encolar_escritura(query, params, cola, historial)
+        else:
+            conn.rollback() 
         st.error(f"Error SQL: {e}")
         return None
-    
+
 # ============================================================================
-#  HELPER: REGISTRO DE HISTORIAL
+#  COLA OFFLINE (ESCRITURAS SIN CONEXIÓN)
 # ============================================================================
-def log_movimiento(sorteo_id, accion, detalle, monto):
-    sql = """
-        INSERT INTO historial (sorteo_id, usuario, accion, detalle, monto, fecha_hora)
-        VALUES (%s, 'MOVIL', %s, %s, %s, NOW())
-    """
-    run_query(sql, (sorteo_id, accion, detalle, monto), fetch=False)
-    
+@st.cache_resource
+def cola_offline():
+    return ColaOffline(os.environ.get("SORTEOS_COLA_OFFLINE", "cola_offline.sqlite3"))
+
+def encolar_escritura(query, params, cola, historial=None):
+    # Su historial viaja en la misma operación: se aplican juntos al volver la conexión
+    filas = auditoria.filas_historial(historial)
+    acompanantes = [(SQL_INSERTAR_HISTORIAL, auditoria.parametros(filas))] if filas else []
+    cola_offline().encolar(cola['tipo'], cola.get('sorteo_id'), cola.get('numeros'), query, params, cola.get('min_filas', 0), acompanantes)
+    st.toast("📴 Sin conexión: guardado, se enviará al volver la red", icon="⏳")
+    return True
+
+def sincronizar_cola():
+    """Reenvía lo encolado si hay conexión. Devuelve los conteos que quedan"""
+    pendientes = cola_offline().contar()
+    if pendientes.get('pendiente'):
+        conn = init_connection()
+        if conn:
+            try:
+                aplicadas, conflictos = cola_offline().reproducir(conn)
+                if aplicadas: st.toast(f"✅ {aplicadas} operaciones sincronizadas", icon="🔄")
+                if conflictos: st.toast(f"⚠️ {conflictos} operaciones en conflicto", icon="❗")
+            except ERRORES_CONEXION:
+                marcar_bd_caida()
+            pendientes = cola_offline().contar()
+    return pendientes
+
+def consulta_con_respaldo(query, params=None):
+    """Lectura de catálogo (sorteos, clientes...): sin conexión usa la última copia buena de la sesión"""
+    clave = "respaldo_" + hashlib.sha1(f"{query}|{params}".encode()).hexdigest()[:12]
+    filas = run_query(query, params, lectura=True)
+    if filas is not None:
+        st.session_state[clave] = filas
+        return filas
+    return st.session_state.get(clave)
+
+def panel_cola(pendientes):
+    """Aviso en la barra lateral con lo que falta por enviar y los conflictos"""
+    por_enviar = pendientes.get('pendiente', 0) + pendientes.get('en_progreso', 0)
+    if por_enviar:
+        st.warning(f"📴 {por_enviar} operaciones esperando conexión")
+    if pendientes.get('conflicto'):
+        with st.expander(f"❗ {pendientes['conflicto']} en conflicto"):
+            for op_id, creado, tipo, numeros, error in cola_offline().listar("conflicto"):
+                st.caption(f"{datetime.fromtimestamp(creado).strftime('%d/%m %I:%M %p')} · {tipo} {json.loads(numeros)}: {error}")
+                if st.button("Descartar", key=f"desc_op_{op_id}", use_container_width=True):
+                    cola_offline().descartar(op_id)
+                    st.rerun()
+
 # ============================================================================
 #  CONTROL DE INACTIVIDAD (10 MINUTOS)
 # ============================================================================
@@ -73,6 +305,31 @@ def verificar_inactividad():
     st.session_state['ultima_actividad'] = now
     return True
 
+# ============================================================================
+#  CAPACIDAD DEL SORTEO (FORMATO Y PAGINACIÓN)
+# ============================================================================
+BOLETOS_POR_PAGINA = 1000
+
+def formato_numero(cantidad_boletos):
+    """'{:02d}' para 100, '{:03d}' para 1000, '{:04d}' para 10000..."""
+    digitos = max(2, len(str(max(int(cantidad_boletos) - 1, 0))))
+    return "{:0%dd}" % digitos
+
+def paginas_sorteo(cantidad_boletos):
+    """Rangos de números de cada página de la tabla (1000 por página)"""
+    return [range(ini, min(ini + BOLETOS_POR_PAGINA, cantidad_boletos)) for ini in range(0, max(cantidad_boletos, 1), BOLETOS_POR_PAGINA)]
+
+def layout_grilla(cantidad_en_pagina):
+    """Columnas, filas, lienzo y fuentes de la grilla según cuántos números dibuja"""
+    if cantidad_en_pagina <= 100:
+        # 🔥 TAMAÑOS ESTÁNDAR (IGUAL A PC)
+        cols = 10
+        return {'cols': cols, 'rows': max(1, math.ceil(cantidad_en_pagina / cols)), 'base_w': 2000, 'base_h': 2500,
+                'font_title': 80, 'font_info': 40, 'font_num': 60, 'calidad': 95}
+    cols = 25
+    return {'cols': cols, 'rows': max(1, math.ceil(cantidad_en_pagina / cols)), 'base_w': 4000, 'base_h': 3000,
+            'font_title': 100, 'font_info': 50, 'font_num': 45, 'calidad': 90}
+
 # ============================================================================
 #  FUNCIONES DE APOYO Y WHATSAPP (Móvil)
 # ============================================================================
@@ -108,7 +365,7 @@ def get_whatsapp_link_exacto(telefono, boleto_num, estado, cliente_nom, sorteo_n
     elif estado == 'abonado': est_str = "ABONADO"
     elif estado == 'apartado': est_str = "APARTADO"
     
-    fmt_num = "{:02d}" if cantidad_boletos <= 100 else "{:03d}"
+    fmt_num = formato_numero(cantidad_boletos)
     num_str = fmt_num.format(boleto_num)
     texto_boleto = f"N° {num_str} ({est_str})"
     
@@ -124,46 +381,88 @@ def get_whatsapp_link_exacto(telefono, boleto_num, estado, cliente_nom, sorteo_n
     return f"https://wa.me/{tel_clean}?text={urllib.parse.quote(mensaje)}"
 
 # ============================================================================
-#  CALCULADORA DE TARIFAS
+#  TARIFAS (COMPILADAS UNA VEZ POR SORTEO)
 # ============================================================================
-def calcular_total_pagar_escala(cantidad_boletos, config_rifa):
-    tarifas = []
-    if config_rifa.get('cant_p1') and config_rifa.get('prec_p1') and int(config_rifa['cant_p1']) > 0:
-        c = int(config_rifa['cant_p1'])
-        tarifas.append((c, float(config_rifa['prec_p1']) / c))
-    if config_rifa.get('cant_p2') and config_rifa.get('prec_p2') and int(config_rifa['cant_p2']) > 0:
-        c = int(config_rifa['cant_p2'])
-        tarifas.append((c, float(config_rifa['prec_p2']) / c))
-    if config_rifa.get('cant_p3') and config_rifa.get('prec_p3') and int(config_rifa['cant_p3']) > 0:
-        c = int(config_rifa['cant_p3'])
-        tarifas.append((c, float(config_rifa['prec_p3']) / c))
-        
-    if not tarifas:
-        precio_base = float(config_rifa.get('precio_boleto') or 0)
-        return cantidad_boletos * precio_base
+# modo 'escala'   : al llegar a la cantidad de una promo, TODOS los boletos van a ese precio unitario
+# modo 'paquetes' : la combinación de paquetes (+ sueltos) más barata para el cliente
+# Se elige por sorteo con la clave de configuración modo_tarifa_sorteo_{id}
+MODOS_TARIFA = ("escala", "paquetes")
+
+def clave_tarifas(config_rifa):
+    """Lo que define el precio de un sorteo, en forma hashable (clave de las cachés)"""
+    promos = []
+    for i in (1, 2, 3):
+        cant, prec = config_rifa.get(f'cant_p{i}'), config_rifa.get(f'prec_p{i}')
+        if cant and prec and int(cant) > 0:
+            promos.append((int(cant), float(prec)))
+    modo = config_rifa.get('modo_tarifa') if config_rifa.get('modo_tarifa') in MODOS_TARIFA else "escala"
+    return float(config_rifa.get('precio_boleto') or 0), tuple(promos), modo
+
+@functools.lru_cache(maxsize=64)
+def _escalones(precio_base, promos):
+    """(umbrales ascendentes, precio unitario de cada tramo)"""
+    if not promos: return (0,), (precio_base,)
+    unitarios = {}
+    for c, p in promos: unitarios.setdefault(c, p / c)  # Con cantidades repetidas manda la primera promo
+    umbrales = sorted(unitarios)
+    # Por debajo de la promo más chica se cobra su precio unitario (la última cargada, si se repite)
+    menor = [p / c for c, p in promos if c == umbrales[0]][-1]
+    return (0,) + tuple(umbrales), (menor,) + tuple(unitarios[c] for c in umbrales)
+
+def _total_escala(cantidad, precio_base, promos):
+    umbrales, unitarios = _escalones(precio_base, promos)
+    return cantidad * unitarios[bisect.bisect_right(umbrales, cantidad) - 1]
+
+@functools.lru_cache(maxsize=32)
+def _tabla_cotizaciones(precio_base, promos, modo, hasta):
+    """Total a pagar para 0..hasta boletos (índice = cantidad)"""
+    if modo != "paquetes" or not promos:
+        return tuple(_total_escala(q, precio_base, promos) for q in range(hasta + 1))
+    # Mínimo costo para exactamente q boletos: paquetes (cant, precio) o sueltos al precio de 1
+    suelto = _total_escala(1, precio_base, promos)
+    paquetes = [(c, p) for c, p in promos if c > 1]
+    costo = [0.0] * (hasta + 1)
+    for q in range(1, hasta + 1):
+        mejor = costo[q - 1] + suelto
+        for c, p in paquetes:
+            if c <= q and costo[q - c] + p < mejor: mejor = costo[q - c] + p
+        costo[q] = mejor
+    return tuple(round(v, 2) for v in costo)
+
+def cotizar_hasta(config_rifa, n):
+    """Totales de 1..n boletos de una vez (lista: posición 0 = 1 boleto)"""
+    return list(_tabla_cotizaciones(*clave_tarifas(config_rifa), max(1, n))[1:n + 1])
 
-    tarifas.sort(key=lambda x: x[0], reverse=True)
-    precio_unitario_aplicado = None
-    
-    for cant_minima, precio_unit_promo in tarifas:
-        if cantidad_boletos >= cant_minima:
-            precio_unitario_aplicado = precio_unit_promo
-            break
-            
-    if precio_unitario_aplicado is None:
-        precio_unitario_aplicado = tarifas[-1][1]
-        
-    return cantidad_boletos * precio_unitario_aplicado
+def calcular_total_pagar_escala(cantidad_boletos, config_rifa):
+    precio_base, promos, modo = clave_tarifas(config_rifa)
+    if modo == "escala" or not promos:
+        return _total_escala(cantidad_boletos, precio_base, promos)
+    # La tabla se calcula por bloques potencia de 2: pocas entradas en caché y consulta O(1)
+    hasta = 1 << max(6, int(cantidad_boletos).bit_length())
+    return _tabla_cotizaciones(precio_base, promos, modo, hasta)[cantidad_boletos]
+
+def tabla_precios(config_rifa, resaltar=None):
+    """Filas para mostrar en la venta: las cantidades de cada promo y los alrededores de 'resaltar'"""
+    _, promos, _ = clave_tarifas(config_rifa)
+    cantidades = {1, 2, 3, 5, 10} | {c for c, _ in promos} | {c + 1 for c, _ in promos}
+    if resaltar: cantidades |= {resaltar - 1, resaltar, resaltar + 1}
+    cantidades = sorted(q for q in cantidades if q >= 1)
+    totales = cotizar_hasta(config_rifa, cantidades[-1])
+    return [
+        {"Boletos": ("👉 " if q == resaltar else "") + str(q), "Total ($)": round(totales[q - 1], 2), "Unitario ($)": round(totales[q - 1] / q, 2)}
+        for q in cantidades
+    ]
 
 # ============================================================================
 #  PDF DIGITAL (APP MÓVIL)
 # ============================================================================
+@medir("pdf_boleto")
 def generar_pdf_memoria(numero_boleto, datos_completos, config_db, cantidad_boletos=1000):
     buffer = io.BytesIO()
     rifa = config_db['rifa']
     empresa = config_db['empresa']
     
-    fmt_num = "{:02d}" if cantidad_boletos <= 100 else "{:03d}"
+    fmt_num = formato_numero(cantidad_boletos)
     num_str = fmt_num.format(numero_boleto)
     
     nom_cli = datos_completos.get('cliente', '')
@@ -182,18 +481,17 @@ def generar_pdf_memoria(numero_boleto, datos_completos, config_db, cantidad_bole
     total_h = 440 + max(0, (count_premios - 3) * 20)
     total_w = 390
     
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.utils import ImageReader
     c = canvas.Canvas(buffer, pagesize=(total_w, total_h))
     m_izq, m_der = 30, total_w - 30
     centro = total_w / 2
     y = total_h - 30
     
-    logo_files = ["logo.jpg", "logo.png", "logo.jpeg"]
-    for f in logo_files:
-        if os.path.exists(f):
-            try:
-                c.drawImage(ImageReader(f), m_izq, y-27, width=38, height=38, preserveAspectRatio=True, mask='auto')
-                break
-            except: pass
+    logo = logo_local()
+    if logo:
+        try: c.drawImage(ImageReader(io.BytesIO(logo)), m_izq, y-27, width=38, height=38, preserveAspectRatio=True, mask='auto')
+        except: pass
 
     c.setFont("Helvetica-Bold", 12)
     c.drawString(m_izq + 50, y, empresa.get('nombre', 'SORTEOS MILÁN'))
@@ -344,35 +642,48 @@ def generar_pdf_memoria(numero_boleto, datos_completos, config_db, cantidad_bole
 #  FUENTE FIJA GARANTIZADA (EN MEMORIA)
 # ============================================================================
 @st.cache_resource
-def cargar_fuente_fija(size, is_bold=False):
+def _bytes_fuente(is_bold):
+    """Descarga la fuente Roboto oficial una sola vez por variante (None si no hay red)"""
     import urllib.request
-    import io
     try:
-        # Descarga la fuente Roboto oficial directamente a la memoria RAM del servidor
         url = "https://github.com/googlefonts/roboto/raw/main/src/hinted/Roboto-Bold.ttf" if is_bold else "https://github.com/googlefonts/roboto/raw/main/src/hinted/Roboto-Regular.ttf"
         req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
         res = urllib.request.urlopen(req, timeout=5)
-        return ImageFont.truetype(io.BytesIO(res.read()), size)
+        return res.read()
     except:
-        return ImageFont.load_default()
+        return None
+
+@st.cache_resource
+def cargar_fuente_fija(size, is_bold=False):
+    from PIL import ImageFont
+    datos = _bytes_fuente(is_bold)
+    if datos is None: return ImageFont.load_default()
+    return ImageFont.truetype(io.BytesIO(datos), size)
+
+@st.cache_resource
+def logo_local():
+    """Bytes del logo (el primero que exista) o None"""
+    for f in ["logo.jpg", "logo.png", "logo.jpeg"]:
+        if os.path.exists(f):
+            with open(f, "rb") as archivo: return archivo.read()
+    return None
 
 # ============================================================================
 #  MOTOR DE REPORTES VISUALES (ACTUALIZADO A LÓGICA DE PC)
 # ============================================================================
-def generar_imagen_reporte(id_sorteo, config_completa, cantidad_boletos, tipo_img=1):
+@medir("imagen_tabla")
+def generar_imagen_reporte(id_sorteo, config_completa, cantidad_boletos, tipo_img=1, boletos_ocupados=None, pagina=0):
     """
     tipo_img: 1=Con Ocupados(Amarillo), 2=Solo Disponibles(Blancos), 3=Compacta(Agrupados)
+    boletos_ocupados: mapa {numero: estado} ya consultado (si es None se consulta aquí)
+    pagina: sorteos de más de 1000 boletos se dibujan por páginas de 1000
     """
-    if cantidad_boletos <= 100:
-        cols_img = 10; rows_img = 10
-        base_w = 2000; base_h = 2500
-        # 🔥 TAMAÑOS ESTÁNDAR (IGUAL A PC)
-        font_s_title = 80; font_s_info = 40; font_s_num = 60 
-    else:
-        cols_img = 25; rows_img = 40
-        base_w = 4000; base_h = 3000
-        # 🔥 TAMAÑOS ESTÁNDAR (IGUAL A PC)
-        font_s_title = 100; font_s_info = 50; font_s_num = 45
+    paginas = paginas_sorteo(cantidad_boletos)
+    rango_pagina = paginas[min(pagina, len(paginas) - 1)]
+    lay = layout_grilla(len(rango_pagina))
+    cols_img = lay['cols']; rows_img = lay['rows']
+    base_w = lay['base_w']; base_h = lay['base_h']
+    font_s_title = lay['font_title']; font_s_info = lay['font_info']; font_s_num = lay['font_num']
     
     margin_px = 80
     header_h = 450
@@ -381,14 +692,12 @@ def generar_imagen_reporte(id_sorteo, config_completa, cantidad_boletos, tipo_im
     cell_pw = (grid_pw / cols_img) - 4 
     cell_ph = (grid_ph / rows_img) - 4
 
-    boletos_ocupados = {}
-    ocupados_raw = run_query("SELECT numero, estado FROM boletos WHERE sorteo_id = %s", (id_sorteo,))
-    if ocupados_raw: 
-        boletos_ocupados = {row[0]: row[1] for row in ocupados_raw}
+    if boletos_ocupados is None:
+        boletos_ocupados = obtener_ocupacion(id_sorteo)
 
-    if cantidad_boletos >= 1000 and tipo_img == 3:
-        lista_mostrar = [i for i in range(cantidad_boletos) if boletos_ocupados.get(i, 'disponible') == 'disponible']
-        if not lista_mostrar: lista_mostrar = [0] 
+    if cantidad_boletos > 100 and tipo_img == 3:
+        lista_mostrar = [i for i in rango_pagina if boletos_ocupados.get(i, 'disponible') == 'disponible']
+        if not lista_mostrar: lista_mostrar = [rango_pagina.start] 
         
         filas_necesarias = math.ceil(len(lista_mostrar) / cols_img)
         alto_grid_nuevo = filas_necesarias * (cell_ph + 4)
@@ -397,10 +706,11 @@ def generar_imagen_reporte(id_sorteo, config_completa, cantidad_boletos, tipo_im
         lienzo_h = max(2500, alto_calculado)
         lienzo_w = base_w
     else:
-        lista_mostrar = list(range(cantidad_boletos))
+        lista_mostrar = rango_pagina
         lienzo_w = base_w
         lienzo_h = base_h
 
+    from PIL import Image, ImageDraw
     img = Image.new('RGB', (lienzo_w, lienzo_h), 'white')
     draw = ImageDraw.Draw(img)
 
@@ -414,6 +724,8 @@ def generar_imagen_reporte(id_sorteo, config_completa, cantidad_boletos, tipo_im
     # 3. DIBUJAR ENCABEZADO
     # ---------------------------------------------------------
     titulo = rifa['nombre'].upper()
+    if len(paginas) > 1:
+        titulo += f" ({formato_numero(cantidad_boletos).format(rango_pagina.start)}-{formato_numero(cantidad_boletos).format(rango_pagina.stop - 1)})"
     bbox_t = draw.textbbox((0,0), titulo, font=font_title)
     tw_t = bbox_t[2] - bbox_t[0]
     draw.text(((lienzo_w - tw_t)/2, 60), titulo, fill='#1a73e8', font=font_title)
@@ -458,7 +770,7 @@ def generar_imagen_reporte(id_sorteo, config_completa, cantidad_boletos, tipo_im
     # 4. DIBUJAR GRILLA (Lógica Matemática de PC)
     # ---------------------------------------------------------
     y_start = margin_px + header_h # 🔥 Restaurado a su posición original
-    fmt = "{:02d}" if cantidad_boletos <= 100 else "{:03d}"
+    fmt = formato_numero(cantidad_boletos)
 
     for idx, num_real in enumerate(lista_mostrar):
         r = idx // cols_img
@@ -492,11 +804,449 @@ def generar_imagen_reporte(id_sorteo, config_completa, cantidad_boletos, tipo_im
             draw.text((tx, ty), txt, fill='black', font=font_num)
             
     buf = io.BytesIO()
-    calidad = 95 if cantidad_boletos <= 100 else 90
-    img.save(buf, format="JPEG", quality=calidad)
+    img.save(buf, format="JPEG", quality=lay['calidad'])
     buf.seek(0)
     return buf
 
+# ============================================================================
+#  TABLA EN PDF VECTORIAL (MISMAS 3 VARIANTES QUE LA IMAGEN)
+# ============================================================================
+@medir("pdf_tabla")
+def generar_pdf_tabla(config_completa, cantidad_boletos, boletos_ocupados, tipo_img=1):
+    """
+    Misma tabla que generar_imagen_reporte pero con reportlab: texto real, nítido al
+    imprimir y de pocos KB. Sorteos grandes salen en una hoja por cada 1000 números.
+    """
+    rifa = config_completa['rifa']
+    fmt = formato_numero(cantidad_boletos)
+    lay = layout_grilla(min(cantidad_boletos, BOLETOS_POR_PAGINA))
+    escala = 0.25  # px del lienzo JPEG -> puntos PDF
+    page_w, page_h = lay['base_w'] * escala, lay['base_h'] * escala
+    margen = 80 * escala
+    header_h = 450 * escala
+    gap = 4 * escala
+    cols = lay['cols']
+    cell_w = (page_w - 2 * margen) / cols - gap
+    cell_h = (page_h - 2 * margen - header_h) / lay['rows'] - gap
+
+    if cantidad_boletos > 100 and tipo_img == 3:
+        libres = [n for n in range(cantidad_boletos) if boletos_ocupados.get(n, 'disponible') == 'disponible']
+        por_hoja = cols * lay['rows']
+        hojas = [libres[i:i + por_hoja] for i in range(0, len(libres), por_hoja)] or [[]]
+    else:
+        hojas = paginas_sorteo(cantidad_boletos)
+
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(page_w, page_h))
+    c.setTitle(rifa['nombre'])
+    for numeros in hojas:
+        # --- ENCABEZADO ---
+        titulo = rifa['nombre'].upper()
+        if len(hojas) > 1 and numeros:
+            titulo += f" ({fmt.format(numeros[0])}-{fmt.format(numeros[-1])})"
+        y = page_h - 60 * escala - lay['font_title'] * escala
+        c.setFont("Helvetica-Bold", lay['font_title'] * escala)
+        c.setFillColor("#1a73e8")
+        c.drawCentredString(page_w / 2, y, titulo)
+
+        f_info = lay['font_info'] * escala
+        iy = page_h - 180 * escala - f_info
+        c.setFont("Helvetica", f_info); c.setFillColor("#555555")
+        c.drawString(margen, iy, f"Fecha: {datetime.now().strftime('%d/%m/%Y')}")
+        iy -= 60 * escala
+        c.setFillColor("#388E3C")
+        c.drawString(margen, iy, f"Sorteo: {rifa.get('fecha_sorteo','')} {rifa.get('hora_sorteo','')}")
+        iy -= 65 * escala
+        c.setFillColor("#D32F2F"); c.drawString(margen, iy, "PRECIOS:")
+        c.setFillColor("#000000")
+        for k in (1, 2, 3):
+            if rifa.get(f'cant_p{k}') and rifa.get(f'prec_p{k}'):
+                iy -= 50 * escala
+                c.drawString(margen + 30 * escala, iy, f"• {rifa[f'cant_p{k}']} x ${float(rifa[f'prec_p{k}']):,.2f}")
+
+        px = page_w - margen - (1350 if lay['base_w'] >= 2700 else 1180) * escala
+        py = page_h - 180 * escala - f_info
+        c.setFillColor("#D32F2F"); c.drawString(px, py, "PREMIOS:")
+        c.setFillColor("#000000")
+        for k, l in zip(["premio1", "premio2", "premio3", "premio_extra1", "premio_extra2"], ["1er:", "2do:", "3er:", "Extra 1:", "Extra 2:"]):
+            val = rifa.get(k)
+            if val and val.strip():
+                py -= 50 * escala
+                c.drawString(px, py, f"{l} {val}")
+
+        # --- GRILLA ---
+        c.setLineWidth(3 * escala)
+        c.setFont("Helvetica-Bold", lay['font_num'] * escala)
+        y_top = page_h - margen - header_h
+        for idx, num_real in enumerate(numeros):
+            x = margen + (idx % cols) * (cell_w + gap)
+            y = y_top - (idx // cols + 1) * (cell_h + gap)
+            ocupado = boletos_ocupados.get(num_real, 'disponible') != 'disponible'
+            c.setFillColor("#FFFF00" if (tipo_img == 1 and ocupado) else "#FFFFFF")
+            c.rect(x, y, cell_w, cell_h, stroke=1, fill=1)
+            if tipo_img == 2 and ocupado: continue
+            c.setFillColor("#000000")
+            c.drawCentredString(x + cell_w / 2, y + cell_h / 2 - lay['font_num'] * escala * 0.35, fmt.format(num_real))
+        c.showPage()
+
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+# ============================================================================
+#  DISPONIBLES EN TEXTO (RANGOS COMPACTOS PARA WHATSAPP)
+# ============================================================================
+def obtener_ocupacion(id_sorteo, base=None):
+    """Devuelve {numero: estado} de los boletos asignados del sorteo (base: ya leída en el snapshot)"""
+    if base is None:
+        ocupados_raw = run_query(SQL["ocupacion"], (id_sorteo,))
+        base = {row[0]: row[1] for row in ocupados_raw} if ocupados_raw else {}
+    ocupacion = dict(base)
+    # Lo vendido/liberado sin conexión se refleja aunque aún no llegue a la BD
+    for n, tipo in cola_offline().numeros_pendientes(id_sorteo).items():
+        if tipo == 'VENTA': ocupacion.setdefault(n, 'apartado')
+        elif tipo == 'LIBERAR': ocupacion.pop(n, None)
+    return ocupacion
+
+def comprimir_rangos(numeros, fmt="{:03d}"):
+    """Agrupa números ordenados en tramos: [0,1,2,5,7,8] -> ['000-002', '005', '007-008']"""
+    tramos = []
+    inicio = previo = None
+    for n in numeros:
+        if previo is not None and n == previo + 1:
+            previo = n
+            continue
+        if inicio is not None:
+            tramos.append(fmt.format(inicio) if inicio == previo else f"{fmt.format(inicio)}-{fmt.format(previo)}")
+        inicio = previo = n
+    if inicio is not None:
+        tramos.append(fmt.format(inicio) if inicio == previo else f"{fmt.format(inicio)}-{fmt.format(previo)}")
+    return tramos
+
+def generar_texto_disponibles(boletos_ocupados, cantidad_boletos, nombre_sorteo="", agrupar_centenas=False, max_caracteres=900):
+    """
+    Texto de boletos disponibles con tramos compactos ("000-014, 017, 020-099").
+    Devuelve una lista de mensajes de hasta max_caracteres cada uno (para WhatsApp).
+    """
+    fmt = formato_numero(cantidad_boletos)
+    libres = [n for n in range(cantidad_boletos) if boletos_ocupados.get(n, 'disponible') == 'disponible']
+
+    if not libres:
+        lineas = ["❌ No quedan boletos disponibles."]
+    elif agrupar_centenas and cantidad_boletos > 100:
+        # libres ya viene ordenado: una sola pasada agrupando por centena
+        lineas = [f"▪️ {fmt.format(centena * 100)}: " + ", ".join(comprimir_rangos(list(bloque), fmt))
+                  for centena, bloque in itertools.groupby(libres, key=lambda n: n // 100)]
+    else:
+        lineas = [", ".join(comprimir_rangos(libres, fmt))]
+
+    encabezado = f"🎟️ *{nombre_sorteo.strip()}*\n" if nombre_sorteo else ""
+    encabezado += f"✅ Disponibles: {len(libres)} de {cantidad_boletos}\n"
+
+    # Partir en mensajes sin cortar tramos a la mitad
+    mensajes = []
+    actual = encabezado
+    for linea in lineas:
+        if len(actual) + len(linea) + 1 <= max_caracteres:
+            actual += linea + "\n"
+            continue
+        if len(linea) < max_caracteres and actual.strip() and actual != encabezado:
+            mensajes.append(actual.rstrip())
+            actual = linea + "\n"
+            continue
+        for tramo in linea.split(", "):
+            # Tras un salto de línea (encabezado o línea anterior) el tramo va sin separador
+            extra = ", " + tramo if actual and not actual.endswith("\n") else tramo
+            if actual and len(actual) + len(extra) > max_caracteres:
+                mensajes.append(actual.rstrip(", "))
+                actual = tramo
+            else:
+                actual += extra
+        actual += "\n"
+    if actual.strip():
+        mensajes.append(actual.rstrip())
+    return mensajes
+
+# ============================================================================
+#  GRILLA INTERACTIVA (SVG EN EL NAVEGADOR)
+# ============================================================================
+# Componente sin compilación: recibe solo el vector de ocupación y dibuja en el cliente
+_grilla_sorteo = components.declare_component(
+    "grilla_sorteo", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "componentes", "grilla_sorteo")
+)
+CODIGO_ESTADO = {'apartado': 'a', 'abonado': 'b', 'pagado': 'p'}
+
+def vector_ocupacion(boletos_ocupados, rango):
+    """Un carácter por boleto: '0' disponible, 'a' apartado, 'b' abonado, 'p' pagado"""
+    return "".join(CODIGO_ESTADO.get(boletos_ocupados.get(n), '0') for n in rango)
+
+def grilla_interactiva(boletos_ocupados, rango, cantidad_boletos, seleccion=(), mostrar_ocupados=True, key=None):
+    """Dibuja la grilla en el navegador. Devuelve {'numero', 't'} del último toque o None"""
+    return _grilla_sorteo(
+        ocupacion=vector_ocupacion(boletos_ocupados, rango), inicio=rango.start,
+        columnas=layout_grilla(len(rango))['cols'], digitos=len(formato_numero(cantidad_boletos).format(0)),
+        seleccion=list(seleccion), mostrar_ocupados=mostrar_ocupados, key=key, default=None
+    )
+
+# ============================================================================
+#  PARSER DE BOLETOS (RANGOS, LISTAS Y PATRONES)
+# ============================================================================
+_PATRON_BOLETOS = re.compile(
+    r"(?P<tipo>terminal(?:es)?|termina(?:n)?\s+en|serie)\s*(?P<val>\d+)"
+    r"|(?P<ini>\d+)\s*(?:-|–|\ba\b|\bal\b|\bhasta\b)\s*(?P<fin>\d+)"
+    r"|(?P<num>\d+)"
+)
+
+def parsear_boletos(texto, cantidad_boletos):
+    """
+    Convierte la entrada del vendedor en números de boleto.
+    Acepta: "01, 25", "10-50", "10 al 50", "terminal 7", "serie 300".
+    Devuelve (lista_ordenada, lista_de_entradas_invalidas).
+    """
+    numeros = set()
+    invalidos = []
+    texto = (texto or "").lower()
+    # Bloque de una serie: decenas en sorteos de 100, centenas en 1000...
+    tam_serie = max(1, cantidad_boletos // 10)
+
+    for m in _PATRON_BOLETOS.finditer(texto):
+        if m.group("tipo"):
+            val_txt = m.group("val")
+            val = int(val_txt)
+            if m.group("tipo") == "serie":
+                inicio = val * tam_serie if val < 10 and len(val_txt) == 1 else val - (val % tam_serie)
+                if inicio >= cantidad_boletos: invalidos.append(m.group(0).strip()); continue
+                numeros.update(range(inicio, min(inicio + tam_serie, cantidad_boletos)))
+            else:
+                modulo = 10 ** len(val_txt)
+                if val >= cantidad_boletos: invalidos.append(m.group(0).strip()); continue
+                numeros.update(range(val % modulo, cantidad_boletos, modulo))
+        elif m.group("ini"):
+            ini, fin = sorted((int(m.group("ini")), int(m.group("fin"))))
+            if fin >= cantidad_boletos: invalidos.append(m.group(0).strip()); continue
+            numeros.update(range(ini, fin + 1))
+        else:
+            val = int(m.group("num"))
+            if val < cantidad_boletos: numeros.add(val)
+            else: invalidos.append(m.group("num"))
+
+    # Lo que no encaja en ningún patrón también se reporta
+    sobrante = _PATRON_BOLETOS.sub(" ", texto)
+    invalidos.extend(p for p in re.split(r"[\s,;/]+", sobrante) if p)
+    return sorted(numeros), invalidos
+
+def render_tarjetas_boletos(tarjetas, columnas=4):
+    """Dibuja tarjetas (numero_txt, estado_txt, color) en un solo bloque HTML"""
+    html_cards = [
+        f"""
+        <div style="background-color: {bg}; border-radius: 10px; padding: 15px; text-align: center; color: white; box-shadow: 2px 2px 5px rgba(0,0,0,0.2);">
+            <div style="font-size: 24px; font-weight: bold; line-height: 1.2;">{num_txt}</div>
+            <div style="font-size: 14px; text-transform: uppercase; margin-top: 5px; opacity: 0.9;">{est_txt}</div>
+        </div>
+        """
+        for num_txt, est_txt, bg in tarjetas
+    ]
+    st.markdown(
+        f'<div style="display: grid; grid-template-columns: repeat({columnas}, 1fr); gap: 15px; margin-bottom: 15px;">{"".join(html_cards)}</div>',
+        unsafe_allow_html=True
+    )
+
+# ============================================================================
+#  REPORTE EXCEL Y DEUDORES DE COBRANZA
+# ============================================================================
+# El armado vive en reporte_cobranza.py (lo comparte archivo_sorteos.py); aquí solo se mide
+generar_excel_cobranza = medir("excel_cobranza")(reporte_cobranza.generar_excel_cobranza)
+
+def agrupar_deudores(raw_deudores):
+    """Agrupa (nombre, tel, numero, precio, abonado) por cliente con su deuda total"""
+    grupos = {}
+    for row in raw_deudores:
+        nom, tel, num, prec, abon = row
+        prec = float(prec or 0); abon = float(abon or 0)
+        deuda = prec - abon
+        clave = f"{nom}|{tel}"
+        if clave not in grupos:
+            grupos[clave] = {'nombre': nom, 'tel': tel, 'numeros': [], 't_deuda': 0.0}
+        grupos[clave]['numeros'].append(num)
+        grupos[clave]['t_deuda'] += deuda
+    return grupos
+
+# ============================================================================
+#  EXPORTACIONES EN SEGUNDO PLANO
+# ============================================================================
+@st.cache_resource
+def gestor_trabajos():
+    """Un pool por proceso, compartido por todas las sesiones (deduplica pedidos iguales)"""
+    return GestorTrabajos(max_hilos=2, retencion_s=900)
+
+# Subir al cambiar el dibujo de tablas/PDF/Excel: invalida lo guardado en disco
+VERSION_ARTEFACTOS = 1
+
+@st.cache_resource
+def almacen():
+    """Archivos ya generados, en disco y compartidos por todos los procesos de la máquina"""
+    max_mb = int(os.environ.get("SORTEOS_ARTEFACTOS_MB", "512"))
+    return AlmacenArtefactos(os.environ.get("SORTEOS_ARTEFACTOS", "artefactos"), max_bytes=max_mb * 1024 * 1024)
+
+def firma_datos(*partes):
+    """Huella de los datos de entrada: misma huella = mismo archivo"""
+    return hashlib.sha1(repr((VERSION_ARTEFACTOS,) + partes).encode("utf-8")).hexdigest()[:24]
+
+def artefacto(clave, generar):
+    """Lo guardado en el almacén (memoryview sobre el mmap), o generar() una sola vez y guardarlo para todos"""
+    return almacen().obtener_o_generar(clave, generar)
+
+def artefactos_guardados(clave, tipos=None):
+    """Resultado completo de un trabajo ya guardado en disco (por otro proceso o antes de reiniciar), o None"""
+    if tipos is None:
+        return almacen().leer(clave)
+    partes = {tipo: almacen().leer(f"{clave}-{tipo}") for tipo in tipos}
+    if any(d is None for d in partes.values()): return None
+    return partes
+
+def trabajo_excel_cobranza(clave, rows_estado, rows_hist, avance):
+    def _generar():
+        buffer, hay_datos = generar_excel_cobranza(rows_estado, rows_hist, avance=avance)
+        return buffer.getvalue() if hay_datos else None
+    return artefacto(clave, _generar)
+
+def trabajo_tablas_imagen(clave, config_completa, cantidad_boletos, boletos_ocupados, pagina, tipos, avance):
+    imagenes = {}
+    for i, tipo in enumerate(tipos):
+        avance(i / len(tipos), f"Dibujando tabla {i + 1} de {len(tipos)}...")
+        imagenes[tipo] = artefacto(f"{clave}-{tipo}", lambda: generar_imagen_reporte(None, config_completa, cantidad_boletos, tipo, boletos_ocupados, pagina).getvalue())
+    return imagenes
+
+def trabajo_tablas_pdf(clave, config_completa, cantidad_boletos, boletos_ocupados, tipos, avance):
+    pdfs = {}
+    for i, tipo in enumerate(tipos):
+        avance(i / len(tipos), f"PDF {i + 1} de {len(tipos)}...")
+        pdfs[tipo] = artefacto(f"{clave}-{tipo}", lambda: generar_pdf_tabla(config_completa, cantidad_boletos, boletos_ocupados, tipo).getvalue())
+    return pdfs
+
+def trabajo_pdfs_lote(clave, items_pdf, config_completa, cantidad_boletos, avance):
+    """items_pdf: [(numero, info_pdf, nombre_archivo)] -> ZIP con un PDF por boleto"""
+    def _generar():
+        zip_buf = io.BytesIO()
+        with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i, (numero, info_pdf, nombre_archivo) in enumerate(items_pdf):
+                avance(i / len(items_pdf), f"PDF {i + 1} de {len(items_pdf)}...")
+                zf.writestr(nombre_archivo, generar_pdf_memoria(numero, info_pdf, config_completa, cantidad_boletos).getvalue())
+        return zip_buf.getvalue()
+    return artefacto(clave, _generar)
+
+def mostrar_trabajo(clave, descargas, tipos=None):
+    """
+    Progreso del trabajo y, al terminar, sus botones de descarga.
+    descargas(resultado) -> [(etiqueta, datos, nombre_archivo, mime)]
+    Mientras está pendiente se refresca solo la barra de progreso (no toda la app).
+    Si el resultado ya está en el almacén en disco, los botones salen sin pedir nada.
+    """
+    trabajo = gestor_trabajos().obtener(clave)
+    if not trabajo:
+        guardado = artefactos_guardados(clave, tipos)
+        if guardado is None: return
+        botones = descargas(guardado)
+    elif trabajo.pendiente:
+        def _progreso():
+            t = gestor_trabajos().obtener(clave)
+            if t and t.pendiente:
+                st.progress(t.progreso, text=f"⏳ {t.descripcion}: {t.mensaje}")
+            else:
+                # Terminó: un solo rerun; ya no se registra este fragmento y se corta el sondeo
+                st.rerun()
+        st.fragment(_progreso, run_every=1.0)()
+        return
+    elif trabajo.estado == "error":
+        st.error(f"❌ {trabajo.descripcion}: {trabajo.error}"); return
+    elif trabajo.resultado is None:
+        st.info("No hay información para generar reporte."); return
+    else:
+        botones = descargas(trabajo.resultado)
+    for col, (etiqueta, datos, archivo, mime) in zip(st.columns(len(botones)), botones):
+        # Del mmap solo se copia al hacer clic (descarga diferida), no en cada rerun
+        if isinstance(datos, memoryview): datos = lambda d=datos: bytes(d)
+        col.download_button(etiqueta, datos, archivo, mime, use_container_width=True, key=f"dl_{clave}_{archivo}")
+
+# ============================================================================
+#  SNAPSHOT DEL SORTEO (TODO LO DE LA PANTALLA EN UNA SOLA IDA A LA BD)
+# ============================================================================
+@st.cache_resource(ttl=60)
+def version_esquema():
+    """
+    Versión del esquema en la BD (migraciones.py). La app no migra: las
+    migraciones se corren desde la línea de comandos al desplegar, así un
+    índice único o una reconstrucción nunca salen del camino de una petición.
+    Se vuelve a mirar cada minuto. Sin conexión lanza excepción (no se guarda).
+    """
+    conn = _conexion_bd(DB_URI)
+    with conn.cursor() as cur:
+        version = migraciones.version_actual(cur)
+    conn.commit()
+    return version
+
+def esquema_listo(version=3):
+    """True si la BD ya tiene la migración `version` (3 = función snapshot_sorteo)"""
+    return version_esquema() >= version
+
+def aviso_migrar(que):
+    st.warning(f"{que}: falta migrar la base de datos (`python migraciones.py --dsn ... migrar`).")
+
+def _decodificar_ocupacion(comp):
+    estados = {v: k for k, v in CODIGO_ESTADO.items()}
+    ocupacion = {n: estados.get(c) for n, c in zip(comp['numeros'], comp['estados'])}
+    ocupacion.update({int(n): e for n, e in comp['otros'].items()})
+    return ocupacion
+
+def cargar_vista(id_pedido):
+    """
+    Estado de la pantalla del sorteo: {'sorteo_id', 'sorteos', 'configuracion',
+    'max_numero', 'ocupacion', 'totales', 'deudores', 'ultimo_historial'}.
+    Con la función en la BD es una sola consulta; si no, las de siempre.
+    Sin conexión devuelve la última copia buena de la sesión (o None).
+    """
+    respaldo = st.session_state.setdefault("respaldo_vista", {})
+    vista = _leer_vista(id_pedido) if init_connection() is not None else None
+    if vista is None:
+        # Sin conexión (o se cayó a mitad de la lectura)
+        if id_pedido is None and respaldo: return next(reversed(respaldo.values()))
+        return respaldo.get(id_pedido)
+    if vista['sorteo_id'] is not None:
+        respaldo[vista['sorteo_id']] = vista
+    return vista
+
+def _leer_vista(id_pedido):
+    try: usar_funcion = esquema_listo()
+    except Exception: usar_funcion = False
+
+    if usar_funcion:
+        fila = run_query(SQL["snapshot_sorteo"], (id_pedido,))
+        if not fila: return None
+        snap = dict(fila[0][0])
+        snap['sorteos'] = [tuple(s) for s in snap['sorteos']]
+        snap['configuracion'] = [tuple(c) for c in snap['configuracion']]
+        snap['ocupacion'] = _decodificar_ocupacion(snap['ocupacion'])
+        return snap
+
+    sorteos = run_query(SQL["sorteos_activos"], lectura=True)
+    if sorteos is None: return None
+    ids = [s[0] for s in sorteos]
+    id_sorteo = id_pedido if id_pedido in ids else (ids[0] if ids else None)
+    snap = {'sorteo_id': id_sorteo, 'sorteos': sorteos, 'configuracion': run_query(SQL["configuracion"], lectura=True) or [],
+            'max_numero': None, 'ocupacion': {}, 'totales': [0, 0, 0], 'deudores': [], 'ultimo_historial': 0}
+    if id_sorteo is None: return snap
+    max_bol = run_query(SQL["max_numero"], (id_sorteo,))
+    if max_bol: snap['max_numero'] = max_bol[0][0]
+    ocup = run_query(SQL["ocupacion"], (id_sorteo,))
+    snap['ocupacion'] = {n: e for n, e in ocup} if ocup else {}
+    totales = run_query(SQL["resumen_ventas"], (id_sorteo,), lectura=True)
+    if totales: snap['totales'] = list(totales[0])
+    snap['deudores'] = run_query(SQL["deudores"], (id_sorteo,), lectura=True) or []
+    ultimo = run_query(SQL["ultimo_historial"], (id_sorteo,))
+    if ultimo: snap['ultimo_historial'] = ultimo[0][0]
+    return snap
+
 # ============================================================================
 #  SISTEMA DE LOGIN
 # ============================================================================
@@ -526,13 +1276,30 @@ def main():
         if st.button("🔒 Cerrar Sesión"):
             st.session_state["password_correct"] = False
             st.rerun()
+        st.toggle("🐞 Panel de rendimiento", key="perfil_activo", value=os.environ.get("SORTEOS_PERFIL") == "1")
+        panel_perfil = st.empty()
+
+    global _RERUN_COMPLETO
+    if st.session_state.get("perfil_activo"):
+        iniciar_perfil()
+    _RERUN_COMPLETO = True
+    try:
+        pendientes = sincronizar_cola()
+        with st.sidebar: panel_cola(pendientes)
+        vista_principal()
+    finally:
+        _RERUN_COMPLETO = False
+        cerrar_perfil(panel_perfil)
+
+def vista_principal():
 
     st.title("📱 Sorteos Milán")
 
-    sorteos = run_query("SELECT id, nombre, precio_boleto, fecha_sorteo, hora_sorteo, premio1, premio2, premio3, premio_extra1, premio_extra2, cant_promo1, precio_promo1, cant_promo2, precio_promo2, cant_promo3, precio_promo3 FROM sorteos WHERE activo = TRUE")
-    config_rows = run_query("SELECT clave, valor FROM configuracion")
-    
-    if not sorteos: st.warning("No hay sorteos activos."); return
+    # El sorteo elegido en el rerun anterior (el selectbox aún no se dibujó)
+    id_pedido = st.session_state.get("ids_sorteo", {}).get(st.session_state.get("sorteo_activo"))
+    vista = cargar_vista(id_pedido)
+    if not vista or not vista['sorteos']: st.warning("No hay sorteos activos."); return
+    sorteos, config_rows = vista['sorteos'], vista['configuracion']
 
     empresa_config = {"nombre": "SORTEOS MILÁN", "rif": "", "telefono": ""}
     if config_rows:
@@ -541,9 +1308,14 @@ def main():
 
     # SELECTOR DE SORTEOS ACTIVOS
     opciones_sorteo = {s[1]: s for s in sorteos}
-    nom_sorteo = st.selectbox("Sorteo Activo:", list(opciones_sorteo.keys()))
+    st.session_state["ids_sorteo"] = {s[1]: s[0] for s in sorteos}
+    nom_sorteo = st.selectbox("Sorteo Activo:", list(opciones_sorteo.keys()), key="sorteo_activo")
     
     if not nom_sorteo: return
+    if opciones_sorteo[nom_sorteo][0] != vista['sorteo_id']:
+        # Primera vez que se elige este sorteo: se pide su snapshot
+        vista = cargar_vista(opciones_sorteo[nom_sorteo][0])
+        if not vista: st.warning("📴 Sin conexión: este sorteo aún no se había cargado."); return
     s_data = opciones_sorteo[nom_sorteo]
     id_sorteo, nombre_s, precio_s, fecha_raw, hora_raw = s_data[0], s_data[1], float(s_data[2] or 0), s_data[3], s_data[4]
     
@@ -568,10 +1340,9 @@ def main():
         clave_cap = f"capacidad_sorteo_{id_sorteo}"
         if clave_cap in cfg_dict:
             cantidad_boletos = int(cfg_dict[clave_cap])
-        else:
-            max_bol = run_query("SELECT MAX(numero) FROM boletos WHERE sorteo_id=%s", (id_sorteo,))
-            if max_bol and max_bol[0][0] is not None and max_bol[0][0] <= 99:
-                cantidad_boletos = 100
+        elif vista['max_numero'] is not None:
+            if vista['max_numero'] <= 99: cantidad_boletos = 100
+            elif vista['max_numero'] >= 1000: cantidad_boletos = 10 ** len(str(vista['max_numero']))
     
     st.caption(f"⚙️ Modo detectado: {cantidad_boletos} boletos")
 
@@ -580,759 +1351,949 @@ def main():
         "premio1": s_data[5], "premio2": s_data[6], "premio3": s_data[7], "premio_extra1": s_data[8], "premio_extra2": s_data[9],
         "cant_p1": s_data[10], "prec_p1": s_data[11],
         "cant_p2": s_data[12], "prec_p2": s_data[13],
-        "cant_p3": s_data[14], "prec_p3": s_data[15]
+        "cant_p3": s_data[14], "prec_p3": s_data[15],
+        "modo_tarifa": {r[0]: r[1] for r in config_rows or []}.get(f"modo_tarifa_sorteo_{id_sorteo}", "escala")
     }
     config_full = {'rifa': rifa_config, 'empresa': empresa_config}
     
-    tab_venta, tab_clientes, tab_cobranza = st.tabs(["🎫 VENTA", "👥 CLIENTES", "💰 COBRANZA"])
+    ctx = {
+        "vista": vista, "id_sorteo": id_sorteo, "nombre": nombre_s, "fecha": fecha_s, "hora": hora_s,
+        "cantidad_boletos": cantidad_boletos, "rifa": rifa_config, "config_full": config_full,
+    }
+    tab_venta, tab_clientes, tab_cobranza, tab_global = st.tabs(["🎫 VENTA", "👥 CLIENTES", "💰 COBRANZA", "📈 GLOBAL"])
+    # Cada pestaña es un fragmento: tocar algo adentro solo vuelve a correr esa pestaña.
+    # Lo que escribe en la BD termina en st.rerun() completo (los datos cambiaron para todas)
+    with tab_venta: fragmento_venta(ctx)
+    with tab_clientes: fragmento_clientes()
+    with tab_cobranza: pestana_cobranza(ctx)
+    with tab_global: tablero_global()
 
-    # ---------------- PESTAÑA VENTA ----------------
-    with tab_venta:
-        st.write("### 📊 Estado del Sorteo")
-        
-        # 1. PREVISUALIZACIÓN EN VIVO (ARRIBA)
-        ver_ocupados = st.checkbox("Mostrar Ocupados (Amarillo)", value=True)
-        
-        tipo_vista = 1 if ver_ocupados else 2
-        img_bytes = generar_imagen_reporte(id_sorteo, config_full, cantidad_boletos, tipo_img=tipo_vista)
+# ============================================================================
+#  PESTAÑAS (FRAGMENTOS QUE SE RECORREN POR SEPARADO)
+# ============================================================================
+def rerun_panel():
+    """Rerun solo del fragmento actual; en un rerun completo no se puede acotar y corre toda la app"""
+    try: st.rerun(scope="fragment")
+    except StreamlitAPIException: st.rerun()
+
+# ---------------- PESTAÑA VENTA ----------------
+@fragmento
+def fragmento_venta(ctx):
+    vista, id_sorteo, nombre_s, fecha_s, hora_s = ctx["vista"], ctx["id_sorteo"], ctx["nombre"], ctx["fecha"], ctx["hora"]
+    cantidad_boletos, rifa_config, config_full = ctx["cantidad_boletos"], ctx["rifa"], ctx["config_full"]
+    st.write("### 📊 Estado del Sorteo")
+    
+    # 1. PREVISUALIZACIÓN EN VIVO (ARRIBA)
+    ver_ocupados = st.checkbox("Mostrar Ocupados (Amarillo)", value=True)
+    
+    tipo_vista = 1 if ver_ocupados else 2
+    boletos_ocupados = obtener_ocupacion(id_sorteo, vista['ocupacion'])
+
+    # Sorteos grandes: solo se dibuja la página elegida (1000 números)
+    paginas = paginas_sorteo(cantidad_boletos)
+    pagina = 0
+    if len(paginas) > 1:
+        fmt_tabla = formato_numero(cantidad_boletos)
+        pagina = st.selectbox(
+            "📄 Página de la tabla:", range(len(paginas)), key=f"pag_tabla_{id_sorteo}",
+            format_func=lambda p: f"{fmt_tabla.format(paginas[p].start)} - {fmt_tabla.format(paginas[p].stop - 1)}"
+        )
+    if st.toggle("🖼️ Ver como imagen", value=False, key="vista_jpeg"):
+        img_bytes = generar_imagen_reporte(id_sorteo, config_full, cantidad_boletos, tipo_img=tipo_vista, boletos_ocupados=boletos_ocupados, pagina=pagina)
         st.image(img_bytes, caption="Actualizado en tiempo real", use_container_width=True)
+    else:
+        # 🔥 La grilla se dibuja en el teléfono: al servidor solo le cuesta un texto de 1 byte por boleto
+        seleccion_grilla, _ = parsear_boletos(st.session_state.get("entrada_boletos", ""), cantidad_boletos)
+        toque = grilla_interactiva(boletos_ocupados, paginas[pagina], cantidad_boletos, seleccion_grilla, ver_ocupados, key=f"grilla_{id_sorteo}_{pagina}")
+        if toque and toque.get('t') != st.session_state.get("grilla_ultimo_toque"):
+            st.session_state["grilla_ultimo_toque"] = toque['t']
+            # Tocar agrega el número a la búsqueda; tocarlo otra vez lo quita
+            nums = set(seleccion_grilla) ^ {int(toque['numero'])}
+            st.session_state["entrada_boletos"] = ", ".join(formato_numero(cantidad_boletos).format(n) for n in sorted(nums))
+            st.session_state["modo_venta"] = "🔢 Por N° de Boleto"
+            rerun_panel()
+    
+    # 2. Calcular Totales (Asignados y Dinero)
+    try:
+        t_asignados = vista['totales'][0] or 0
+        t_monto = float(vista['totales'][1] or 0.0)
         
-        # 2. Calcular Totales (Asignados y Dinero)
-        try:
-            datos_resumen = run_query("SELECT COUNT(*), SUM(precio) FROM boletos WHERE sorteo_id = %s", (id_sorteo,))
-            t_asignados = 0
-            t_monto = 0.0
-            if datos_resumen and datos_resumen[0]:
-                fila = datos_resumen[0]
-                t_asignados = fila[0] or 0         
-                t_monto = float(fila[1] or 0.0)    
-            
-            st.markdown(
-                f"""
-                <div style="text-align: center; margin-top: -10px; margin-bottom: 15px; font-size: 15px;">
-                    🎟️ Asignados: <b>{t_asignados}</b> &nbsp;|&nbsp; 💰 Recaudar: <b>${t_monto:,.2f}</b>
-                </div>
-                """, 
-                unsafe_allow_html=True
-            )
-        except Exception as e:
-            st.error(f"Error calculando totales: {e}")
-
-        # 3. BOTONES DE DESCARGA (DEBAJO DE LA IMAGEN)
-        st.write("📥 **Descargar Tablas:**")
-        if cantidad_boletos <= 100:
-            c_d1, c_d2 = st.columns(2)
-            c_d1.download_button("⬇️ Con Ocupados", generar_imagen_reporte(id_sorteo, config_full, cantidad_boletos, 1), "01_Tabla_ConOcupados.jpg", "image/jpeg", use_container_width=True)
-            c_d2.download_button("⬇️ Solo Disponibles", generar_imagen_reporte(id_sorteo, config_full, cantidad_boletos, 2), "02_Tabla_SoloDisponibles.jpg", "image/jpeg", use_container_width=True)
-        else:
-            c_d1, c_d2, c_d3 = st.columns(3)
-            c_d1.download_button("⬇️ Ocupados", generar_imagen_reporte(id_sorteo, config_full, cantidad_boletos, 1), "01_Tabla_ConOcupados.jpg", "image/jpeg", use_container_width=True)
-            c_d2.download_button("⬇️ Limpia", generar_imagen_reporte(id_sorteo, config_full, cantidad_boletos, 2), "02_Tabla_SoloDisponibles.jpg", "image/jpeg", use_container_width=True)
-            c_d3.download_button("⬇️ Agrupada", generar_imagen_reporte(id_sorteo, config_full, cantidad_boletos, 3), "03_Tabla_Compacta.jpg", "image/jpeg", use_container_width=True)
-        
-        st.divider()
-
-        # ------------------------------------------------------------------
-        #  SELECTOR DE MODO Y DEFINICIÓN DE FORMATO
-        # ------------------------------------------------------------------
-        modo = st.radio("📍 Selecciona opción:", ["🔢 Por N° de Boleto", "👤 Por Cliente"], horizontal=True)
-        st.write("") 
-        
-        fmt_num = "{:02d}" if cantidad_boletos <= 100 else "{:03d}"
-
-        if modo == "🔢 Por N° de Boleto":
-            c1, c2 = st.columns([2,1])
-            entrada_boletos = c1.text_input("Boleto(s) N° (Ej: 01, 25):", placeholder="Escribe números...")
-            
-            lista_busqueda = []
-            if entrada_boletos:
-                try:
-                    partes = entrada_boletos.replace('-', ' ').replace('/', ' ').split(',')
-                    for p in partes:
-                        if p.strip().isdigit():
-                            val = int(p.strip())
-                            if 0 <= val < cantidad_boletos:
-                                lista_busqueda.append(val)
-                except: pass
-
-            if c2.button("🔍 Buscar", use_container_width=True) or lista_busqueda:
-                if not lista_busqueda:
-                    st.warning("Introduce un número válido.")
-                else:
-                    lista_str = ",".join(map(str, lista_busqueda))
-                    placeholders = ",".join(["%s"] * len(lista_busqueda))
-                    
-                    query = f"""
-                        SELECT b.numero, b.estado, b.precio, b.total_abonado, b.fecha_asignacion, b.id, b.cliente_id,
-                               c.nombre_completo, c.telefono, c.cedula, c.direccion, c.codigo
-                        FROM boletos b
-                        LEFT JOIN clientes c ON b.cliente_id = c.id
-                        WHERE b.sorteo_id = %s AND b.numero IN ({placeholders})
-                    """
-                    params = [id_sorteo] + lista_busqueda
-                    resultados_ocupados = run_query(query, tuple(params))
-                    mapa_resultados = {r[0]: r for r in resultados_ocupados} if resultados_ocupados else {}
-                    
-                    st.write("### 🎫 Estado Actual")
-                    cols_vis = st.columns(4)
-                    
-                    for i, num_buscado in enumerate(lista_busqueda):
-                        if num_buscado in mapa_resultados:
-                            dato = mapa_resultados[num_buscado]
-                            estado = dato[1]
-                            if estado == 'abonado': bg_color = "#1a73e8"
-                            elif estado == 'apartado': bg_color = "#FFC107"
-                            elif estado == 'pagado': bg_color = "#9e9e9e"
-                            txt_estado = estado.upper()
-                        else:
-                            bg_color = "#4CAF50"; txt_estado = "DISPONIBLE"
-
-                        html_card = f"""
-                        <div style="background-color: {bg_color}; border-radius: 10px; padding: 15px; text-align: center; margin-bottom: 15px; color: white; box-shadow: 2px 2px 5px rgba(0,0,0,0.2);">
-                            <div style="font-size: 24px; font-weight: bold; line-height: 1.2;">{fmt_num.format(num_buscado)}</div>
-                            <div style="font-size: 14px; text-transform: uppercase; margin-top: 5px; opacity: 0.9;">{txt_estado}</div>
-                        </div>
-                        """
-                        with cols_vis[i % 4]: st.markdown(html_card, unsafe_allow_html=True)
-                    
-                    st.divider()
-
-                    if len(lista_busqueda) == 1:
-                        numero = lista_busqueda[0]
-                        str_num = fmt_num.format(numero)
-
-                        if numero in mapa_resultados:
-                            row = mapa_resultados[numero]
-                            b_id, estado, b_precio, b_abonado, b_fecha = row[5], row[1], float(row[2]), float(row[3]), row[4]
-                            c_nom, c_tel, c_ced, c_dir, c_cod = row[7], row[8], row[9], row[10], row[11]
-                            
-                            st.info(f"👤 **Cliente:** {c_nom} | 📞 {c_tel}")
-                            
-                            c_btn1, c_btn2, c_btn3 = st.columns(3)
-                            
-                            if estado != 'pagado':
-                                if c_btn1.button("✅ PAGAR TOTAL", use_container_width=True, key="btn_pag_ind"):
-                                    run_query("UPDATE boletos SET estado='pagado', total_abonado=%s WHERE id=%s", (b_precio, b_id), fetch=False)
-                                    log_movimiento(id_sorteo, 'PAGO_COMPLETO', f"Boleto {str_num} - {c_nom}", b_precio)
-                                    st.rerun()
-
-                            if estado != 'apartado':
-                                if c_btn2.button("📌 APARTAR", use_container_width=True, key="btn_aprt"):
-                                    run_query("UPDATE boletos SET estado='apartado', total_abonado=0 WHERE id=%s", (b_id,), fetch=False)
-                                    log_movimiento(id_sorteo, 'REVERTIR_APARTADO', f"Boleto {str_num} - {c_nom}", 0)
-                                    st.success("Revertido a Apartado"); time.sleep(1); st.rerun()
-
-                            if c_btn3.button("🗑️ LIBERAR", type="primary", use_container_width=True, key="btn_lib_ind"):
-                                run_query("DELETE FROM boletos WHERE id=%s", (b_id,), fetch=False)
-                                log_movimiento(id_sorteo, 'LIBERACION', f"Boleto {str_num} - {c_nom}", 0)
-                                st.warning("Liberado"); time.sleep(1); st.rerun()
-                            
-                            if estado != 'pagado' and (b_precio - b_abonado) > 0.01:
-                                st.divider()
-                                with st.container(border=True):
-                                    st.write(f"💸 **Abonar al N° {str_num}**")
-                                    c_ab1, c_ab2 = st.columns([1, 1])
-                                    monto_abono = c_ab1.number_input("Monto:", min_value=0.0, max_value=(b_precio-b_abonado), step=1.0, key="abono_indiv")
-                                    if c_ab2.button("💾 GUARDAR", use_container_width=True, key="btn_save_abono"):
-                                        if monto_abono > 0:
-                                            nt = b_abonado + monto_abono
-                                            ne = 'pagado' if (b_precio - nt) <= 0.01 else 'abonado'
-                                            run_query("UPDATE boletos SET total_abonado=%s, estado=%s WHERE id=%s", (nt, ne, b_id), fetch=False)
-                                            log_movimiento(id_sorteo, 'ABONO', f"Boleto {str_num} - {c_nom}", monto_abono)
-                                            st.success("✅ Abonado"); time.sleep(1); st.rerun()
-                            
-                            st.divider()
+        st.markdown(
+            f"""
+            <div style="text-align: center; margin-top: -10px; margin-bottom: 15px; font-size: 15px;">
+                🎟️ Asignados: <b>{t_asignados}</b> &nbsp;|&nbsp; 💰 Recaudar: <b>${t_monto:,.2f}</b>
+            </div>
+            """, 
+            unsafe_allow_html=True
+        )
+    except Exception as e:
+        st.error(f"Error calculando totales: {e}")
 
-                            col_pdf, col_wa = st.columns([1, 1])
-                            
-                            partes_nom = c_nom.strip().upper().split()
-                            if len(partes_nom) >= 3: nom_archivo = f"{partes_nom[0]}_{partes_nom[2]}"
-                            elif len(partes_nom) == 2: nom_archivo = f"{partes_nom[0]}_{partes_nom[1]}"
-                            else: nom_archivo = partes_nom[0]
-                            
-                            n_file = f"{str_num} {nom_archivo} ({estado.upper()}).pdf"
+    panel_descargas(ctx, boletos_ocupados, pagina)
+    st.divider()
 
-                            info_pdf = {'cliente': c_nom, 'cedula': c_ced, 'telefono': c_tel, 'direccion': c_dir, 'codigo_cli': c_cod, 'estado': estado, 'precio': b_precio, 'abonado': b_abonado, 'fecha_asignacion': b_fecha}
-                            pdf_data = generar_pdf_memoria(numero, info_pdf, config_full, cantidad_boletos)
-                            
-                            with col_pdf:
-                                st.download_button(f"📄 PDF", pdf_data, n_file, "application/pdf", use_container_width=True)
+    # ------------------------------------------------------------------
+    #  SELECTOR DE MODO Y DEFINICIÓN DE FORMATO
+    # ------------------------------------------------------------------
+    modo = st.radio("📍 Selecciona opción:", ["🔢 Por N° de Boleto", "👤 Por Cliente", "🧾 Caja Rápida"], horizontal=True, key="modo_venta")
+    st.write("") 
+    
+    fmt_num = formato_numero(cantidad_boletos)
 
-                            link_wa = get_whatsapp_link_exacto(c_tel, numero, estado, c_nom, nombre_s, str(fecha_s), str(hora_s), cantidad_boletos)
-                            
-                            with col_wa:
-                                if link_wa:
-                                    st.link_button("📲 WhatsApp", link_wa, use_container_width=True)
-                                else:
-                                    st.warning("Sin teléfono")
-
-                        else:
-                            with st.form("venta_single"):
-                                st.write(f"### 📝 Vender Boleto {str_num}")
-                                
-                                # 🔥 Calcula precio unitario con la promo
-                                precio_a_cobrar = calcular_total_pagar_escala(1, rifa_config)
-                                
-                                clientes = run_query("SELECT id, nombre_completo, codigo FROM clientes ORDER BY nombre_completo")
-                                opc_cli = {f"{c[1]} | {c[2] or 'S/C'}": c[0] for c in clientes} if clientes else {}
-                                nom_sel = st.selectbox("👤 Cliente:", options=list(opc_cli.keys()), index=None)
-                                
-                                c_ab, c_pr = st.columns(2)
-                                abono = c_ab.number_input("Abono Inicial ($)", value=0.0) 
-                                c_pr.metric("Precio Unitario", f"${precio_a_cobrar:,.2f}")
-                                
-                                if st.form_submit_button("💾 ASIGNAR", use_container_width=True):
-                                    if nom_sel:
-                                        cid = opc_cli[nom_sel]
-                                        est = 'pagado' if abono >= precio_a_cobrar else 'abonado'
-                                        if abono == 0: est = 'apartado'
-                                        run_query("INSERT INTO boletos (sorteo_id, numero, estado, precio, cliente_id, total_abonado, fecha_asignacion) VALUES (%s, %s, %s, %s, %s, %s, NOW())", (id_sorteo, numero, est, precio_a_cobrar, cid, abono), fetch=False)
-                                        log_movimiento(id_sorteo, 'ASIGNACION', f"Boleto {str_num} - {nom_sel}", abono)
-                                        st.success("✅ Asignado"); time.sleep(1); st.rerun()
-                                    else: st.error("⚠️ Falta cliente")
-                    
-                    elif len(lista_busqueda) > 1:
-                        ocupados = [n for n in lista_busqueda if n in mapa_resultados]
-                        if ocupados:
-                            ocup_fmt = [fmt_num.format(n) for n in ocupados]
-                            st.error(f"❌ Ocupados: {ocup_fmt}")
-                            st.info("Gestiona los boletos ocupados uno por uno.")
-                        else:
-                            lista_fmt = [fmt_num.format(n) for n in lista_busqueda]
-                            st.success(f"🟢 {len(lista_busqueda)} boletos disponibles.")
-                            
-                            with st.form("venta_multi"):
-                                st.write(f"### 📝 Asignar {len(lista_busqueda)} boletos")
-                                
-                                # 🔥 Calcula precio del paquete y unitario
-                                cantidad_venta = len(lista_busqueda)
-                                total_paquete = calcular_total_pagar_escala(cantidad_venta, rifa_config)
-                                precio_unitario = total_paquete / cantidad_venta if cantidad_venta > 0 else 0
-                                
-                                clientes = run_query("SELECT id, nombre_completo, codigo FROM clientes ORDER BY nombre_completo")
-                                opc_cli = {f"{c[1]} | {c[2] or 'S/C'}": c[0] for c in clientes} if clientes else {}
-                                nom_sel = st.selectbox("👤 Cliente:", options=list(opc_cli.keys()), index=None)
-                                
-                                st.divider()
-                                c_ab, c_pr = st.columns(2)
-                                # Ahora pedimos el abono total, es más fácil para el usuario
-                                abono_total = c_ab.number_input("Abono TOTAL ($)", value=0.0, min_value=0.0, max_value=float(total_paquete), step=1.0)
-                                c_pr.metric("Total a Pagar (Promo)", f"${total_paquete:,.2f}")
-                                
-                                if st.form_submit_button("💾 ASIGNAR TODOS", use_container_width=True):
-                                    if nom_sel:
-                                        cid = opc_cli[nom_sel]
-                                        abono_unitario = abono_total / cantidad_venta if cantidad_venta > 0 else 0
-                                        est = 'pagado' if abono_total >= total_paquete else 'abonado'
-                                        if abono_total == 0: est = 'apartado'
-                                        
-                                        for n_bol in lista_busqueda:
-                                            run_query("INSERT INTO boletos (sorteo_id, numero, estado, precio, cliente_id, total_abonado, fecha_asignacion) VALUES (%s, %s, %s, %s, %s, %s, NOW())", (id_sorteo, n_bol, est, precio_unitario, cid, abono_unitario), fetch=False)
-                                        
-                                        log_movimiento(id_sorteo, 'ASIGNACION_MASIVA', f"{cantidad_venta} Boletos - {nom_sel}", abono_total)
-                                        st.success("✅ Asignados"); time.sleep(1); st.rerun()
-                                    else: st.error("⚠️ Selecciona un cliente.")
+    if modo == "🔢 Por N° de Boleto":
+        c1, c2 = st.columns([2,1])
+        entrada_boletos = c1.text_input("Boleto(s) N° (Ej: 01, 25, 10-50, terminal 7, serie 300):", placeholder="Escribe números o toca la grilla...", key="entrada_boletos")
+        
+        lista_busqueda, entradas_invalidas = parsear_boletos(entrada_boletos, cantidad_boletos)
+        if entradas_invalidas:
+            st.warning(f"⚠️ Ignorado (fuera de rango o no válido): {', '.join(entradas_invalidas)}")
 
-        else:
-            clientes_con_boletos = run_query("""
-                SELECT DISTINCT c.id, c.nombre_completo, c.telefono, c.cedula, c.direccion, c.codigo
-                FROM clientes c
-                JOIN boletos b ON c.id = b.cliente_id
-                WHERE b.sorteo_id = %s ORDER BY c.nombre_completo
-            """, (id_sorteo,))
-            
-            opciones_cliente = {}
-            datos_cliente_map = {}
-            
-            if clientes_con_boletos:
-                for c in clientes_con_boletos:
-                    etiqueta = f"{c[1]} | {c[2]}"
-                    opciones_cliente[etiqueta] = c[0]
-                    
-                    datos_cliente_map[c[0]] = {
-                        'nombre': c[1], 
-                        'telefono': c[2],
-                        'cedula': c[3],
-                        'direccion': c[4],
-                        'codigo': c[5]
-                    }
-            
-            cliente_sel = st.selectbox("👤 Buscar Cliente:", options=list(opciones_cliente.keys()), index=None, placeholder="Escribe el nombre...")
-            
-            if cliente_sel:
-                cid = opciones_cliente[cliente_sel]
-                datos_c = datos_cliente_map[cid]
+        if c2.button("🔍 Buscar", use_container_width=True) or lista_busqueda:
+            if not lista_busqueda:
+                st.warning("Introduce un número válido.")
+            else:
+                # 🔥 Una sola consulta para todo el conjunto (= ANY usa el índice de numero)
+                resultados_ocupados = run_query(SQL["boletos_por_numero"], (id_sorteo, lista_busqueda))
+                mapa_resultados = {r[0]: r for r in resultados_ocupados} if resultados_ocupados else {}
                 
-                boletos_cli = run_query("""
-                    SELECT numero, estado, precio, total_abonado, fecha_asignacion
-                    FROM boletos WHERE sorteo_id = %s AND cliente_id = %s ORDER BY numero ASC
-                """, (id_sorteo, cid))
+                st.write("### 🎫 Estado Actual")
+                pendientes_cola = cola_offline().numeros_pendientes(id_sorteo)
+                tarjetas = []
+                for num_buscado in lista_busqueda:
+                    if num_buscado in pendientes_cola:
+                        tarjetas.append((fmt_num.format(num_buscado), "⏳ PENDIENTE", "#FF9800"))
+                    elif num_buscado in mapa_resultados:
+                        estado = mapa_resultados[num_buscado][1]
+                        if estado == 'abonado': bg_color = "#1a73e8"
+                        elif estado == 'apartado': bg_color = "#FFC107"
+                        else: bg_color = "#9e9e9e"
+                        tarjetas.append((fmt_num.format(num_buscado), estado.upper(), bg_color))
+                    else:
+                        tarjetas.append((fmt_num.format(num_buscado), "DISPONIBLE", "#4CAF50"))
+                render_tarjetas_boletos(tarjetas)
                 
-                if boletos_cli:
-                    st.info(f"📋 Gestionando boletos de: **{datos_c['nombre']}**")
+                st.divider()
 
-                    st.write("### 🎫 Estado Actual")
-                    cols_info = st.columns(4) 
-                    for i, b in enumerate(boletos_cli):
-                        num, est = b[0], b[1]
-                        
-                        if est == 'abonado': bg = "#1a73e8"
-                        elif est == 'apartado': bg = "#FFC107"
-                        else: bg = "#9e9e9e"
-                        
-                        html_card = f"""
-                        <div style="background-color: {bg}; border-radius: 10px; padding: 15px; text-align: center; margin-bottom: 15px; color: white; box-shadow: 2px 2px 5px rgba(0,0,0,0.2);">
-                            <div style="font-size: 24px; font-weight: bold; line-height: 1.2;">{fmt_num.format(num)}</div>
-                            <div style="font-size: 14px; text-transform: uppercase; margin-top: 5px; opacity: 0.9;">{est.upper()}</div>
-                        </div>
-                        """
-                        with cols_info[i % 4]: st.markdown(html_card, unsafe_allow_html=True)
-                    
-                    st.divider()
-
-                    st.write("### ✅ Toca para procesar:")
-                    
-                    if 'seleccion_actual' not in st.session_state: st.session_state.seleccion_actual = []
-                    if 'cliente_previo' not in st.session_state or st.session_state.cliente_previo != cid:
-                        st.session_state.seleccion_actual = [] 
-                        st.session_state.cliente_previo = cid
-
-                    todos_nums = [b[0] for b in boletos_cli]
-                    c_todos, c_nada = st.columns(2)
-                    if c_todos.button("✅ Marcar Todos", use_container_width=True, key="btn_all"):
-                        st.session_state.seleccion_actual = list(todos_nums)
-                        st.rerun()
-                        
-                    if c_nada.button("🗑️ Desmarcar Todo", use_container_width=True, key="btn_none"):
-                        st.session_state.seleccion_actual = []
-                        st.rerun()
-
-                    # --- NUEVO: SELECCIÓN RÁPIDA POR NÚMEROS ---
-                    st.caption("✏️ **Selección rápida por N°:**")
-                    c_inp, c_sel = st.columns([3, 1])
-                    # Agregamos key=f"quick_{cid}" para que se limpie sola al cambiar de cliente
-                    nums_escritos = c_inp.text_input("Ej: 01, 03, 05", label_visibility="collapsed", key=f"quick_{cid}")
-                    
-                    if c_sel.button("Aplicar", use_container_width=True):
-                        if nums_escritos:
-                            # Reemplazamos comas y guiones por espacios para separar fácil
-                            texto_limpio = nums_escritos.replace(',', ' ').replace('-', ' ')
-                            nuevos_sel = []
-                            for p in texto_limpio.split():
-                                if p.strip().isdigit():
-                                    val = int(p.strip())
-                                    # Si el número pertenece a este cliente, lo seleccionamos
-                                    if val in todos_nums:
-                                        nuevos_sel.append(val)
-                            
-                            # Actualizamos la selección con los números encontrados
-                            st.session_state.seleccion_actual = nuevos_sel
-                            st.rerun()
-                    # -------------------------------------------
+                if len(lista_busqueda) == 1:
+                    numero = lista_busqueda[0]
+                    str_num = fmt_num.format(numero)
 
-                    cols_sel = st.columns(5)
-                    datos_boletos_map = {} 
+                    if numero in pendientes_cola:
+                        st.warning(f"⏳ El N° {str_num} tiene una operación ({pendientes_cola[numero]}) esperando conexión.")
 
-                    for i, b in enumerate(boletos_cli):
-                        num, est, pre, abo, f_asig = b
-                        datos_boletos_map[num] = {'numero': num, 'estado': est, 'precio': pre, 'abonado': abo, 'fecha': f_asig}
+                    elif numero in mapa_resultados:
+                        row = mapa_resultados[numero]
+                        b_id, estado, b_precio, b_abonado, b_fecha = row[5], row[1], float(row[2]), float(row[3]), row[4]
+                        c_nom, c_tel, c_ced, c_dir, c_cod = row[7], row[8], row[9], row[10], row[11]
                         
-                        es_seleccionado = num in st.session_state.seleccion_actual
-                        str_btn = fmt_num.format(num)
-                        label_btn = f"✔ {str_btn}" if es_seleccionado else f"{str_btn}"
-                        type_btn = "primary" if es_seleccionado else "secondary"
+                        st.info(f"👤 **Cliente:** {c_nom} | 📞 {c_tel}")
                         
-                        with cols_sel[i % 5]:
-                            def on_click_btn(n=num):
-                                if n in st.session_state.seleccion_actual: st.session_state.seleccion_actual.remove(n)
-                                else: st.session_state.seleccion_actual.append(n)
-
-                            st.button(label_btn, key=f"btn_sel_{num}", type=type_btn, on_click=on_click_btn, use_container_width=True)
-
-                    numeros_sel = sorted(st.session_state.seleccion_actual)
-                    datos_sel = [datos_boletos_map[n] for n in numeros_sel]
-
-                    st.divider()
-
-                    if len(numeros_sel) == 1:
-                        dato_unico = datos_sel[0]
-                        deuda = dato_unico['precio'] - dato_unico['abonado']
-                        if deuda > 0.01: 
+                        c_btn1, c_btn2, c_btn3 = st.columns(3)
+                        
+                        if estado != 'pagado':
+                            if c_btn1.button("✅ PAGAR TOTAL", use_container_width=True, key="btn_pag_ind"):
+                                run_query("UPDATE boletos SET estado='pagado', total_abonado=%s WHERE id=%s", (b_precio, b_id), fetch=False,
+                                          cola={'tipo': 'PAGO', 'sorteo_id': id_sorteo, 'numeros': [numero], 'min_filas': 1},
+                                          historial=(id_sorteo, 'PAGO_COMPLETO', f"Boleto {str_num} - {c_nom}", b_precio))
+                                st.rerun()
+
+                        if estado != 'apartado':
+                            if c_btn2.button("📌 APARTAR", use_container_width=True, key="btn_aprt"):
+                                run_query("UPDATE boletos SET estado='apartado', total_abonado=0 WHERE id=%s", (b_id,), fetch=False,
+                                          cola={'tipo': 'APARTAR', 'sorteo_id': id_sorteo, 'numeros': [numero], 'min_filas': 1},
+                                          historial=(id_sorteo, 'REVERTIR_APARTADO', f"Boleto {str_num} - {c_nom}", 0))
+                                st.success("Revertido a Apartado"); time.sleep(1); st.rerun()
+
+                        if c_btn3.button("🗑️ LIBERAR", type="primary", use_container_width=True, key="btn_lib_ind"):
+                            run_query("DELETE FROM boletos WHERE id=%s", (b_id,), fetch=False,
+                                      cola={'tipo': 'LIBERAR', 'sorteo_id': id_sorteo, 'numeros': [numero], 'min_filas': 1},
+                                      historial=(id_sorteo, 'LIBERACION', f"Boleto {str_num} - {c_nom}", 0))
+                            st.warning("Liberado"); time.sleep(1); st.rerun()
+                        
+                        if estado != 'pagado' and (b_precio - b_abonado) > 0.01:
+                            st.divider()
                             with st.container(border=True):
-                                st.write(f"💸 **Abonar: {fmt_num.format(dato_unico['numero'])}** (Deuda: ${deuda:.2f})")
-                                c1, c2 = st.columns([2,1])
-                                m = c1.number_input("Monto:", 0.0, deuda, step=1.0, label_visibility="collapsed")
-                                if c2.button("GUARDAR", use_container_width=True) and m > 0:
-                                    nt = dato_unico['abonado'] + m
-                                    ne = 'pagado' if (dato_unico['precio'] - nt) <= 0.01 else 'abonado'
-                                    run_query("UPDATE boletos SET total_abonado=%s, estado=%s WHERE sorteo_id=%s AND numero=%s", (nt, ne, id_sorteo, dato_unico['numero']), fetch=False)
-                                    log_movimiento(id_sorteo, 'ABONO', f"Boleto {fmt_num.format(dato_unico['numero'])} - {datos_c['nombre']}", m)
-                                    st.session_state.seleccion_actual = []; st.rerun()
-
-                    if numeros_sel:
-                        c_acc1, c_acc2, c_acc3 = st.columns(3)
-                        show_pagar = any(d['estado'] != 'pagado' for d in datos_sel)
-                        show_apartar = any(d['estado'] != 'apartado' for d in datos_sel)
+                                st.write(f"💸 **Abonar al N° {str_num}**")
+                                c_ab1, c_ab2 = st.columns([1, 1])
+                                monto_abono = c_ab1.number_input("Monto:", min_value=0.0, max_value=(b_precio-b_abonado), step=1.0, key="abono_indiv")
+                                if c_ab2.button("💾 GUARDAR", use_container_width=True, key="btn_save_abono"):
+                                    if monto_abono > 0:
+                                        nt = b_abonado + monto_abono
+                                        ne = 'pagado' if (b_precio - nt) <= 0.01 else 'abonado'
+                                        run_query("UPDATE boletos SET total_abonado=%s, estado=%s WHERE id=%s AND total_abonado=%s", (nt, ne, b_id, b_abonado), fetch=False,
+                                                  cola={'tipo': 'ABONO', 'sorteo_id': id_sorteo, 'numeros': [numero], 'min_filas': 1},
+                                                  historial=(id_sorteo, 'ABONO', f"Boleto {str_num} - {c_nom}", monto_abono))
+                                        st.success("✅ Abonado"); time.sleep(1); st.rerun()
                         
-                        if show_pagar:
-                            if c_acc1.button("✅ PAGAR", use_container_width=True):
-                                for d in datos_sel:
-                                    run_query("UPDATE boletos SET estado='pagado', total_abonado=%s WHERE sorteo_id=%s AND numero=%s", (d['precio'], id_sorteo, d['numero']), fetch=False)
-                                    log_movimiento(id_sorteo, 'PAGO_COMPLETO', f"Boleto {fmt_num.format(d['numero'])} - {datos_c['nombre']}", d['precio'])
-                                st.session_state.seleccion_actual = []; st.success("Pagado"); time.sleep(1); st.rerun()
+                        st.divider()
+
+                        col_pdf, col_wa = st.columns([1, 1])
                         
-                        if show_apartar:
-                            if c_acc2.button("📌 APARTAR", use_container_width=True):
-                                for d in datos_sel:
-                                    run_query("UPDATE boletos SET estado='apartado', total_abonado=0 WHERE sorteo_id=%s AND numero=%s", (id_sorteo, d['numero']), fetch=False)
-                                    log_movimiento(id_sorteo, 'REVERTIR_APARTADO', f"Boleto {fmt_num.format(d['numero'])} - {datos_c['nombre']}", 0)
-                                st.session_state.seleccion_actual = []; st.success("Apartado"); time.sleep(1); st.rerun()
-
-                        if c_acc3.button("🗑️ LIBERAR", type="primary", use_container_width=True):
-                            for d in datos_sel:
-                                run_query("DELETE FROM boletos WHERE sorteo_id=%s AND numero=%s", (id_sorteo, d['numero']), fetch=False)
-                                log_movimiento(id_sorteo, 'LIBERACION', f"Boleto {fmt_num.format(d['numero'])} - {datos_c['nombre']}", 0)
-                            st.session_state.seleccion_actual = []; st.warning("Liberados"); time.sleep(1); st.rerun()
-                    
-                    st.divider()
-                    
-                    col_pdf, col_wa = st.columns([1, 1])
-                    
-                    if numeros_sel:
-                        partes_nom = datos_c['nombre'].strip().upper().split()
-                        if len(partes_nom) >= 3: nom_archivo_cli = f"{partes_nom[0]}_{partes_nom[2]}"
-                        elif len(partes_nom) == 2: nom_archivo_cli = f"{partes_nom[0]}_{partes_nom[1]}"
-                        else: nom_archivo_cli = partes_nom[0] if partes_nom else "CLIENTE"
-
-                        partes_msg = [f"N° {fmt_num.format(d['numero'])} ({d['estado'].upper()})" for d in datos_sel]
-                        txt_boletos = ", ".join(partes_msg)
-                        tipo_txt = "los comprobantes de tus BOLETOS" if len(numeros_sel) > 1 else "el comprobante de tu BOLETO"
+                        partes_nom = c_nom.strip().upper().split()
+                        if len(partes_nom) >= 3: nom_archivo = f"{partes_nom[0]}_{partes_nom[2]}"
+                        elif len(partes_nom) == 2: nom_archivo = f"{partes_nom[0]}_{partes_nom[1]}"
+                        else: nom_archivo = partes_nom[0]
                         
-                        msg_wa = (
-                            f"Hola. Saludos, somos Sorteos Milán!!, aquí te enviamos {tipo_txt}: "
-                            f"{txt_boletos}, a nombre de {datos_c['nombre']} para el sorteo "
-                            f"'{nombre_s}' del día {fecha_s} a las {hora_s}. ¡Suerte!🍀"
-                        )
+                        n_file = f"{str_num} {nom_archivo} ({estado.upper()}).pdf"
 
+                        info_pdf = {'cliente': c_nom, 'cedula': c_ced, 'telefono': c_tel, 'direccion': c_dir, 'codigo_cli': c_cod, 'estado': estado, 'precio': b_precio, 'abonado': b_abonado, 'fecha_asignacion': b_fecha}
+                        pdf_data = generar_pdf_memoria(numero, info_pdf, config_full, cantidad_boletos)
+                        
                         with col_pdf:
-                            st.write("**Descargar PDFs:**")
-                            for d in datos_sel:
-                                info_pdf = {
-                                    'cliente': datos_c['nombre'], 'cedula': datos_c['cedula'], 
-                                    'telefono': datos_c['telefono'], 'direccion': datos_c['direccion'], 
-                                    'codigo_cli': datos_c['codigo'], 'estado': d['estado'], 
-                                    'precio': d['precio'], 'abonado': d['abonado'], 
-                                    'fecha_asignacion': d['fecha']
-                                }
-                                pdf_data = generar_pdf_memoria(d['numero'], info_pdf, config_full, cantidad_boletos)
-                                n_file = f"{fmt_num.format(d['numero'])} {nom_archivo_cli} ({d['estado'].upper()}).pdf"
-                                st.download_button(f"📄 {fmt_num.format(d['numero'])}", pdf_data, n_file, "application/pdf", key=f"d_{d['numero']}", use_container_width=True)
+                            st.download_button(f"📄 PDF", pdf_data, n_file, "application/pdf", use_container_width=True)
 
+                        link_wa = get_whatsapp_link_exacto(c_tel, numero, estado, c_nom, nombre_s, str(fecha_s), str(hora_s), cantidad_boletos)
+                        
                         with col_wa:
-                            st.write("**Enviar:**")
-                            tel_raw = datos_c['telefono']
-                            tel_clean = "".join(filter(str.isdigit, str(tel_raw or "")))
-                            
-                            if len(tel_clean) == 10: tel_final = "58" + tel_clean
-                            elif len(tel_clean) == 11 and tel_clean.startswith("0"): tel_final = "58" + tel_clean[1:]
-                            else: tel_final = tel_clean
-                            
-                            if len(tel_final) >= 7:
-                                link_wa = f"https://wa.me/{tel_final}?text={urllib.parse.quote(msg_wa)}"
+                            if link_wa:
                                 st.link_button("📲 WhatsApp", link_wa, use_container_width=True)
                             else:
-                                st.warning(f"Tel Inválido: {tel_raw}")
+                                st.warning("Sin teléfono")
+
+                    else:
+                        with st.form("venta_single"):
+                            st.write(f"### 📝 Vender Boleto {str_num}")
+                            
+                            # 🔥 Calcula precio unitario con la promo
+                            precio_a_cobrar = calcular_total_pagar_escala(1, rifa_config)
+                            
+                            clientes = consulta_con_respaldo(SQL["clientes_selector"])
+                            opc_cli = {f"{c[1]} | {c[2] or 'S/C'}": c[0] for c in clientes} if clientes else {}
+                            nom_sel = st.selectbox("👤 Cliente:", options=list(opc_cli.keys()), index=None)
+                            
+                            c_ab, c_pr = st.columns(2)
+                            abono = c_ab.number_input("Abono Inicial ($)", value=0.0) 
+                            c_pr.metric("Precio Unitario", f"${precio_a_cobrar:,.2f}")
+                            with st.expander("💲 Tabla de precios"):
+                                st.dataframe(tabla_precios(rifa_config), hide_index=True, use_container_width=True)
+                            
+                            if st.form_submit_button("💾 ASIGNAR", use_container_width=True):
+                                if nom_sel:
+                                    cid = opc_cli[nom_sel]
+                                    est = 'pagado' if abono >= precio_a_cobrar else 'abonado'
+                                    if abono == 0: est = 'apartado'
+                                    run_query("INSERT INTO boletos (sorteo_id, numero, estado, precio, cliente_id, total_abonado, fecha_asignacion) VALUES (%s, %s, %s, %s, %s, %s, NOW())", (id_sorteo, numero, est, precio_a_cobrar, cid, abono), fetch=False,
+                                              cola={'tipo': 'VENTA', 'sorteo_id': id_sorteo, 'numeros': [numero], 'min_filas': 1},
+                                              historial=(id_sorteo, 'ASIGNACION', f"Boleto {str_num} - {nom_sel}", abono))
+                                    st.success("✅ Asignado"); time.sleep(1); st.rerun()
+                                else: st.error("⚠️ Falta cliente")
+                
+                elif len(lista_busqueda) > 1:
+                    ocupados = [n for n in lista_busqueda if n in mapa_resultados or n in pendientes_cola]
+                    if ocupados:
+                        ocup_fmt = [fmt_num.format(n) for n in ocupados]
+                        st.error(f"❌ Ocupados: {ocup_fmt}")
+                        st.info("Gestiona los boletos ocupados uno por uno.")
                     else:
-                        col_pdf.info("Selecciona para ver PDFs")
-                        col_wa.button("📲 WhatsApp", disabled=True, use_container_width=True)
+                        lista_fmt = [fmt_num.format(n) for n in lista_busqueda]
+                        st.success(f"🟢 {len(lista_busqueda)} boletos disponibles.")
                         
-    # ---------------- PESTAÑA CLIENTES ----------------
-    with tab_clientes:
-        st.header("Gestión Clientes")
+                        with st.form("venta_multi"):
+                            st.write(f"### 📝 Asignar {len(lista_busqueda)} boletos")
+                            
+                            # 🔥 Calcula precio del paquete y unitario
+                            cantidad_venta = len(lista_busqueda)
+                            total_paquete = calcular_total_pagar_escala(cantidad_venta, rifa_config)
+                            precio_unitario = total_paquete / cantidad_venta if cantidad_venta > 0 else 0
+                            
+                            clientes = consulta_con_respaldo(SQL["clientes_selector"])
+                            opc_cli = {f"{c[1]} | {c[2] or 'S/C'}": c[0] for c in clientes} if clientes else {}
+                            nom_sel = st.selectbox("👤 Cliente:", options=list(opc_cli.keys()), index=None)
+                            
+                            st.divider()
+                            c_ab, c_pr = st.columns(2)
+                            # Ahora pedimos el abono total, es más fácil para el usuario
+                            abono_total = c_ab.number_input("Abono TOTAL ($)", value=0.0, min_value=0.0, max_value=float(total_paquete), step=1.0)
+                            c_pr.metric("Total a Pagar (Promo)", f"${total_paquete:,.2f}")
+                            with st.expander("💲 Tabla de precios"):
+                                st.dataframe(tabla_precios(rifa_config, resaltar=cantidad_venta), hide_index=True, use_container_width=True)
+                            
+                            if st.form_submit_button("💾 ASIGNAR TODOS", use_container_width=True):
+                                if nom_sel:
+                                    cid = opc_cli[nom_sel]
+                                    abono_unitario = abono_total / cantidad_venta if cantidad_venta > 0 else 0
+                                    est = 'pagado' if abono_total >= total_paquete else 'abonado'
+                                    if abono_total == 0: est = 'apartado'
+                                    
+                                    # Un solo INSERT para todo el bloque
+                                    run_query("""
+                                        INSERT INTO boletos (sorteo_id, numero, estado, precio, cliente_id, total_abonado, fecha_asignacion)
+                                        SELECT %s, n, %s, %s, %s, %s, NOW() FROM unnest(%s::int[]) AS n
+                                    """, (id_sorteo, est, precio_unitario, cid, abono_unitario, lista_busqueda), fetch=False,
+                                       cola={'tipo': 'VENTA', 'sorteo_id': id_sorteo, 'numeros': lista_busqueda, 'min_filas': cantidad_venta},
+                                       historial=(id_sorteo, 'ASIGNACION_MASIVA', f"{cantidad_venta} Boletos - {nom_sel}", abono_total))
+                                    st.success("✅ Asignados"); time.sleep(1); st.rerun()
+                                else: st.error("⚠️ Selecciona un cliente.")
+
+    elif modo == "👤 Por Cliente":
+        panel_por_cliente(ctx)
+    else:
+        panel_caja_rapida(ctx)
+
+@fragmento
+def panel_descargas(ctx, boletos_ocupados, pagina):
+    """Tablas JPG/PDF y disponibles en texto: sus botones solo recorren este panel"""
+    id_sorteo, nombre_s, cantidad_boletos, config_full = ctx["id_sorteo"], ctx["nombre"], ctx["cantidad_boletos"], ctx["config_full"]
+    paginas = paginas_sorteo(cantidad_boletos)
+    # 3. BOTONES DE DESCARGA (DEBAJO DE LA IMAGEN)
+    st.write("📥 **Descargar Tablas:**" + (f" _(página {pagina + 1} de {len(paginas)})_" if len(paginas) > 1 else ""))
+    sufijo_pag = f"_P{pagina + 1}" if len(paginas) > 1 else ""
+    # Las tablas JPG se dibujan en segundo plano y solo cuando se piden
+    variantes_img = [("⬇️ Con Ocupados", 1, "01_Tabla_ConOcupados"), ("⬇️ Solo Disponibles", 2, "02_Tabla_SoloDisponibles")]
+    if cantidad_boletos > 100:
+        variantes_img = [("⬇️ Ocupados", 1, "01_Tabla_ConOcupados"), ("⬇️ Limpia", 2, "02_Tabla_SoloDisponibles"), ("⬇️ Agrupada", 3, "03_Tabla_Compacta")]
+    # La tabla lleva la fecha del día: entra en la clave (lo guardado en disco sobrevive de un día a otro)
+    clave_img = "img_" + firma_datos(id_sorteo, config_full, cantidad_boletos, pagina, sorted(boletos_ocupados.items()), datetime.now().date())
+    if st.button("🖼️ Preparar Tablas (JPG)", use_container_width=True, key="btn_prep_img"):
+        gestor_trabajos().enviar(clave_img, "Tablas JPG", trabajo_tablas_imagen, clave_img, config_full, cantidad_boletos, dict(boletos_ocupados), pagina, [v[1] for v in variantes_img])
+    mostrar_trabajo(clave_img, lambda imgs: [(etq, imgs[tipo], f"{archivo}{sufijo_pag}.jpg", "image/jpeg") for etq, tipo, archivo in variantes_img], tipos=[v[1] for v in variantes_img])
+
+    # 🖨️ Misma tabla en PDF vectorial (todas las páginas, nítido al imprimir)
+    # (también a pedido: el expander cerrado igual corre su código en cada rerun)
+    with st.expander("🖨️ Tablas en PDF (para imprimir)"):
+        variantes_pdf = [("⬇️ Con Ocupados", 1, "01_Tabla_ConOcupados.pdf"), ("⬇️ Solo Disponibles", 2, "02_Tabla_SoloDisponibles.pdf")]
+        if cantidad_boletos > 100: variantes_pdf.append(("⬇️ Agrupada", 3, "03_Tabla_Compacta.pdf"))
+        clave_pdf = "pdf_" + firma_datos(id_sorteo, config_full, cantidad_boletos, sorted(boletos_ocupados.items()), datetime.now().date())
+        if st.button("🖨️ Preparar Tablas (PDF)", use_container_width=True, key="btn_prep_pdf"):
+            gestor_trabajos().enviar(clave_pdf, "Tablas PDF", trabajo_tablas_pdf, clave_pdf, config_full, cantidad_boletos, dict(boletos_ocupados), [v[1] for v in variantes_pdf])
+        mostrar_trabajo(clave_pdf, lambda pdfs: [(etq, pdfs[tipo], archivo, "application/pdf") for etq, tipo, archivo in variantes_pdf], tipos=[v[1] for v in variantes_pdf])
+
+    # 📝 Disponibles en texto: pocos bytes en lugar de una imagen pesada
+    with st.expander("📝 Disponibles en Texto (WhatsApp)"):
+        agrupar = st.checkbox("Agrupar por centenas", value=False, disabled=cantidad_boletos <= 100, key="txt_centenas")
+        mensajes_disp = generar_texto_disponibles(boletos_ocupados, cantidad_boletos, nombre_s, agrupar_centenas=agrupar)
+        for i, msg_disp in enumerate(mensajes_disp):
+            if len(mensajes_disp) > 1: st.caption(f"Mensaje {i + 1} de {len(mensajes_disp)}")
+            st.code(msg_disp, language=None)
+            st.link_button("📲 Compartir", f"https://wa.me/?text={urllib.parse.quote(msg_disp)}", use_container_width=True)
+        st.download_button("⬇️ Descargar .txt", "\n\n".join(mensajes_disp), "04_Disponibles.txt", "text/plain", use_container_width=True)
+
+@fragmento
+def panel_por_cliente(ctx):
+    """Boletos de un cliente: la selección y los atajos solo recorren este panel"""
+    id_sorteo, nombre_s, fecha_s, hora_s = ctx["id_sorteo"], ctx["nombre"], ctx["fecha"], ctx["hora"]
+    cantidad_boletos, config_full = ctx["cantidad_boletos"], ctx["config_full"]
+    fmt_num = formato_numero(cantidad_boletos)
+    clientes_con_boletos = run_query(SQL["clientes_con_boletos"], (id_sorteo,))
+    
+    opciones_cliente = {}
+    datos_cliente_map = {}
+    
+    if clientes_con_boletos:
+        for c in clientes_con_boletos:
+            etiqueta = f"{c[1]} | {c[2]}"
+            opciones_cliente[etiqueta] = c[0]
+            
+            datos_cliente_map[c[0]] = {
+                'nombre': c[1], 
+                'telefono': c[2],
+                'cedula': c[3],
+                'direccion': c[4],
+                'codigo': c[5]
+            }
+    
+    cliente_sel = st.selectbox("👤 Buscar Cliente:", options=list(opciones_cliente.keys()), index=None, placeholder="Escribe el nombre...")
+    
+    if cliente_sel:
+        cid = opciones_cliente[cliente_sel]
+        datos_c = datos_cliente_map[cid]
+        
+        boletos_cli = run_query(SQL["boletos_cliente"], (id_sorteo, cid))
         
-        if 'edit_id' in st.session_state:
-            id_e = st.session_state.edit_id
-            vals = st.session_state.edit_vals 
+        if boletos_cli:
+            st.info(f"📋 Gestionando boletos de: **{datos_c['nombre']}**")
+
+            st.write("### 🎫 Estado Actual")
+            pendientes_cola = cola_offline().numeros_pendientes(id_sorteo)
+            tarjetas = []
+            for b in boletos_cli:
+                num, est = b[0], b[1]
+                
+                if num in pendientes_cola: est, bg = "⏳ pendiente", "#FF9800"
+                elif est == 'abonado': bg = "#1a73e8"
+                elif est == 'apartado': bg = "#FFC107"
+                else: bg = "#9e9e9e"
+                tarjetas.append((fmt_num.format(num), est.upper(), bg))
+            render_tarjetas_boletos(tarjetas)
             
-            st.info(f"✏️ Editando a: **{vals[1]}**")
+            st.divider()
+
+            st.write("### ✅ Selecciona para procesar:")
             
-            with st.form("edit_cli_form"):
-                en = st.text_input("Nombre", value=vals[1]).upper()
-                
-                ced_parts = vals[2].split('-') if vals[2] and '-' in vals[2] else ["V", vals[2]]
-                pre_tipo = ced_parts[0] if ced_parts[0] in ["V", "E"] else "V"
-                pre_num = ced_parts[1] if len(ced_parts) > 1 else vals[2]
+            # La selección vive en un set: pertenencia O(1) y sin duplicados
+            if 'seleccion_actual' not in st.session_state: st.session_state.seleccion_actual = set()
+            if 'cliente_previo' not in st.session_state or st.session_state.cliente_previo != cid:
+                st.session_state.seleccion_actual = set()
+                st.session_state.cliente_previo = cid
+            if 'sel_version' not in st.session_state: st.session_state.sel_version = 0
+
+            def fijar_seleccion(nums):
+                st.session_state.seleccion_actual = set(nums)
+                st.session_state.sel_version += 1  # Fuerza a la tabla a tomar la nueva selección
+
+            datos_boletos_map = {
+                b[0]: {'numero': b[0], 'estado': b[1], 'precio': b[2], 'abonado': b[3], 'fecha': b[4]}
+                for b in boletos_cli
+            }
+            todos_nums = set(datos_boletos_map)
+            no_pagados = {n for n, d in datos_boletos_map.items() if d['estado'] != 'pagado'}
+
+            # --- ATAJOS (un solo rerun cada uno) ---
+            c_todos, c_deben, c_nada = st.columns(3)
+            c_todos.button("✅ Todos", use_container_width=True, key="btn_all", on_click=fijar_seleccion, args=(todos_nums,))
+            c_deben.button("💸 No Pagados", use_container_width=True, key="btn_unpaid", on_click=fijar_seleccion, args=(no_pagados,))
+            c_nada.button("🗑️ Ninguno", use_container_width=True, key="btn_none", on_click=fijar_seleccion, args=(set(),))
+
+            st.caption("✏️ **Selección rápida por N° o rango:**")
+            c_inp, c_sel = st.columns([3, 1])
+            # Agregamos key=f"quick_{cid}" para que se limpie sola al cambiar de cliente
+            nums_escritos = c_inp.text_input("Ej: 01, 03, 10-20, terminal 7", label_visibility="collapsed", key=f"quick_{cid}")
+            
+            if c_sel.button("Aplicar", use_container_width=True):
+                if nums_escritos:
+                    nuevos_sel, _ = parsear_boletos(nums_escritos, cantidad_boletos)
+                    # Solo quedan los números que pertenecen a este cliente
+                    fijar_seleccion(set(nuevos_sel) & todos_nums)
+            # -------------------------------------------
+
+            # 🔥 Una sola tabla con casillas: se marcan varios y se confirma en UN rerun
+            filas_sel = [
+                {"✔": d['numero'] in st.session_state.seleccion_actual, "N°": fmt_num.format(n),
+                 "Estado": d['estado'].upper(), "Saldo ($)": float(d['precio'] or 0) - float(d['abonado'] or 0)}
+                for n, d in datos_boletos_map.items()
+            ]
+            with st.form(f"form_sel_{cid}", border=False):
+                tabla_sel = st.data_editor(
+                    filas_sel, key=f"tabla_sel_{cid}_{st.session_state.sel_version}",
+                    column_config={"Saldo ($)": st.column_config.NumberColumn(format="$%.2f")},
+                    disabled=["N°", "Estado", "Saldo ($)"], hide_index=True, use_container_width=True,
+                )
+                if st.form_submit_button("☑️ Confirmar Selección", use_container_width=True):
+                    st.session_state.seleccion_actual = {int(f["N°"]) for f in tabla_sel if f["✔"]}
+
+            numeros_sel = sorted(st.session_state.seleccion_actual & todos_nums)
+            datos_sel = [datos_boletos_map[n] for n in numeros_sel]
+
+            st.divider()
+
+            if len(numeros_sel) == 1:
+                dato_unico = datos_sel[0]
+                deuda = float(dato_unico['precio'] - dato_unico['abonado'])
+                if deuda > 0.01: 
+                    with st.container(border=True):
+                        st.write(f"💸 **Abonar: {fmt_num.format(dato_unico['numero'])}** (Deuda: ${deuda:.2f})")
+                        c1, c2 = st.columns([2,1])
+                        m = c1.number_input("Monto:", 0.0, deuda, step=1.0, label_visibility="collapsed")
+                        if c2.button("GUARDAR", use_container_width=True) and m > 0:
+                            nt = dato_unico['abonado'] + m
+                            ne = 'pagado' if (dato_unico['precio'] - nt) <= 0.01 else 'abonado'
+                            # Con cliente y abono previo: al reenviarse desde la cola no toca un boleto revendido ni pisa otro abono
+                            run_query("UPDATE boletos SET total_abonado=%s, estado=%s WHERE sorteo_id=%s AND numero=%s AND cliente_id=%s AND total_abonado=%s",
+                                      (nt, ne, id_sorteo, dato_unico['numero'], cid, dato_unico['abonado']), fetch=False,
+                                      cola={'tipo': 'ABONO', 'sorteo_id': id_sorteo, 'numeros': [dato_unico['numero']], 'min_filas': 1},
+                                      historial=(id_sorteo, 'ABONO', f"Boleto {fmt_num.format(dato_unico['numero'])} - {datos_c['nombre']}", m))
+                            st.session_state.seleccion_actual = set(); st.rerun()
+
+            if numeros_sel:
+                c_acc1, c_acc2, c_acc3 = st.columns(3)
+                show_pagar = any(d['estado'] != 'pagado' for d in datos_sel)
+                show_apartar = any(d['estado'] != 'apartado' for d in datos_sel)
                 
-                c_tipo, c_ced = st.columns([1, 3])
-                tipo_doc = c_tipo.selectbox("Tipo", ["V", "E"], index=["V", "E"].index(pre_tipo))
-                ced_num = c_ced.text_input("Cédula", value=pre_num)
+                if show_pagar:
+                    if c_acc1.button("✅ PAGAR", use_container_width=True):
+                        # Una sola sentencia (y un solo INSERT de historial) para todos los boletos marcados
+                        run_query("UPDATE boletos SET estado='pagado', total_abonado=precio WHERE sorteo_id=%s AND numero = ANY(%s) AND cliente_id=%s", (id_sorteo, numeros_sel, cid), fetch=False,
+                                  cola={'tipo': 'PAGO', 'sorteo_id': id_sorteo, 'numeros': numeros_sel, 'min_filas': len(numeros_sel)},
+                                  historial=[(id_sorteo, 'PAGO_COMPLETO', f"Boleto {fmt_num.format(d['numero'])} - {datos_c['nombre']}", d['precio']) for d in datos_sel])
+                        st.session_state.seleccion_actual = set(); st.success("Pagado"); time.sleep(1); st.rerun()
                 
-                et = st.text_input("Teléfono", value=vals[3])
-                ed = st.text_input("Dirección", value=vals[4])
+                if show_apartar:
+                    if c_acc2.button("📌 APARTAR", use_container_width=True):
+                        run_query("UPDATE boletos SET estado='apartado', total_abonado=0 WHERE sorteo_id=%s AND numero = ANY(%s) AND cliente_id=%s", (id_sorteo, numeros_sel, cid), fetch=False,
+                                  cola={'tipo': 'APARTAR', 'sorteo_id': id_sorteo, 'numeros': numeros_sel, 'min_filas': len(numeros_sel)},
+                                  historial=[(id_sorteo, 'REVERTIR_APARTADO', f"Boleto {fmt_num.format(d['numero'])} - {datos_c['nombre']}", 0) for d in datos_sel])
+                        st.session_state.seleccion_actual = set(); st.success("Apartado"); time.sleep(1); st.rerun()
+
+                if c_acc3.button("🗑️ LIBERAR", type="primary", use_container_width=True):
+                    run_query("DELETE FROM boletos WHERE sorteo_id=%s AND numero = ANY(%s) AND cliente_id=%s", (id_sorteo, numeros_sel, cid), fetch=False,
+                              cola={'tipo': 'LIBERAR', 'sorteo_id': id_sorteo, 'numeros': numeros_sel, 'min_filas': len(numeros_sel)},
+                              historial=[(id_sorteo, 'LIBERACION', f"Boleto {fmt_num.format(d['numero'])} - {datos_c['nombre']}", 0) for d in datos_sel])
+                    st.session_state.seleccion_actual = set(); st.warning("Liberados"); time.sleep(1); st.rerun()
+            
+            st.divider()
+            
+            col_pdf, col_wa = st.columns([1, 1])
+            
+            if numeros_sel:
+                partes_nom = datos_c['nombre'].strip().upper().split()
+                if len(partes_nom) >= 3: nom_archivo_cli = f"{partes_nom[0]}_{partes_nom[2]}"
+                elif len(partes_nom) == 2: nom_archivo_cli = f"{partes_nom[0]}_{partes_nom[1]}"
+                else: nom_archivo_cli = partes_nom[0] if partes_nom else "CLIENTE"
+
+                partes_msg = [f"N° {fmt_num.format(d['numero'])} ({d['estado'].upper()})" for d in datos_sel]
+                txt_boletos = ", ".join(partes_msg)
+                tipo_txt = "los comprobantes de tus BOLETOS" if len(numeros_sel) > 1 else "el comprobante de tu BOLETO"
                 
-                c_guardar, c_cancelar = st.columns(2)
+                msg_wa = (
+                    f"Hola. Saludos, somos Sorteos Milán!!, aquí te enviamos {tipo_txt}: "
+                    f"{txt_boletos}, a nombre de {datos_c['nombre']} para el sorteo "
+                    f"'{nombre_s}' del día {fecha_s} a las {hora_s}. ¡Suerte!🍀"
+                )
+
+                with col_pdf:
+                    st.write("**Descargar PDFs:**")
+                    items_pdf = []
+                    for d in datos_sel:
+                        info_pdf = {
+                            'cliente': datos_c['nombre'], 'cedula': datos_c['cedula'], 
+                            'telefono': datos_c['telefono'], 'direccion': datos_c['direccion'], 
+                            'codigo_cli': datos_c['codigo'], 'estado': d['estado'], 
+                            'precio': d['precio'], 'abonado': d['abonado'], 
+                            'fecha_asignacion': d['fecha']
+                        }
+                        n_file = f"{fmt_num.format(d['numero'])} {nom_archivo_cli} ({d['estado'].upper()}).pdf"
+                        items_pdf.append((d['numero'], info_pdf, n_file))
+
+                    if len(items_pdf) <= 3:
+                        for numero_pdf, info_pdf, n_file in items_pdf:
+                            pdf_data = generar_pdf_memoria(numero_pdf, info_pdf, config_full, cantidad_boletos)
+                            st.download_button(f"📄 {fmt_num.format(numero_pdf)}", pdf_data, n_file, "application/pdf", key=f"d_{numero_pdf}", use_container_width=True)
+                    else:
+                        # Muchos boletos: un ZIP armado en segundo plano
+                        clave_zip = "zip_" + firma_datos(id_sorteo, cid, items_pdf, config_full, datetime.now().date())
+                        if st.button(f"📦 Preparar {len(items_pdf)} PDFs", use_container_width=True, key="btn_prep_zip"):
+                            gestor_trabajos().enviar(clave_zip, "PDFs del cliente", trabajo_pdfs_lote, clave_zip, items_pdf, config_full, cantidad_boletos)
+                        mostrar_trabajo(clave_zip, lambda zip_bytes: [("⬇️ ZIP", zip_bytes, f"Boletos {nom_archivo_cli}.zip", "application/zip")])
+
+                with col_wa:
+                    st.write("**Enviar:**")
+                    tel_raw = datos_c['telefono']
+                    tel_clean = "".join(filter(str.isdigit, str(tel_raw or "")))
+                    
+                    if len(tel_clean) == 10: tel_final = "58" + tel_clean
+                    elif len(tel_clean) == 11 and tel_clean.startswith("0"): tel_final = "58" + tel_clean[1:]
+                    else: tel_final = tel_clean
+                    
+                    if len(tel_final) >= 7:
+                        link_wa = f"https://wa.me/{tel_final}?text={urllib.parse.quote(msg_wa)}"
+                        st.link_button("📲 WhatsApp", link_wa, use_container_width=True)
+                    else:
+                        st.warning(f"Tel Inválido: {tel_raw}")
+            else:
+                col_pdf.info("Selecciona para ver PDFs")
+                col_wa.button("📲 WhatsApp", disabled=True, use_container_width=True)
                 
-                if c_guardar.form_submit_button("💾 Guardar Cambios", use_container_width=True):
-                    cedula_final = f"{tipo_doc}-{ced_num}"
-                    run_query("UPDATE clientes SET nombre_completo=%s, cedula=%s, telefono=%s, direccion=%s WHERE id=%s", 
-                             (en, cedula_final, et, ed, id_e), fetch=False)
+@fragmento
+def panel_caja_rapida(ctx):
+    """Pedidos pegados (una línea por cliente): se revisan juntos y se registran en una sola transacción"""
+    id_sorteo, cantidad_boletos, rifa_config = ctx["id_sorteo"], ctx["cantidad_boletos"], ctx["rifa"]
+    fmt_num = formato_numero(cantidad_boletos)
+    st.caption("Una línea por cliente: **números | cliente (código, cédula o nombre) | abono**  \n"
+               "Ej: `045 067 | PEREZ JUAN | 10$` · `10-15 | 000123` · `terminal 7 | V-12345678 | 70`")
+    # Tras registrar quedan en el cuadro solo las líneas con problemas (se fija antes de dibujarlo)
+    if "caja_texto_restante" in st.session_state: st.session_state["caja_texto"] = st.session_state.pop("caja_texto_restante")
+    texto = st.text_area("🧾 Pedidos:", height=180, key="caja_texto", placeholder="045 067 | PEREZ JUAN | 10$")
+    c_rev, c_reg = st.columns(2)
+    revisar = c_rev.button("🔎 Revisar", use_container_width=True, key="caja_revisar")
+    registrar = c_reg.button("💾 REGISTRAR", type="primary", use_container_width=True, key="caja_registrar")
+
+    if (revisar or registrar) and texto.strip():
+        conn = init_connection()
+        if conn is None:
+            st.error("📴 Sin conexión: la caja rápida necesita la BD (usa la venta normal, que sí se encola)."); return
+        pendientes = cola_offline().numeros_pendientes(id_sorteo)
+        try:
+            lineas = caja_rapida.preparar(conn, id_sorteo, texto, lambda t: parsear_boletos(t, cantidad_boletos),
+                                          lambda n: calcular_total_pagar_escala(n, rifa_config), pendientes, fmt_num)
+            hechas = None
+            if registrar and any(not l["error"] for l in lineas):
+                hechas = caja_rapida.registrar(conn, id_sorteo, lineas, fmt_num)
+                st.session_state["ultima_escritura"] = time.time()
+        except ERRORES_CONEXION as e:
+            marcar_bd_caida()
+            st.error(f"📴 Se perdió la conexión, no se registró nada: {e}"); return
+        except psycopg2.Error as e:
+            conn.rollback()
+            st.error(f"Error SQL (no se registró nada): {e}"); return
+        st.session_state["caja_resultado"] = (lineas, hechas)
+        if hechas:
+            st.session_state["caja_texto_restante"] = "\n".join(l["texto"] for l in lineas if l["error"])
+            st.rerun()  # Grilla, totales y cobranza cambian: recorre toda la app
+
+    if "caja_resultado" not in st.session_state: return
+    lineas, hechas = st.session_state["caja_resultado"]
+    buenas = [l for l in lineas if not l["error"]]
+    if hechas is not None:
+        st.success(f"✅ {hechas} línea(s) registradas · {len(lineas) - hechas} con problemas (quedaron en el cuadro para corregir)")
+    elif lineas:
+        st.info(f"🔎 {len(buenas)} de {len(lineas)} línea(s) listas · Total ${sum(l['total'] for l in buenas):,.2f} · Abono ${sum(l['abono'] for l in buenas):,.2f}")
+    filas = [{
+        "Línea": l["linea"], "Números": ", ".join(fmt_num.format(n) for n in l["numeros"]), "Cliente": l["cliente"] or l["cliente_txt"],
+        "Total ($)": l["total"], "Abono ($)": l["abono"], "Resultado": f"❌ {l['error']}" if l["error"] else ("✅ " if hechas is not None else "🟢 ") + l["estado"].upper(),
+    } for l in lineas]
+    if filas: st.dataframe(filas, hide_index=True, use_container_width=True)
+
+# ---------------- PESTAÑA CLIENTES ----------------
+@fragmento
+def fragmento_clientes():
+    st.header("Gestión Clientes")
+    
+    if 'edit_id' in st.session_state:
+        id_e = st.session_state.edit_id
+        vals = st.session_state.edit_vals 
+        
+        st.info(f"✏️ Editando a: **{vals[1]}**")
+        
+        with st.form("edit_cli_form"):
+            en = st.text_input("Nombre", value=vals[1]).upper()
+            
+            ced_parts = vals[2].split('-') if vals[2] and '-' in vals[2] else ["V", vals[2]]
+            pre_tipo = ced_parts[0] if ced_parts[0] in ["V", "E"] else "V"
+            pre_num = ced_parts[1] if len(ced_parts) > 1 else vals[2]
+            
+            c_tipo, c_ced = st.columns([1, 3])
+            tipo_doc = c_tipo.selectbox("Tipo", ["V", "E"], index=["V", "E"].index(pre_tipo))
+            ced_num = c_ced.text_input("Cédula", value=pre_num)
+            
+            et = st.text_input("Teléfono", value=vals[3])
+            ed = st.text_input("Dirección", value=vals[4])
+            
+            c_guardar, c_cancelar = st.columns(2)
+            
+            if c_guardar.form_submit_button("💾 Guardar Cambios", use_container_width=True):
+                # Cédula y teléfono normalizados como en la importación (si no, importar duplicaría al cliente)
+                if guardar_cliente(importar_clientes.actualizar_cliente, id_e, en, f"{tipo_doc}{ced_num}", et, ed):
                     del st.session_state.edit_id
                     del st.session_state.edit_vals
                     st.success("✅ Cliente Actualizado")
                     time.sleep(1)
                     st.rerun()
-                    
-                if c_cancelar.form_submit_button("❌ Cancelar Edición", use_container_width=True):
-                    del st.session_state.edit_id
-                    del st.session_state.edit_vals
-                    st.rerun()
-            
-            st.divider()
-            
-        else:
-            with st.expander("➕ Nuevo Cliente", expanded=False):
-                with st.form("new_cli"):
-                    st.write("📝 **Datos del Cliente**")
-                    nn = st.text_input("Nombre Completo").upper()
-                    
-                    c_tipo, c_ced = st.columns([1, 3])
-                    tipo_doc = c_tipo.selectbox("Tipo", ["V", "E"], label_visibility="collapsed")
-                    ced_num = c_ced.text_input("Cédula", placeholder="Ej: 12345678", label_visibility="collapsed")
-                    
-                    nt = st.text_input("Teléfono")
-                    nd = st.text_input("Dirección")
-                    
-                    if st.form_submit_button("💾 Guardar Cliente", use_container_width=True):
-                        if nn and ced_num and nt:
-                            cedula_final = f"{tipo_doc}-{ced_num}"
-                            
-                            codigos_existentes = set()
-                            rows = run_query("SELECT codigo FROM clientes")
-                            if rows:
-                                for r in rows:
-                                    try: codigos_existentes.add(int(r[0]))
-                                    except: pass
-                            
-                            nuevo_codigo = 1
-                            while nuevo_codigo in codigos_existentes:
-                                nuevo_codigo += 1
-                            cod_final = f"{nuevo_codigo:06d}"
-                            
-                            run_query("""
-                                INSERT INTO clientes (codigo, nombre_completo, cedula, telefono, direccion, fecha_registro) 
-                                VALUES (%s, %s, %s, %s, %s, NOW())
-                            """, (cod_final, nn, cedula_final, nt, nd), fetch=False)
-                            
+                
+            if c_cancelar.form_submit_button("❌ Cancelar Edición", use_container_width=True):
+                del st.session_state.edit_id
+                del st.session_state.edit_vals
+                rerun_panel()
+        
+        st.divider()
+        
+    else:
+        with st.expander("➕ Nuevo Cliente", expanded=False):
+            with st.form("new_cli"):
+                st.write("📝 **Datos del Cliente**")
+                nn = st.text_input("Nombre Completo").upper()
+                
+                c_tipo, c_ced = st.columns([1, 3])
+                tipo_doc = c_tipo.selectbox("Tipo", ["V", "E"], label_visibility="collapsed")
+                ced_num = c_ced.text_input("Cédula", placeholder="Ej: 12345678", label_visibility="collapsed")
+                
+                nt = st.text_input("Teléfono")
+                nd = st.text_input("Dirección")
+                
+                if st.form_submit_button("💾 Guardar Cliente", use_container_width=True):
+                    if nn and ced_num and nt:
+                        # Siguiente correlativo por índice, con el mismo candado que la importación
+                        cod_final = guardar_cliente(importar_clientes.registrar_cliente, nn, f"{tipo_doc}{ced_num}", nt, nd)
+                        if cod_final:
                             st.success(f"✅ Registrado: {cod_final}")
                             time.sleep(1.5)
                             st.rerun()
-                        else:
-                            st.error("⚠️ Faltan datos")
+                    else:
+                        st.error("⚠️ Faltan datos")
 
-        st.write("### 📋 Lista de Clientes")
-        q = st.text_input("🔍 Buscar cliente (Nombre o Cédula)...", key="search_cli")
-        sql = "SELECT id, nombre_completo, cedula, telefono, direccion, codigo FROM clientes"
-        
-        if q: 
-            sql += " WHERE nombre_completo ILIKE %s OR cedula ILIKE %s"
-            sql += " ORDER BY id DESC LIMIT 15"
-            res = run_query(sql, (f"%{q}%", f"%{q}%"))
-        else:
-            sql += " ORDER BY id DESC LIMIT 15"
-            res = run_query(sql)
-        
-        if res:
-            for c in res:
-                with st.container(border=True):
-                    c1, c2 = st.columns([3,1])
-                    with c1:
-                        st.markdown(f"<b>{c[1]}</b>", unsafe_allow_html=True)
-                        st.caption(f"🆔 {c[2]} | 🔑 Cód: {c[5]}")
-                        st.caption(f"📞 {c[3]} | 📍 {c[4]}")
-                    with c2:
-                        if st.button("✏️", key=f"edit_{c[0]}", use_container_width=True):
-                            st.session_state.edit_id = c[0]
-                            st.session_state.edit_vals = c
-                            st.rerun()
+        with st.expander("📥 Importar Clientes (CSV / Excel)", expanded=False):
+            panel_importar_clientes()
+
+    st.write("### 📋 Lista de Clientes")
+    q = st.text_input("🔍 Buscar cliente (Nombre o Cédula)...", key="search_cli")
+    if q: 
+        res = run_query(SQL["clientes_buscar"], (f"%{q}%", f"%{q}%"), lectura=True)
+    else:
+        res = navegador_clientes()
+    
+    if res:
+        for c in res:
+            with st.container(border=True):
+                c1, c2 = st.columns([3,1])
+                with c1:
+                    st.markdown(f"<b>{c[1]}</b>", unsafe_allow_html=True)
+                    st.caption(f"🆔 {c[2]} | 🔑 Cód: {c[5]}")
+                    st.caption(f"📞 {c[3]} | 📍 {c[4]}")
+                with c2:
+                    if st.button("✏️", key=f"edit_{c[0]}", use_container_width=True):
+                        st.session_state.edit_id = c[0]
+                        st.session_state.edit_vals = c
+                        rerun_panel()
+
+def guardar_cliente(funcion, *datos):
+    """Alta o edición del formulario (importar_clientes). Devuelve su resultado, o None tras mostrar el error"""
+    if not esquema_listo(importar_clientes.VERSION_MINIMA):
+        aviso_migrar("Guardar clientes necesita la cédula normalizada"); return None
+    conn = init_connection()
+    if conn is None: st.error("📴 Sin conexión con la BD."); return None
+    try:
+        resultado = funcion(conn, *datos)
+    except ValueError as e:
+        st.error(f"⚠️ {e}"); return None
+    except ERRORES_CONEXION as e:
+        marcar_bd_caida()
+        st.error(f"📴 Se perdió la conexión, no se guardó: {e}"); return None
+    except psycopg2.Error as e:
+        st.error(f"Error SQL (no se guardó): {e}"); return None
+    st.session_state["ultima_escritura"] = time.time()
+    return True if resultado is None else resultado
+
+def panel_importar_clientes():
+    """Carga masiva: COPY a una tabla temporal, fusión por cédula y códigos en bloque (importar_clientes.py)"""
+    st.caption("Columnas con encabezado: **Nombre**, **Cédula**, Teléfono, Dirección (en cualquier orden). "
+               "Si la cédula ya existe, solo se completan teléfono y dirección vacíos.")
+    archivo = st.file_uploader("Archivo", type=["csv", "xlsx"], key="importar_archivo", label_visibility="collapsed")
+    if archivo and st.button("📥 IMPORTAR", use_container_width=True, type="primary", key="btn_importar"):
+        if not esquema_listo(importar_clientes.VERSION_MINIMA):
+            aviso_migrar("La importación necesita la cédula normalizada"); return
+        conn = init_connection()
+        if conn is None: st.error("📴 Sin conexión con la BD."); return
+        try:
+            with st.spinner("Importando..."):
+                reporte = importar_clientes.importar(conn, archivo.getvalue(), archivo.name)
+        except ValueError as e:
+            st.error(f"⚠️ {e}"); return
+        except ERRORES_CONEXION as e:
+            marcar_bd_caida()
+            st.error(f"📴 Se perdió la conexión, no se importó nada: {e}"); return
+        except psycopg2.Error as e:
+            st.error(f"Error SQL (no se importó nada): {e}"); return
+        st.session_state["ultima_escritura"] = time.time()
+        st.session_state["importar_reporte"] = reporte
+    reporte = st.session_state.get("importar_reporte")
+    if not reporte: return
+    c_ins, c_fus, c_rec = st.columns(3)
+    c_ins.metric("✅ Insertados", reporte["insertados"])
+    c_fus.metric("🔗 Fusionados", reporte["fusionados"])
+    c_rec.metric("❌ Rechazados", len(reporte["rechazados"]))
+    if reporte["rechazados"]:
+        st.dataframe([{"Fila": f, "Motivo": m, "Datos": d} for f, m, d in reporte["rechazados"]], hide_index=True, use_container_width=True)
+
+# ---------------- NAVEGADOR DE CLIENTES (PÁGINAS POR CLAVE) ----------------
+# Cada página es una sola consulta por índice desde la última fila vista
+# (id, o nombre+id), así cuesta lo mismo la primera que la página 500.
+CLIENTES_POR_PAGINA = 15
+TOTAL_CLIENTES_TTL_S = 60
+LETRAS_CLIENTES = list("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+ORDENES_CLIENTES = {"🕒 Recientes": "id", "🔤 A-Z": "nombre"}
+
+def _cursor_inicial(orden, letra=None):
+    return 2147483647 if orden == "id" else (letra or "", 0)
+
+def _reiniciar_paginas():
+    letra = st.session_state.get("cli_letra") if ORDENES_CLIENTES[st.session_state.cli_orden] == "nombre" else None
+    st.session_state.cli_cursores = [_cursor_inicial(ORDENES_CLIENTES[st.session_state.cli_orden], letra)]
+
+def _pagina_siguiente(cursor):
+    st.session_state.cli_cursores.append(cursor)
+
+def _pagina_anterior():
+    if len(st.session_state.cli_cursores) > 1: st.session_state.cli_cursores.pop()
+
+def total_clientes():
+    """COUNT(*) de clientes: se recalcula a lo sumo cada minuto, o tras una escritura de esta sesión"""
+    marca = st.session_state.get("ultima_escritura", 0.0)
+    guardado = st.session_state.get("cli_total")
+    if guardado and guardado[1] == marca and time.time() - guardado[2] < TOTAL_CLIENTES_TTL_S: return guardado[0]
+    filas = run_query(SQL["clientes_total"], lectura=True)
+    total = filas[0][0] if filas else 0
+    st.session_state.cli_total = (total, marca, time.time())
+    return total
+
+def navegador_clientes():
+    """Página actual de clientes (orden reciente o A-Z, con salto por letra). Devuelve sus filas"""
+    c_orden, c_total = st.columns([3, 2])
+    with c_orden:
+        orden = ORDENES_CLIENTES[st.radio("Orden", list(ORDENES_CLIENTES), horizontal=True, key="cli_orden",
+                                          label_visibility="collapsed", on_change=_reiniciar_paginas)]
+    c_total.caption(f"👥 {total_clientes():,} clientes")
+    if orden == "nombre":
+        st.pills("Saltar a", LETRAS_CLIENTES, key="cli_letra", label_visibility="collapsed", on_change=_reiniciar_paginas)
+    if "cli_cursores" not in st.session_state: _reiniciar_paginas()
+
+    cursor = st.session_state.cli_cursores[-1]
+    params = (cursor, CLIENTES_POR_PAGINA + 1) if orden == "id" else (cursor[0], cursor[1], CLIENTES_POR_PAGINA + 1)
+    filas = run_query(SQL["clientes_pagina_" + orden], params, lectura=True) or []
+    # Se pide una fila de más solo para saber si hay página siguiente
+    hay_mas = len(filas) > CLIENTES_POR_PAGINA
+    filas = filas[:CLIENTES_POR_PAGINA]
+
+    n_pag = len(st.session_state.cli_cursores)
+    letra = st.session_state.cli_cursores[0][0] if orden == "nombre" else ""
+    desde = f" desde «{letra}»" if letra else ""
+    c_ant, c_pag, c_sig = st.columns([1, 2, 1])
+    c_ant.button("◀", key="cli_ant", use_container_width=True, disabled=n_pag == 1, on_click=_pagina_anterior)
+    c_pag.caption(f"Página {n_pag}{desde}" if filas else f"Sin clientes{desde}")
+    siguiente = (filas[-1][0] if orden == "id" else (filas[-1][1], filas[-1][0])) if filas else None
+    c_sig.button("▶", key="cli_sig", use_container_width=True, disabled=not hay_mas, on_click=_pagina_siguiente, args=(siguiente,))
+    return filas
 
 # ---------------- PESTAÑA COBRANZA ----------------
-    with tab_cobranza:
-        st.header("📊 Gestión de Cobranza")
-        
-        if st.button("🔄 Actualizar Datos", use_container_width=True):
-            st.rerun()
+@fragmento
+def pestana_cobranza(ctx):
+    vista, fecha_s, hora_s, cantidad_boletos = ctx["vista"], ctx["fecha"], ctx["hora"], ctx["cantidad_boletos"]
+    st.header("📊 Gestión de Cobranza")
+    
+    if st.button("🔄 Actualizar Datos", use_container_width=True):
+        st.rerun()
 
-        st.write("---")
-        
-        sql_estado = """
-            SELECT 
-                b.numero as "Número", 
-                c.nombre_completo as "Cliente", 
-                c.telefono as "Teléfono", 
-                c.cedula as "Cédula",
-                UPPER(b.estado) as "Estado", 
-                b.precio as "Precio ($)", 
-                b.total_abonado as "Abonado ($)", 
-                (b.precio - b.total_abonado) as "Saldo Pendiente ($)",
-                b.fecha_asignacion as "Fecha Asignación"
-            FROM boletos b
-            JOIN clientes c ON b.cliente_id = c.id
-            WHERE b.sorteo_id = %s
-            ORDER BY b.numero ASC
-        """
-        rows_estado = run_query(sql_estado, (id_sorteo,))
-
-        sql_hist = """
-            SELECT 
-                fecha_hora,
-                usuario, 
-                accion, 
-                detalle, 
-                monto
-            FROM historial 
-            WHERE sorteo_id = %s 
-            ORDER BY id ASC
-        """
-        rows_hist = run_query(sql_hist, (id_sorteo,))
+    st.write("---")
+    
+    panel_excel_cobranza(ctx)
 
-        buffer = io.BytesIO()
-        hay_datos = False
-        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-            
-            if rows_estado:
-                df_estado = pd.DataFrame(rows_estado, columns=["Número", "Cliente", "Teléfono", "Cédula", "Estado", "Precio ($)", "Abonado ($)", "Saldo Pendiente ($)", "Fecha Asignación"])
-                try: df_estado["Fecha Asignación"] = pd.to_datetime(df_estado["Fecha Asignación"]).dt.strftime('%d/%m/%Y')
-                except: pass
-                
-                df_estado.to_excel(writer, index=False, sheet_name='Estado General')
-                hay_datos = True
-            else:
-                pd.DataFrame(columns=["Mensaje"]).to_excel(writer, sheet_name='Estado General', index=False)
+    st.divider()
+        
+    raw_deudores = vista['deudores']
+    
+    if not raw_deudores:
+        st.success("✅ ¡Cero Deudas! Todos están al día.")
+    else:
+        grupos = agrupar_deudores(raw_deudores)
 
-            if rows_hist:
-                df_hist = pd.DataFrame(rows_hist, columns=["FechaRaw", "Usuario", "Acción", "Detalle", "MontoRaw"])
-                df_hist.insert(0, "Nro. Transacción", range(1, len(df_hist) + 1))
-                
-                try:
-                    df_hist["FechaRaw"] = pd.to_datetime(df_hist["FechaRaw"]) - pd.Timedelta(hours=4)
-                    df_hist["Fecha"] = df_hist["FechaRaw"].dt.strftime('%d/%m/%Y')
-                    df_hist["Hora"] = df_hist["FechaRaw"].dt.strftime('%I:%M %p') 
-                except:
-                    df_hist["Fecha"] = df_hist["FechaRaw"].astype(str)
-                    df_hist["Hora"] = ""
-
-                def separar_detalle(texto):
-                    boleto = texto
-                    cliente = ""
-                    if " - " in str(texto):
-                        partes = str(texto).split(" - ", 1)
-                        boleto = partes[0].strip() 
-                        resto = partes[1].strip()  
-                        if " | " in resto:
-                            cliente = resto.split(" | ")[0].strip()
-                        else:
-                            cliente = resto
-                    return pd.Series([boleto, cliente])
-
-                df_hist[["Boletos", "Cliente"]] = df_hist["Detalle"].apply(separar_detalle)
-                df_hist["Monto ($)"] = df_hist["MontoRaw"].apply(lambda x: "{:.2f}".format(float(x) if x else 0.0))
-                
-                cols_finales = ["Nro. Transacción", "Fecha", "Hora", "Usuario", "Acción", "Boletos", "Cliente", "Monto ($)"]
-                df_export = df_hist[cols_finales]
-                
-                df_export.to_excel(writer, index=False, sheet_name='Historial Movimientos')
-                
-                worksheet = writer.sheets['Historial Movimientos']
-                worksheet.set_column('A:A', 10) 
-                worksheet.set_column('B:C', 12) 
-                worksheet.set_column('F:F', 15) 
-                worksheet.set_column('G:G', 40) 
-                
-                hay_datos = True
+        gran_total = sum(g['t_deuda'] for g in grupos.values())
+        st.metric("Total por Cobrar", f"${gran_total:,.2f}", f"{len(grupos)} Clientes con deuda")
         
-        if hay_datos:
-            st.download_button(
-                label="📥 DESCARGAR REPORTE COMPLETO (Excel)",
-                data=buffer,
-                file_name=f"Reporte_Total_{nombre_s}.xlsx",
-                mime="application/vnd.ms-excel",
-                use_container_width=True,
-                type="primary"
-            )
-        else:
-            st.info("No hay información para generar reporte.")
+        st.write("---")
 
-        st.divider()
-            
-        raw_deudores = run_query("""
-            SELECT c.nombre_completo, c.telefono, b.numero, b.precio, b.total_abonado
-            FROM boletos b
-            JOIN clientes c ON b.cliente_id = c.id
-            WHERE b.sorteo_id = %s
-              AND (b.precio - b.total_abonado) > 0.01 
-              AND b.estado != 'disponible'
-            ORDER BY c.nombre_completo
-        """, (id_sorteo,))
+        fmt_num = formato_numero(cantidad_boletos)
         
-        if not raw_deudores:
-            st.success("✅ ¡Cero Deudas! Todos están al día.")
-        else:
-            grupos = {}
-            for row in raw_deudores:
-                nom, tel, num, prec, abon = row
-                prec = float(prec or 0); abon = float(abon or 0)
-                deuda = prec - abon
-                clave = f"{nom}|{tel}"
-                if clave not in grupos:
-                    grupos[clave] = {'nombre': nom, 'tel': tel, 'numeros': [], 't_deuda': 0.0}
-                grupos[clave]['numeros'].append(num)
-                grupos[clave]['t_deuda'] += deuda
-
-            gran_total = sum(g['t_deuda'] for g in grupos.values())
-            st.metric("Total por Cobrar", f"${gran_total:,.2f}", f"{len(grupos)} Clientes con deuda")
+        for clave, d in grupos.items():
+            nom = d['nombre']
+            tel = d['tel']
+            lista_nums = sorted(d['numeros'])
+            str_numeros = ", ".join([fmt_num.format(n) for n in lista_nums])
             
-            st.write("---")
+            with st.container(border=True):
+                c_info, c_btn = st.columns([2, 1])
+                with c_info:
+                    # Se agrega .strip() para evitar error de los asteriscos **
+                    st.markdown(f"👤 **{nom.strip()}**")
+                    st.caption(f"🎟️ Boletos: **{str_numeros}**")
+                    st.write(f"🔴 Deuda: :red[**${d['t_deuda']:,.2f}**]")
+                with c_btn:
+                    if tel and len(str(tel)) > 5:
+                        tel_clean = "".join(filter(str.isdigit, str(tel)))
+                        if len(tel_clean) == 10: tel_clean = "58" + tel_clean
+                        elif len(tel_clean) == 11 and tel_clean.startswith("0"): tel_clean = "58" + tel_clean[1:]
+                        
+                        txt_concepto = "de tus boletos" if len(lista_nums) > 1 else "de tu boleto"
+                        
+                        # Generamos la fecha inteligente
+                        txt_fecha = formato_fecha_inteligente(fecha_s)
+                        
+                        # MENSAJE DE COBRANZA INTELIGENTE
+                        msg = (f"Hola {nom.strip()}, saludos de Sorteos Milán. "
+                               f"Te recordamos amablemente que tienes un saldo pendiente de ${d['t_deuda']:.2f} "
+                               f"{txt_concepto}: {str_numeros}, para el sorteo {txt_fecha} a las {hora_s}. "
+                               f"Agradecemos tu pago. ¡Gracias! 🍀")
+                        
+                        link = f"https://wa.me/{tel_clean}?text={urllib.parse.quote(msg)}"
+                        
+                        st.link_button("📲 Cobrar", link, use_container_width=True)
+                        
+@fragmento
+def panel_excel_cobranza(ctx):
+    vista, id_sorteo, nombre_s = ctx["vista"], ctx["id_sorteo"], ctx["nombre"]
+    # El Excel se arma en segundo plano: la sesión sigue respondiendo mientras tanto.
+    # Las filas completas solo se leen al pedirlo y la clave es la huella de esas filas:
+    # editar un cliente no deja rastro en historial, pero sí cambia las filas
+    vista_actual = (id_sorteo, vista['ultimo_historial'], vista['totales'])
+    if st.button("📊 GENERAR REPORTE COMPLETO (Excel)", use_container_width=True, type="primary"):
+        rows_estado = run_query(SQL["cobranza_estado"], (id_sorteo,), lectura=True)
+        rows_hist = run_query(SQL["cobranza_historial"], (id_sorteo,), lectura=True)
+        clave_excel = "xlsx_" + firma_datos(id_sorteo, rows_estado, rows_hist)
+        st.session_state["excel_cobranza"] = (vista_actual, clave_excel)
+        if not almacen().contiene(clave_excel):
+            gestor_trabajos().enviar(clave_excel, "Reporte Excel", trabajo_excel_cobranza, clave_excel, rows_estado, rows_hist)
+    pedido = st.session_state.get("excel_cobranza")
+    if pedido and pedido[0] == vista_actual:  # Con un movimiento nuevo el reporte pedido ya quedó viejo
+        mostrar_trabajo(pedido[1], lambda xlsx: [("📥 DESCARGAR REPORTE COMPLETO (Excel)", xlsx, f"Reporte_Total_{nombre_s}.xlsx", "application/vnd.ms-excel")])
+
+# ============================================================================
+#  TABLERO GLOBAL (AGREGADOS DIARIOS)
+# ============================================================================
+@fragmento
+def tablero_global():
+    st.header("📈 Todos los Sorteos")
+    # Solo se consulta si se pide: las pestañas se dibujan en cada rerun
+    if not st.toggle("Cargar tablero", key="ver_tablero"): return
+    try:
+        if not esquema_listo(agregados.VERSION_MINIMA):
+            aviso_migrar("El tablero necesita las tablas de resumen"); return
+    except Exception as e:
+        st.error(f"No se pudo leer el esquema: {e}"); return
+
+    dias = st.select_slider("Período", options=[7, 30, 90, 365], value=30, format_func=lambda d: f"{d} días")
+    sorteos = run_query(agregados.SQL_TABLERO_SORTEOS, lectura=True) or []
+    por_dia = run_query(agregados.SQL_TABLERO_DIAS, (dias,), lectura=True) or []
+    top = run_query(agregados.SQL_TABLERO_CLIENTES, (10,), lectura=True) or []
+
+    monto = sum(float(r[4]) for r in sorteos)
+    abonado = sum(float(r[5]) for r in sorteos)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Vendido", f"${monto:,.2f}")
+    c2.metric("Cobrado", f"${abonado:,.2f}", f"{(abonado / monto * 100) if monto else 0:.0f}% cobranza")
+    c3.metric("Por Cobrar", f"${monto - abonado:,.2f}")
+
+    if por_dia:
+        import pandas as pd
+        st.write("#### 📅 Ventas por día")
+        df_dias = pd.DataFrame(por_dia, columns=["Día", "Boletos", "Vendido ($)", "Liberados", "Cobrado ($)", "Movimientos"]).set_index("Día")
+        df_dias = df_dias.astype(float)
+        st.bar_chart(df_dias[["Boletos"]])
+        st.line_chart(df_dias[["Vendido ($)", "Cobrado ($)"]])
+
+    st.write("#### 🎲 Por sorteo")
+    st.dataframe([
+        {"Sorteo": r[1], "Activo": "🟢" if r[2] else "⚪", "Boletos": r[3], "Vendido ($)": float(r[4]), "Cobrado ($)": float(r[5]),
+         "Deuda ($)": float(r[4]) - float(r[5]), "% Cobranza": round(float(r[5]) / float(r[4]) * 100, 1) if float(r[4]) else 0.0}
+        for r in sorteos
+    ], hide_index=True, use_container_width=True)
+
+    if top:
+        st.write("#### 🏆 Mejores clientes")
+        st.dataframe([
+            {"Cliente": r[0], "Teléfono": r[1], "Boletos": r[2], "Comprado ($)": float(r[3]), "Deuda ($)": float(r[3]) - float(r[4])}
+            for r in top
+        ], hide_index=True, use_container_width=True)
+
+# ============================================================================
+#  PRECALENTADO (OPCIONAL, SORTEOS_CALENTAR=1)
+# ============================================================================
+# pandas, reportlab y PIL se importan dentro de las funciones que los usan: la
+# primera pantalla no los espera. Con el precalentado se cargan igual, pero en
+# segundo plano mientras se escribe la contraseña, junto con fuentes, logo y BD.
+CALENTAR = os.environ.get("SORTEOS_CALENTAR") == "1"
+
+# Los módulos pesados que se importan a pedido: aquí se cargan de antemano
+MODULOS_PESADOS = ("pandas", "reportlab.pdfgen.canvas", "PIL.Image", "PIL.ImageDraw")
+
+def _calentar():
+    for modulo in MODULOS_PESADOS:
+        importlib.import_module(modulo)
+    logo_local()
+    lay = layout_grilla(1000)
+    for size, negrita in [(lay['font_title'], True), (lay['font_info'], False), (lay['font_num'], True)]:
+        cargar_fuente_fija(size, is_bold=negrita)
+    try: _conexion_bd(DB_URI)
+    except Exception: pass  # Sin BD: la primera consulta avisará como siempre
+
+@st.cache_resource
+def precalentar():
+    """Lanza el precalentado una sola vez por proceso (no bloquea la pantalla)"""
+    hilo = threading.Thread(target=_calentar, name="precalentado", daemon=True)
+    hilo.start()
+    return hilo
 
-            fmt_num = "{:02d}" if cantidad_boletos <= 100 else "{:03d}"
-            
-            for clave, d in grupos.items():
-                nom = d['nombre']
-                tel = d['tel']
-                lista_nums = sorted(d['numeros'])
-                str_numeros = ", ".join([fmt_num.format(n) for n in lista_nums])
-                
-                with st.container(border=True):
-                    c_info, c_btn = st.columns([2, 1])
-                    with c_info:
-                        # Se agrega .strip() para evitar error de los asteriscos **
-                        st.markdown(f"👤 **{nom.strip()}**")
-                        st.caption(f"🎟️ Boletos: **{str_numeros}**")
-                        st.write(f"🔴 Deuda: :red[**${d['t_deuda']:,.2f}**]")
-                    with c_btn:
-                        if tel and len(str(tel)) > 5:
-                            tel_clean = "".join(filter(str.isdigit, str(tel)))
-                            if len(tel_clean) == 10: tel_clean = "58" + tel_clean
-                            elif len(tel_clean) == 11 and tel_clean.startswith("0"): tel_clean = "58" + tel_clean[1:]
-                            
-                            txt_concepto = "de tus boletos" if len(lista_nums) > 1 else "de tu boleto"
-                            
-                            # Generamos la fecha inteligente
-                            txt_fecha = formato_fecha_inteligente(fecha_s)
-                            
-                            # MENSAJE DE COBRANZA INTELIGENTE
-                            msg = (f"Hola {nom.strip()}, saludos de Sorteos Milán. "
-                                   f"Te recordamos amablemente que tienes un saldo pendiente de ${d['t_deuda']:.2f} "
-                                   f"{txt_concepto}: {str_numeros}, para el sorteo {txt_fecha} a las {hora_s}. "
-                                   f"Agradecemos tu pago. ¡Gracias! 🍀")
-                            
-                            link = f"https://wa.me/{tel_clean}?text={urllib.parse.quote(msg)}"
-                            
-                            st.link_button("📲 Cobrar", link, use_container_width=True)
-                            
 # ============================================================================
 #  PUNTO DE ENTRADA (CON LOGIN Y TIMEOUT)
 # ============================================================================
 if __name__ == "__main__":
+    if CALENTAR: precalentar()
     if check_password():
         if verificar_inactividad():
             main()
@@ -0,0 +1,157 @@
+"""
+Archivo de sorteos cerrados.
+
+Los boletos e historial de los sorteos inactivos (activo = FALSE) se mueven
+a boletos_archivo / historial_archivo. Las tablas calientes solo guardan lo
+de los sorteos en curso, así la ocupación, los totales y la cobranza no se
+vuelven más lentos con los años. Lo archivado sigue a mano para reportes en
+las vistas boletos_todos / historial_todos, y se puede restaurar.
+
+Uso:
+    python archivo_sorteos.py --dsn postgresql://... listar
+    python archivo_sorteos.py --dsn postgresql://... archivar --sorteo 12
+    python archivo_sorteos.py --dsn postgresql://... archivar --inactivos --dias 30
+    python archivo_sorteos.py --dsn postgresql://... restaurar --sorteo 12
+    python archivo_sorteos.py --dsn postgresql://... exportar --sorteo 12 --salida sorteo12.xlsx
+"""
+import argparse
+import sys
+
+import psycopg2
+
+import migraciones
+from reporte_cobranza import generar_excel_cobranza
+
+# Mover filas no es vender ni liberar: el trigger de agregados (migraciones.py) lo ignora
+SIN_AGREGADOS = "SET LOCAL sorteos.archivando = 'on'"
+
+
+def _mover(cur, origen, destino, sorteo_id):
+    cur.execute(f"""
+        WITH movidas AS (DELETE FROM {origen} WHERE sorteo_id = %s RETURNING *)
+        INSERT INTO {destino} SELECT * FROM movidas
+    """, (sorteo_id,))
+    return cur.rowcount
+
+
+def archivar(conn, sorteo_id):
+    """Mueve un sorteo inactivo al archivo en una sola transacción. Devuelve (boletos, historial)"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT activo FROM sorteos WHERE id = %s FOR UPDATE", (sorteo_id,))
+        fila = cur.fetchone()
+        if fila is None: raise LookupError(f"No existe el sorteo {sorteo_id}")
+        if fila[0]: raise ValueError(f"El sorteo {sorteo_id} está activo: desactívalo antes de archivarlo")
+        cur.execute("SELECT 1 FROM sorteos_archivados WHERE sorteo_id = %s", (sorteo_id,))
+        if cur.fetchone(): raise ValueError(f"El sorteo {sorteo_id} ya está archivado")
+        cur.execute(SIN_AGREGADOS)
+        n_boletos = _mover(cur, "boletos", "boletos_archivo", sorteo_id)
+        n_historial = _mover(cur, "historial", "historial_archivo", sorteo_id)
+        cur.execute("INSERT INTO sorteos_archivados (sorteo_id, boletos, historial) VALUES (%s, %s, %s)", (sorteo_id, n_boletos, n_historial))
+    conn.commit()
+    return n_boletos, n_historial
+
+
+def restaurar(conn, sorteo_id):
+    """Devuelve un sorteo archivado a las tablas calientes. Devuelve (boletos, historial)"""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM sorteos_archivados WHERE sorteo_id = %s RETURNING sorteo_id", (sorteo_id,))
+        if cur.fetchone() is None: raise LookupError(f"El sorteo {sorteo_id} no está archivado")
+        cur.execute(SIN_AGREGADOS)
+        n_boletos = _mover(cur, "boletos_archivo", "boletos", sorteo_id)
+        n_historial = _mover(cur, "historial_archivo", "historial", sorteo_id)
+    conn.commit()
+    return n_boletos, n_historial
+
+
+def inactivos_para_archivar(conn, dias=0):
+    """Sorteos inactivos sin archivar cuya fecha de sorteo pasó hace más de `dias`"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.id FROM sorteos s
+            WHERE s.activo = FALSE
+              AND NOT EXISTS (SELECT 1 FROM sorteos_archivados a WHERE a.sorteo_id = s.id)
+              AND (s.fecha_sorteo IS NULL OR s.fecha_sorteo < CURRENT_DATE - %s)
+            ORDER BY s.id
+        """, (dias,))
+        return [r[0] for r in cur.fetchall()]
+
+
+def listar(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.id, s.nombre, s.activo, s.fecha_sorteo, a.archivado,
+                   COALESCE(a.boletos, (SELECT COUNT(*) FROM boletos b WHERE b.sorteo_id = s.id)),
+                   COALESCE(a.historial, (SELECT COUNT(*) FROM historial h WHERE h.sorteo_id = s.id))
+            FROM sorteos s LEFT JOIN sorteos_archivados a ON a.sorteo_id = s.id
+            ORDER BY s.id
+        """)
+        return cur.fetchall()
+
+
+def exportar(conn, sorteo_id, salida):
+    """Reporte Excel de cobranza de cualquier sorteo (archivado o no), leyendo las vistas *_todos"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT b.numero, c.nombre_completo, c.telefono, c.cedula, UPPER(b.estado), b.precio, b.total_abonado,
+                   (b.precio - b.total_abonado), b.fecha_asignacion
+            FROM boletos_todos b JOIN clientes c ON b.cliente_id = c.id
+            WHERE b.sorteo_id = %s ORDER BY b.numero
+        """, (sorteo_id,))
+        rows_estado = cur.fetchall()
+        cur.execute("SELECT fecha_hora, usuario, accion, detalle, monto FROM historial_todos WHERE sorteo_id = %s ORDER BY id", (sorteo_id,))
+        rows_hist = cur.fetchall()
+    buffer, hay_datos = generar_excel_cobranza(rows_estado, rows_hist)
+    if not hay_datos: return False
+    with open(salida, "wb") as f: f.write(buffer.getvalue())
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivo de sorteos cerrados")
+    parser.add_argument("--dsn", required=True)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("listar", help="Sorteos con su estado de archivo")
+    p_arch = sub.add_parser("archivar", help="Mueve sorteos inactivos al archivo")
+    p_arch.add_argument("--sorteo", type=int)
+    p_arch.add_argument("--inactivos", action="store_true", help="Todos los inactivos sin archivar")
+    p_arch.add_argument("--dias", type=int, default=0, help="Con --inactivos: solo si el sorteo fue hace más de N días")
+    p_rest = sub.add_parser("restaurar", help="Devuelve un sorteo archivado a las tablas calientes")
+    p_rest.add_argument("--sorteo", type=int, required=True)
+    p_exp = sub.add_parser("exportar", help="Excel de cobranza de un sorteo (también archivado)")
+    p_exp.add_argument("--sorteo", type=int, required=True)
+    p_exp.add_argument("--salida", required=True)
+    args = parser.parse_args()
+
+    with psycopg2.connect(args.dsn) as conn:
+        migraciones.migrar(conn)  # Tablas y vistas del archivo (migración 4)
+        if args.comando == "listar":
+            print(f"{'ID':>5}  {'Sorteo':<30}{'Estado':<12}{'Boletos':>9}{'Historial':>11}")
+            for sid, nombre, activo, fecha, archivado, n_bol, n_hist in listar(conn):
+                estado = "activo" if activo else ("archivado" if archivado else "inactivo")
+                print(f"{sid:>5}  {nombre[:29]:<30}{estado:<12}{n_bol:>9}{n_hist:>11}")
+        elif args.comando == "archivar":
+            ids = [args.sorteo] if args.sorteo else (inactivos_para_archivar(conn, args.dias) if args.inactivos else [])
+            if not ids:
+                print("Nada que archivar (usa --sorteo ID o --inactivos)."); return 0
+            for sid in ids:
+                try:
+                    n_bol, n_hist = archivar(conn, sid)
+                    print(f"📦 Sorteo {sid}: {n_bol} boletos y {n_hist} movimientos archivados")
+                except (LookupError, ValueError) as e:
+                    conn.rollback()
+                    print(f"⚠️ {e}")
+        elif args.comando == "restaurar":
+            try:
+                n_bol, n_hist = restaurar(conn, args.sorteo)
+            except LookupError as e:
+                conn.rollback()
+                print(f"⚠️ {e}"); return 1
+            print(f"♻️ Sorteo {args.sorteo}: {n_bol} boletos y {n_hist} movimientos restaurados")
+        elif args.comando == "exportar":
+            if exportar(conn, args.sorteo, args.salida): print(f"💾 {args.salida}")
+            else: print("Sin datos para ese sorteo."); return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""
+Historial de movimientos (auditoría).
+
+El historial ya no es un INSERT + COMMIT aparte por boleto: cada escritura
+lleva sus filas y van en un solo INSERT de varias filas (unnest) dentro de la
+misma transacción. Queda guardado exactamente cuando se confirma la acción que
+describe; si la acción se deshace, sus filas también. Sin conexión, las filas
+viajan con la escritura en la cola offline.
+"""
+
+SQL_INSERTAR_HISTORIAL = """
+    INSERT INTO historial (sorteo_id, usuario, accion, detalle, monto, fecha_hora)
+    SELECT s, 'MOVIL', a, d, m, NOW()
+    FROM unnest(%s::int[], %s::text[], %s::text[], %s::numeric[]) AS t(s, a, d, m)
+"""
+
+
+def filas_historial(historial):
+    """Una fila (sorteo, accion, detalle, monto) o una lista de filas -> lista de filas"""
+    if not historial: return []
+    return [historial] if isinstance(historial, tuple) else list(historial)
+
+
+def parametros(filas):
+    """[(sorteo, accion, detalle, monto), ...] -> las 4 columnas como arreglos para unnest"""
+    columnas = list(zip(*filas)) if filas else [(), (), (), ()]
+    return tuple(list(c) for c in columnas)
+
+
+def escribir(cur, historial):
+    """INSERT de todas las filas en la transacción abierta en cur (nada si no hay filas)"""
+    filas = filas_historial(historial)
+    if filas: cur.execute(SQL_INSERTAR_HISTORIAL, parametros(filas))
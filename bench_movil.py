@@ -0,0 +1,202 @@
+"""
+Benchmarks sin red ni Postgres para los puntos calientes de app_movil.py.
+
+Uso:
+    python bench_movil.py                    # corre y compara contra bench_baseline.json
+    python bench_movil.py --guardar-base     # corre y guarda la nueva línea base
+    python bench_movil.py --tamanos 100,1000 --solo imagen
+
+Sale con código 1 si algún caso es más lento (o usa más memoria) que la
+línea base por encima de la tolerancia. Con --ci también falla si falta la
+línea base o algún caso no está en ella (así no pasa "en verde" sin comparar).
+
+La memoria es el pico de RSS del proceso durante el caso (Linux: VmHWM tras
+reiniciarlo con /proc/self/clear_refs), que sí ve lo que reservan PIL y
+reportlab en C. Fuera de Linux se usa tracemalloc (solo memoria de Python).
+"""
+import argparse
+import ctypes
+import gc
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)  # Sin avisos de "bare mode"
+import app_movil as app
+
+BASE_POR_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+ESTADOS = ["apartado", "abonado", "pagado"]
+
+# ============================================================================
+#  DATOS SINTÉTICOS
+# ============================================================================
+def config_sintetica():
+    rifa = {
+        "nombre": "SORTEO DE PRUEBA", "precio_boleto": 10.0, "fecha_sorteo": "20/12/2030", "hora_sorteo": "08:00 pm",
+        "premio1": "MOTO 0 KM", "premio2": "TV 55 PULGADAS", "premio3": "TELÉFONO", "premio_extra1": "500$", "premio_extra2": "",
+        "cant_p1": 1, "prec_p1": 10, "cant_p2": 3, "prec_p2": 25, "cant_p3": 10, "prec_p3": 70,
+    }
+    empresa = {"nombre": "SORTEOS MILÁN", "rif": "J-00000000-0", "telefono": "0414-0000000"}
+    return {"rifa": rifa, "empresa": empresa}
+
+def datos_sinteticos(cantidad_boletos, ocupacion=0.6, semilla=1234):
+    """Ocupación, filas de estado/historial y deudores como los devolvería la BD"""
+    rnd = random.Random(semilla + cantidad_boletos)
+    n_clientes = max(5, cantidad_boletos // 8)
+    clientes = [(f"CLIENTE {i:05d} APELLIDO", f"0414{i:07d}", f"V-{10000000 + i}") for i in range(n_clientes)]
+    ocupados = rnd.sample(range(cantidad_boletos), int(cantidad_boletos * ocupacion))
+    inicio = datetime(2030, 1, 1, 9, 0)
+
+    boletos_ocupados, rows_estado, rows_hist, raw_deudores = {}, [], [], []
+    for num in sorted(ocupados):
+        estado = rnd.choice(ESTADOS)
+        nom, tel, ced = rnd.choice(clientes)
+        precio = 10.0
+        abonado = {"apartado": 0.0, "abonado": 5.0, "pagado": 10.0}[estado]
+        fecha = inicio + timedelta(minutes=num)
+        boletos_ocupados[num] = estado
+        rows_estado.append((num, nom, tel, ced, estado.upper(), precio, abonado, precio - abonado, fecha))
+        rows_hist.append((fecha, "MOVIL", "ASIGNACION", f"Boleto {num:03d} - {nom} | {ced}", abonado))
+        if precio - abonado > 0.01:
+            raw_deudores.append((nom, tel, num, precio, abonado))
+    raw_deudores.sort(key=lambda r: r[0])
+    return {"ocupacion": boletos_ocupados, "estado": rows_estado, "hist": rows_hist, "deudores": raw_deudores}
+
+# ============================================================================
+#  CASOS
+# ============================================================================
+def casos(cantidad_boletos, config, datos):
+    info_pdf = {
+        "cliente": "CLIENTE 00001 APELLIDO", "cedula": "V-10000001", "telefono": "04140000001", "direccion": "CARACAS",
+        "codigo_cli": "000001", "estado": "abonado", "precio": 10.0, "abonado": 5.0, "fecha_asignacion": datetime(2030, 1, 1, 9, 0),
+    }
+    rifa = config["rifa"]
+    yield "imagen_tipo1", lambda: app.generar_imagen_reporte(0, config, cantidad_boletos, 1, datos["ocupacion"])
+    yield "imagen_tipo2", lambda: app.generar_imagen_reporte(0, config, cantidad_boletos, 2, datos["ocupacion"])
+    yield "imagen_tipo3", lambda: app.generar_imagen_reporte(0, config, cantidad_boletos, 3, datos["ocupacion"])
+    yield "pdf_tabla_tipo1", lambda: app.generar_pdf_tabla(config, cantidad_boletos, datos["ocupacion"], 1)
+    yield "pdf_tabla_tipo3", lambda: app.generar_pdf_tabla(config, cantidad_boletos, datos["ocupacion"], 3)
+    yield "pdf_boleto", lambda: app.generar_pdf_memoria(1, info_pdf, config, cantidad_boletos)
+    yield "tarifas_1_a_n", lambda: [app.calcular_total_pagar_escala(q, rifa) for q in range(1, cantidad_boletos + 1)]
+    yield "cotizar_1_a_n", lambda: (app._tabla_cotizaciones.cache_clear(), app.cotizar_hasta(rifa, cantidad_boletos))
+    rifa_paquetes = dict(rifa, modo_tarifa="paquetes")
+    yield "paquetes_1_a_n", lambda: (app._tabla_cotizaciones.cache_clear(), app.cotizar_hasta(rifa_paquetes, cantidad_boletos))
+    yield "excel_cobranza", lambda: app.generar_excel_cobranza(datos["estado"], datos["hist"])
+    yield "agrupar_deudores", lambda: app.agrupar_deudores(datos["deudores"])
+
+def _kb_status(campo):
+    with open("/proc/self/status") as f:
+        for linea in f:
+            if linea.startswith(campo + ":"): return int(linea.split()[1])
+    raise OSError(campo)
+
+def _liberar_memoria():
+    """Devuelve al sistema lo que el heap ya no usa, para que el pico parta de un RSS limpio"""
+    gc.collect()
+    try: ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError): pass
+
+def pico_rss_kb(fn):
+    """KB de RSS por encima del inicio que alcanzó fn() (None si el sistema no permite medirlo)"""
+    _liberar_memoria()
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")  # VmHWM = VmRSS actual
+        inicio = _kb_status("VmRSS")
+    except OSError:
+        return None
+    fn()
+    return max(0, _kb_status("VmHWM") - inicio)
+
+def pico_python_kb(fn):
+    tracemalloc.start()
+    fn()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(pico / 1024, 1)
+
+def medir_caso(fn, repeticiones):
+    fn()  # Calentamiento (fuentes, imports perezosos, cachés)
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    r = {"ms_min": round(min(tiempos), 3), "ms_mediana": round(statistics.median(tiempos), 3)}
+    pico = pico_rss_kb(fn)
+    if pico is not None: r["pico_rss_kb"] = pico
+    else: r["pico_py_kb"] = pico_python_kb(fn)
+    return r
+
+# ============================================================================
+#  COMPARACIÓN CONTRA LÍNEA BASE
+# ============================================================================
+def comparar(resultados, base, tolerancia):
+    """-> (regresiones, casos sin línea base)"""
+    regresiones, sin_base = [], []
+    for clave, r in resultados.items():
+        b = base.get(clave)
+        if not b: sin_base.append(clave); continue
+        # La mediana del tiempo y el pico de memoria son lo que se vigila
+        if r["ms_mediana"] > b["ms_mediana"] * (1 + tolerancia) and r["ms_mediana"] - b["ms_mediana"] > 1.0:
+            regresiones.append(f"{clave}: {b['ms_mediana']:.1f} ms -> {r['ms_mediana']:.1f} ms")
+        # Solo se compara memoria medida de la misma forma (RSS con RSS, tracemalloc con tracemalloc)
+        for campo in ("pico_rss_kb", "pico_py_kb"):
+            if campo in r and campo in b and r[campo] > b[campo] * (1 + tolerancia) and r[campo] - b[campo] > 256:
+                regresiones.append(f"{clave}: {b[campo]:.0f} KB -> {r[campo]:.0f} KB ({campo})")
+    return regresiones, sin_base
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline de Sorteos Milán Móvil")
+    parser.add_argument("--tamanos", default="100,1000,10000", help="Capacidades a probar, separadas por coma")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--solo", default="", help="Filtra casos cuyo nombre contenga este texto")
+    parser.add_argument("--base", default=BASE_POR_DEFECTO, help="Archivo JSON de línea base")
+    parser.add_argument("--guardar-base", action="store_true", help="Guarda los resultados como nueva línea base")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Margen permitido sobre la base (0.25 = 25%%)")
+    parser.add_argument("--ci", action="store_true", help="Falla si falta la línea base o algún caso no está en ella")
+    args = parser.parse_args()
+
+    config = config_sintetica()
+    resultados = {}
+    for cantidad in [int(t) for t in args.tamanos.split(",") if t.strip()]:
+        datos = datos_sinteticos(cantidad)
+        for nombre, fn in casos(cantidad, config, datos):
+            if args.solo and args.solo not in nombre: continue
+            clave = f"{nombre}@{cantidad}"
+            resultados[clave] = medir_caso(fn, args.repeticiones)
+            r = resultados[clave]
+            pico = f"RSS {r['pico_rss_kb']:>9.0f} KB" if "pico_rss_kb" in r else f"py  {r['pico_py_kb']:>9.1f} KB"
+            print(f"{clave:<28} min {r['ms_min']:>10.2f} ms   mediana {r['ms_mediana']:>10.2f} ms   pico {pico}", flush=True)
+
+    if args.guardar_base:
+        base = {}
+        if os.path.exists(args.base):
+            with open(args.base, encoding="utf-8") as f: base = json.load(f)
+        base.update(resultados)
+        with open(args.base, "w", encoding="utf-8") as f: json.dump(base, f, indent=2, sort_keys=True)
+        print(f"\n💾 Línea base guardada en {args.base}")
+        return 0
+
+    if not os.path.exists(args.base):
+        print(f"\n{'❌' if args.ci else 'ℹ️'} Sin línea base ({args.base}). Usa --guardar-base para crearla.")
+        return 1 if args.ci else 0
+    with open(args.base, encoding="utf-8") as f: base = json.load(f)
+    regresiones, sin_base = comparar(resultados, base, args.tolerancia)
+    if sin_base:
+        print(f"\n{'❌' if args.ci else 'ℹ️'} Sin línea base para: {', '.join(sin_base)}")
+        if args.ci: return 1
+    if regresiones:
+        print("\n❌ Regresiones detectadas:")
+        for r in regresiones: print(f"   - {r}")
+        return 1
+    print("\n✅ Sin regresiones respecto a la línea base.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+Caja rápida: ventas en bloque a partir de líneas pegadas (p. ej. un pedido de WhatsApp).
+
+Una línea por cliente:  números | cliente | abono
+    045 067 | PEREZ JUAN | 10$
+    10-15 | 000123                 (código de cliente; sin abono = apartado)
+    terminal 7 | V-12345678 | 70
+
+El cliente se busca por código, cédula o nombre exacto: una sola consulta por
+índice para todas las líneas. Los números de todas las líneas se validan
+juntos y cada línea se cobra como un paquete con las tarifas del sorteo.
+Todo se registra en una sola transacción (con su historial); cada línea va en
+su propio SAVEPOINT, así un número que otro vendedor tomó mientras tanto solo
+hace fallar su línea, no las demás.
+El INSERT ... ON CONFLICT necesita el índice único (sorteo_id, numero) de la
+migración 2; si no está (migraciones saltadas por falta de permisos) se bloquea
+la tabla de boletos durante la transacción y cada línea revisa antes de insertar.
+"""
+import re
+
+import auditoria
+from sentencias import SQL
+
+_CEDULA = re.compile(r"^([VE])\s*-?\s*([\d.]+)$")
+_MONTO = re.compile(r"^\$?\s*(\d+(?:[.,]\d{1,2})?)\s*\$?$")
+
+# ¿Hay un índice único utilizable por ON CONFLICT (sorteo_id, numero)? (PK, UNIQUE o el de la migración 2)
+SQL_INDICE_BOLETOS = """
+    SELECT EXISTS (
+        SELECT 1 FROM pg_index i
+        WHERE i.indrelid = 'boletos'::regclass AND i.indisunique AND i.indimmediate
+          AND i.indpred IS NULL AND i.indexprs IS NULL AND i.indnatts = 2
+          AND ARRAY(SELECT a.attname::text FROM pg_attribute a
+                    WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) ORDER BY a.attname)
+              = ARRAY['numero', 'sorteo_id'])
+"""
+
+
+def _monto(texto):
+    """'10$', '$10', '10,50' -> float. Vacío = 0 (apartado)"""
+    texto = (texto or "").strip().replace(" ", "")
+    if not texto: return 0.0
+    m = _MONTO.match(texto)
+    if not m: raise ValueError(f"abono no válido: «{texto}»")
+    return float(m.group(1).replace(",", "."))
+
+
+def claves_cliente(texto):
+    """Texto del cliente -> {'codigo': [...], 'cedula': [...], 'nombre': [...]} a buscar"""
+    texto = " ".join((texto or "").upper().split())
+    claves = {"codigo": [], "cedula": [], "nombre": []}
+    m = _CEDULA.match(texto)
+    if m:
+        claves["cedula"].append(f"{m.group(1)}-{m.group(2).replace('.', '')}")
+    elif texto.replace(".", "").isdigit():
+        digitos = texto.replace(".", "")
+        claves["codigo"].append(digitos.zfill(6))
+        claves["cedula"] += [f"V-{digitos}", f"E-{digitos}"]
+    elif texto:
+        claves["nombre"].append(texto)
+    return claves
+
+
+def leer_lineas(texto, parsear_numeros):
+    """
+    Texto pegado -> [dict por línea]. parsear_numeros(texto) -> (números, inválidos)
+    (el mismo intérprete del campo de búsqueda: rangos, terminal, serie...).
+    """
+    lineas = []
+    for i, cruda in enumerate((texto or "").splitlines(), start=1):
+        cruda = cruda.strip()
+        if not cruda or cruda.startswith("#"): continue
+        partes = [p.strip() for p in cruda.split("|")]
+        linea = {"linea": i, "texto": cruda, "numeros": [], "cliente_txt": partes[1] if len(partes) > 1 else "",
+                 "abono": 0.0, "cliente_id": None, "cliente": None, "total": 0.0, "estado": None, "error": None}
+        lineas.append(linea)
+        if len(partes) > 3:
+            linea["error"] = "sobran columnas (números | cliente | abono)"; continue
+        numeros, invalidos = parsear_numeros(partes[0])
+        if invalidos:
+            linea["error"] = f"números no válidos: {', '.join(invalidos)}"; continue
+        if not numeros:
+            linea["error"] = "sin números"; continue
+        linea["numeros"] = numeros
+        if not linea["cliente_txt"]:
+            linea["error"] = "falta el cliente"; continue
+        try:
+            linea["abono"] = _monto(partes[2] if len(partes) > 2 else "")
+        except ValueError as e:
+            linea["error"] = str(e)
+    return lineas
+
+
+def resolver_clientes(cur, lineas):
+    """Pone cliente_id/cliente a cada línea válida con una sola consulta (código, cédula o nombre)"""
+    buscar = {"codigo": ([], []), "cedula": ([], []), "nombre": ([], [])}
+    for idx, linea in enumerate(lineas):
+        if linea["error"]: continue
+        for campo, valores in claves_cliente(linea["cliente_txt"]).items():
+            for v in valores:
+                buscar[campo][0].append(idx); buscar[campo][1].append(v)
+    if not any(ids for ids, _ in buscar.values()): return
+    cur.execute(SQL["clientes_resolver"].sql, buscar["codigo"] + buscar["cedula"] + buscar["nombre"])
+    # Por línea solo cuentan las coincidencias del campo más fuerte (código > cédula > nombre)
+    encontrados = {}
+    for idx, prioridad, cid, nombre, codigo in cur.fetchall():
+        actual = encontrados.get(idx)
+        if actual is None or prioridad < actual[0]: actual = encontrados[idx] = (prioridad, {})
+        if prioridad == actual[0]: actual[1][cid] = f"{nombre} | {codigo or 'S/C'}"
+    for idx, linea in enumerate(lineas):
+        if linea["error"]: continue
+        candidatos = encontrados.get(idx, (None, {}))[1]
+        if not candidatos:
+            linea["error"] = f"cliente no encontrado: «{linea['cliente_txt']}»"
+        elif len(candidatos) > 1:
+            linea["error"] = f"cliente ambiguo ({len(candidatos)} coinciden): usa el código"
+        else:
+            (linea["cliente_id"], linea["cliente"]), = candidatos.items()
+
+
+def validar_numeros(cur, sorteo_id, lineas, pendientes=(), formato="{}"):
+    """Todos los números de todas las líneas en una consulta: ocupados, en cola offline o repetidos"""
+    todos = [n for l in lineas if not l["error"] for n in l["numeros"]]
+    if not todos: return
+    cur.execute(SQL["boletos_por_numero"].sql, (sorteo_id, todos))
+    ocupados = {r[0] for r in cur.fetchall()} | set(pendientes)
+    vistos = {}
+    for linea in lineas:
+        if linea["error"]: continue
+        tomados = [n for n in linea["numeros"] if n in ocupados]
+        repetidos = sorted({n for n in linea["numeros"] if n in vistos})
+        if tomados:
+            linea["error"] = f"ocupados: {', '.join(formato.format(n) for n in tomados)}"
+        elif repetidos:
+            linea["error"] = f"ya pedidos en la línea {vistos[repetidos[0]]}: {', '.join(formato.format(n) for n in repetidos)}"
+        else:
+            for n in linea["numeros"]: vistos[n] = linea["linea"]
+
+
+def cotizar_lineas(lineas, cotizar):
+    """cotizar(cantidad) -> total a pagar con las tarifas del sorteo. Fija total y estado de cada línea"""
+    for linea in lineas:
+        if linea["error"]: continue
+        total = round(cotizar(len(linea["numeros"])), 2)
+        if linea["abono"] - total > 0.01:
+            linea["error"] = f"abono ${linea['abono']:,.2f} mayor que el total ${total:,.2f}"; continue
+        linea["total"] = total
+        linea["estado"] = "apartado" if linea["abono"] == 0 else ("pagado" if linea["abono"] >= total - 0.01 else "abonado")
+
+
+def preparar(conn, sorteo_id, texto, parsear_numeros, cotizar, pendientes=(), formato="{}"):
+    """Lee, resuelve, valida y cotiza sin escribir nada. Devuelve las líneas (las malas con 'error')"""
+    lineas = leer_lineas(texto, parsear_numeros)
+    with conn.cursor() as cur:
+        resolver_clientes(cur, lineas)
+        validar_numeros(cur, sorteo_id, lineas, pendientes, formato)
+    conn.commit()
+    cotizar_lineas(lineas, cotizar)
+    return lineas
+
+
+def registrar(conn, sorteo_id, lineas, formato="{}"):
+    """
+    Inserta las líneas válidas en una sola transacción, cada una en su SAVEPOINT.
+    Devuelve la cantidad de líneas registradas (las demás quedan con 'error').
+    """
+    historial = []
+    hechas = 0
+    with conn.cursor() as cur:
+        cur.execute(SQL_INDICE_BOLETOS)
+        con_indice = cur.fetchone()[0]
+        if not con_indice:
+            # Sin índice único: nadie más inserta ni modifica boletos hasta el commit (sí pueden leer)
+            cur.execute("LOCK TABLE boletos IN SHARE ROW EXCLUSIVE MODE")
+        for linea in lineas:
+            if linea["error"]: continue
+            n = len(linea["numeros"])
+            cur.execute("SAVEPOINT caja_linea")
+            valores = (sorteo_id, linea["estado"], linea["total"] / n, linea["cliente_id"], linea["abono"] / n, linea["numeros"])
+            if con_indice:
+                cur.execute("""
+                    INSERT INTO boletos (sorteo_id, numero, estado, precio, cliente_id, total_abonado, fecha_asignacion)
+                    SELECT %s, n, %s, %s, %s, %s, NOW() FROM unnest(%s::int[]) AS n
+                    ON CONFLICT (sorteo_id, numero) DO NOTHING
+                    RETURNING numero
+                """, valores)
+            else:
+                cur.execute("""
+                    INSERT INTO boletos (sorteo_id, numero, estado, precio, cliente_id, total_abonado, fecha_asignacion)
+                    SELECT %s, n, %s, %s, %s, %s, NOW() FROM unnest(%s::int[]) AS n
+                    WHERE NOT EXISTS (SELECT 1 FROM boletos b WHERE b.sorteo_id = %s AND b.numero = n)
+                    RETURNING numero
+                """, valores + (sorteo_id,))
+            insertados = {r[0] for r in cur.fetchall()}
+            if len(insertados) < n:
+                # Otro vendedor tomó alguno entre la revisión y ahora: se deshace solo esta línea
+                cur.execute("ROLLBACK TO SAVEPOINT caja_linea")
+                tomados = [formato.format(x) for x in linea["numeros"] if x not in insertados]
+                linea["error"] = f"ocupados mientras tanto: {', '.join(tomados)}"
+                continue
+            cur.execute("RELEASE SAVEPOINT caja_linea")
+            if n == 1: historial.append((sorteo_id, "ASIGNACION", f"Boleto {formato.format(linea['numeros'][0])} - {linea['cliente']}", linea["abono"]))
+            else: historial.append((sorteo_id, "ASIGNACION_MASIVA", f"{n} Boletos - {linea['cliente']}", linea["abono"]))
+            hechas += 1
+        auditoria.escribir(cur, historial)
+    conn.commit()
+    return hechas
@@ -0,0 +1,169 @@
+"""
+Prueba de carga: varios vendedores simultáneos manejando el script real
+(app_movil.py) con streamlit.testing.v1.AppTest, sin navegador.
+
+Cada sesión simulada hace: login -> buscar un número -> venderlo ->
+pagarlo -> abrir COBRANZA. Al final se reporta throughput, latencias
+p50/p95/p99 por acción y consultas a la BD por rerun (del panel de
+rendimiento, que aquí se fuerza con SORTEOS_PERFIL=1).
+
+Requiere un Postgres local DESECHABLE (siembra tablas y datos):
+    docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=pg postgres:16
+    python carga_movil.py --dsn postgresql://postgres:pg@localhost:5432/postgres --sesiones 20
+
+Con --dsn-replica (un standby en streaming de --dsn) los reportes y listados
+van a la réplica, como en producción con SUPABASE_REPLICA_URL.
+
+Límite: cada vendedor corre en su propio proceso (AppTest no admite sesiones
+concurrentes en un mismo Runtime), así que cada uno tiene sus propios cachés
+y su propia conexión a la BD. Mide la carga sobre Postgres y el costo de cada
+rerun, pero NO cuántos vendedores aguanta una sola instancia de Streamlit
+(ahí todos comparten cachés, conexión y GIL).
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import psycopg2
+
+import migraciones
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_movil.py")
+CLAVE_APP = "carga123"
+
+# ============================================================================
+#  SIEMBRA DE DATOS
+# ============================================================================
+def sembrar(dsn, n_clientes):
+    """Crea un sorteo de 1000 boletos y clientes de prueba. Devuelve el nombre del sorteo"""
+    nombre = f"CARGA {int(time.time())}"
+    with psycopg2.connect(dsn) as conn:
+        migraciones.migrar(conn)
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO sorteos (nombre, precio_boleto, fecha_sorteo, hora_sorteo, premio1, cant_promo1, precio_promo1, activo)
+            VALUES (%s, 10, CURRENT_DATE + 7, '20:00:00', 'PREMIO DE PRUEBA', 1, 10, TRUE) RETURNING id
+        """, (nombre,))
+        sorteo_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO configuracion (clave, valor) VALUES (%s, '1000')
+            ON CONFLICT (clave) DO UPDATE SET valor = EXCLUDED.valor
+        """, (f"capacidad_sorteo_{sorteo_id}",))
+        cur.execute("""
+            INSERT INTO clientes (codigo, nombre_completo, cedula, telefono, direccion)
+            SELECT lpad(g::text, 6, '0'), 'CLIENTE CARGA ' || lpad(g::text, 5, '0'), 'V-' || (20000000 + g), '0414' || lpad(g::text, 7, '0'), 'LOCAL'
+            FROM generate_series(1, %s) AS g
+        """, (n_clientes,))
+    return nombre
+
+# ============================================================================
+#  SESIÓN SIMULADA
+# ============================================================================
+def _widget(coleccion, etiqueta):
+    for w in coleccion:
+        if str(w.label).startswith(etiqueta): return w
+    raise LookupError(f"No se encontró el widget '{etiqueta}'")
+
+class Sesion:
+    def __init__(self, dsn, nombre_sorteo, timeout, dsn_replica=None):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.at.secrets["SUPABASE_URL"] = dsn
+        if dsn_replica: self.at.secrets["SUPABASE_REPLICA_URL"] = dsn_replica
+        self.at.secrets["PASSWORD_APP"] = CLAVE_APP
+        self.nombre_sorteo = nombre_sorteo
+        self.muestras = []  # (accion, ms, consultas, error)
+
+    def _accion(self, nombre, paso):
+        t0 = time.perf_counter()
+        error = None
+        try:
+            paso()
+            if self.at.exception: error = str(self.at.exception[0].message)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        ms = (time.perf_counter() - t0) * 1000
+        perfil = self.at.session_state["perfil_ultimo"] if "perfil_ultimo" in self.at.session_state else {}
+        self.muestras.append((nombre, ms, perfil.get("consultas"), error))
+        return error is None
+
+    def recorrido(self, numero):
+        at = self.at
+        if not self._accion("login", lambda: (at.run(), _widget(at.text_input, "Ingresa la contraseña").input(CLAVE_APP), _widget(at.button, "Entrar").click().run())):
+            return
+        self._accion("elegir_sorteo", lambda: _widget(at.selectbox, "Sorteo Activo").select(self.nombre_sorteo).run())
+        self._accion("buscar", lambda: _widget(at.text_input, "Boleto(s) N°").input(f"{numero:03d}").run())
+
+        def vender():
+            cli = _widget(at.selectbox, "👤 Cliente")
+            cli.select_index(numero % len(cli.options))
+            _widget(at.number_input, "Abono Inicial").set_value(0.0)
+            _widget(at.button, "💾 ASIGNAR").click().run()
+        self._accion("vender", vender)
+        self._accion("pagar", lambda: _widget(at.button, "✅ PAGAR TOTAL").click().run())
+        self._accion("cobranza", lambda: _widget(at.button, "🔄 Actualizar Datos").click().run())
+
+def vendedor(tarea):
+    """Corre en su propio proceso: un recorrido completo por cada número asignado"""
+    dsn, dsn_replica, nombre_sorteo, timeout, numeros = tarea
+    muestras = []
+    for numero in numeros:
+        sesion = Sesion(dsn, nombre_sorteo, timeout, dsn_replica)
+        sesion.recorrido(numero)
+        muestras.extend(sesion.muestras)
+    return muestras
+
+# ============================================================================
+#  REPORTE
+# ============================================================================
+def percentil(valores, p):
+    if not valores: return 0.0
+    orden = sorted(valores)
+    k = max(0, min(len(orden) - 1, round(p / 100 * (len(orden) - 1))))
+    return orden[k]
+
+def reportar(muestras, duracion_s, sesiones):
+    print(f"\n{'Acción':<15}{'n':>5}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL/rerun':>11}")
+    for accion in dict.fromkeys(m[0] for m in muestras):
+        filas = [m for m in muestras if m[0] == accion]
+        ok = [m[1] for m in filas if m[3] is None]
+        consultas = [m[2] for m in filas if m[2] is not None]
+        prom_sql = f"{statistics.mean(consultas):.1f}" if consultas else "-"
+        print(f"{accion:<15}{len(filas):>5}{len(filas) - len(ok):>5}{percentil(ok, 50):>10.0f}{percentil(ok, 95):>10.0f}{percentil(ok, 99):>10.0f}{prom_sql:>11}")
+    total_ok = sum(1 for m in muestras if m[3] is None)
+    print(f"\nThroughput: {total_ok / duracion_s:.2f} acciones/s ({total_ok} OK en {duracion_s:.1f} s)")
+    errores = {m[3] for m in muestras if m[3]}
+    for e in list(errores)[:5]: print(f"   ⚠️ {e[:160]}")
+    print(f"\nℹ️ {sesiones} procesos independientes (un Runtime, caché y conexión a la BD por vendedor): "
+          "esto mide Postgres y el costo por rerun, no la capacidad de UNA instancia de Streamlit, "
+          "donde los vendedores comparten caché, conexión y GIL.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de vendedores concurrentes")
+    parser.add_argument("--dsn", required=True, help="Postgres local desechable")
+    parser.add_argument("--dsn-replica", default=None, help="Standby de solo lectura de --dsn (opcional)")
+    parser.add_argument("--sesiones", type=int, default=10, help="Vendedores simulados en paralelo")
+    parser.add_argument("--rondas", type=int, default=1, help="Recorridos por vendedor")
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Segundos máximos por rerun")
+    args = parser.parse_args()
+
+    os.environ["SORTEOS_PERFIL"] = "1"
+    os.environ.setdefault("SORTEOS_PERFIL_LOG", os.path.join(tempfile.gettempdir(), "carga_perfil.jsonl"))
+    nombre_sorteo = sembrar(args.dsn, args.clientes)
+    print(f"🎲 Sorteo sembrado: {nombre_sorteo} | {args.sesiones} sesiones x {args.rondas} rondas")
+
+    # Un proceso por vendedor: AppTest usa un Runtime global y no admite hilos concurrentes
+    tareas = [(args.dsn, args.dsn_replica, nombre_sorteo, args.timeout, [v * args.rondas + r for r in range(args.rondas)]) for v in range(args.sesiones)]
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.sesiones) as pool:
+        muestras = [m for lote in pool.map(vendedor, tareas) for m in lote]
+    reportar(muestras, time.perf_counter() - t0, args.sesiones)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Cola local de escrituras para cuando la BD no responde.
+
+Las ventas, pagos, abonos y liberaciones que no se pudieron enviar se guardan
+en un archivo SQLite (durable, sobrevive a reinicios) y se reenvían en orden
+cuando vuelve la conexión. Cada operación se aplica en su propia transacción:
+si choca con lo que pasó mientras tanto (número ya vendido, boleto liberado),
+se marca como 'conflicto' y no se aplica a medias.
+
+Varios procesos pueden compartir el archivo: antes de enviar, cada uno reclama
+las pendientes en SQLite (BEGIN IMMEDIATE + estado 'en_progreso'), así una
+operación nunca la reenvían dos procesos.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+import psycopg2
+
+PENDIENTE, EN_PROGRESO, APLICADO, CONFLICTO = "pendiente", "en_progreso", "aplicado", "conflicto"
+
+
+def _a_json(valor):
+    if isinstance(valor, Decimal): return float(valor)
+    if hasattr(valor, "isoformat"): return valor.isoformat()
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+class ColaOffline:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._candado = threading.Lock()
+        self._yo = f"{socket.gethostname()}:{os.getpid()}"
+        with self._conectar() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS operaciones (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    creado REAL NOT NULL,
+                    tipo TEXT NOT NULL,
+                    sorteo_id INTEGER,
+                    numeros TEXT NOT NULL,
+                    sentencias TEXT NOT NULL,
+                    estado TEXT NOT NULL DEFAULT 'pendiente',
+                    error TEXT,
+                    reclamado_por TEXT
+                )
+            """)
+            columnas = {c[1] for c in db.execute("PRAGMA table_info(operaciones)")}
+            if "reclamado_por" not in columnas:  # Archivo de una versión anterior
+                db.execute("ALTER TABLE operaciones ADD COLUMN reclamado_por TEXT")
+
+    @contextmanager
+    def _conectar(self):
+        db = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")  # Una venta encolada no se pierde con un corte de luz
+            yield db
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    #  ESCRITURA
+    # ------------------------------------------------------------------
+    def encolar(self, tipo, sorteo_id, numeros, query, params, min_filas=0, acompanantes=()):
+        """
+        Guarda una operación. min_filas: filas que debe afectar al reenviarse (si no, conflicto).
+        acompanantes: [(query, params)] que se aplican con ella (p. ej. su historial)
+        """
+        sentencias = [[query, list(params or ()), min_filas]] + [[q, list(p or ()), 0] for q, p in acompanantes]
+        with self._candado, self._conectar() as db:
+            cur = db.execute(
+                "INSERT INTO operaciones (creado, tipo, sorteo_id, numeros, sentencias) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), tipo, sorteo_id, json.dumps(sorted(numeros or [])), json.dumps(sentencias, default=_a_json))
+            )
+            return cur.lastrowid
+
+    def descartar(self, op_id):
+        with self._candado, self._conectar() as db:
+            db.execute("DELETE FROM operaciones WHERE id = ? AND estado != ?", (op_id, APLICADO))
+
+    # ------------------------------------------------------------------
+    #  CONSULTA
+    # ------------------------------------------------------------------
+    def contar(self):
+        """{'pendiente': n, 'conflicto': m}"""
+        with self._conectar() as db:
+            filas = db.execute("SELECT estado, COUNT(*) FROM operaciones WHERE estado != ? GROUP BY estado", (APLICADO,)).fetchall()
+        return {est: n for est, n in filas}
+
+    def numeros_pendientes(self, sorteo_id):
+        """{numero: tipo} de los boletos con operaciones sin confirmar en la BD"""
+        with self._conectar() as db:
+            filas = db.execute("SELECT tipo, numeros FROM operaciones WHERE sorteo_id = ? AND estado IN (?, ?) ORDER BY id",
+                               (sorteo_id, PENDIENTE, EN_PROGRESO)).fetchall()
+        return {n: tipo for tipo, nums in filas for n in json.loads(nums)}
+
+    def listar(self, estado):
+        with self._conectar() as db:
+            return db.execute("SELECT id, creado, tipo, numeros, error FROM operaciones WHERE estado = ? ORDER BY id", (estado,)).fetchall()
+
+    # ------------------------------------------------------------------
+    #  REENVÍO
+    # ------------------------------------------------------------------
+    def _reclamar(self):
+        """
+        Toma para este proceso todas las pendientes, en orden, en una transacción
+        IMMEDIATE: otro proceso que llegue después ya no las ve como pendientes.
+        Las que dejó a medias un proceso muerto de esta máquina pasan a conflicto
+        (no se sabe si llegaron a la BD: que las revise una persona).
+        """
+        host = self._yo.split(":")[0]
+        with self._conectar() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for op_id, dueno in db.execute("SELECT id, reclamado_por FROM operaciones WHERE estado = ?", (EN_PROGRESO,)).fetchall():
+                    h, _, pid = (dueno or "").rpartition(":")
+                    if h == host and pid.isdigit() and not _proceso_vivo(int(pid)):
+                        db.execute("UPDATE operaciones SET estado = ?, error = ? WHERE id = ?",
+                                   (CONFLICTO, "Reenvío interrumpido: revisar si se aplicó", op_id))
+                ops = db.execute("SELECT id, sentencias FROM operaciones WHERE estado = ? ORDER BY id", (PENDIENTE,)).fetchall()
+                db.executemany("UPDATE operaciones SET estado = ?, reclamado_por = ? WHERE id = ?",
+                               [(EN_PROGRESO, self._yo, op_id) for op_id, _ in ops])
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return ops
+
+    def _soltar(self, ids):
+        """Devuelve a pendiente lo reclamado que no se llegó a enviar"""
+        with self._conectar() as db:
+            db.executemany("UPDATE operaciones SET estado = ?, reclamado_por = NULL WHERE id = ? AND estado = ? AND reclamado_por = ?",
+                           [(PENDIENTE, op_id, EN_PROGRESO, self._yo) for op_id in ids])
+
+    def reproducir(self, conn):
+        """
+        Reenvía las pendientes en orden. Devuelve (aplicadas, conflictos).
+        Si la conexión se cae a mitad, se detiene y lo que falta queda pendiente.
+        """
+        aplicadas = conflictos = 0
+        with self._candado:
+            ops = self._reclamar()
+            for i, (op_id, sentencias_json) in enumerate(ops):
+                error = None
+                try:
+                    with conn.cursor() as cur:
+                        for query, params, min_filas in json.loads(sentencias_json):
+                            cur.execute(query, params)
+                            if cur.rowcount < min_filas:
+                                raise LookupError("El boleto cambió mientras no había conexión")
+                    conn.commit()
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    if not conn.closed: conn.rollback()
+                    self._soltar([o[0] for o in ops[i:]])
+                    raise
+                except (psycopg2.Error, LookupError) as e:
+                    conn.rollback()
+                    error = str(e).strip().splitlines()[0]
+                except BaseException:
+                    self._soltar([o[0] for o in ops[i:]])
+                    raise
+                with self._conectar() as db:
+                    db.execute("UPDATE operaciones SET estado = ?, error = ? WHERE id = ?", (CONFLICTO if error else APLICADO, error, op_id))
+                if error: conflictos += 1
+                else: aplicadas += 1
+            with self._conectar() as db:
+                # Lo aplicado ya está en la BD: solo se guarda un rato para diagnóstico
+                db.execute("DELETE FROM operaciones WHERE estado = ? AND creado < ?", (APLICADO, time.time() - 86400))
+        return aplicadas, conflictos
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, de otro usuario
+    return True
@@ -0,0 +1,236 @@
+"""
+Importación masiva de clientes desde CSV o Excel (.xlsx).
+
+    - columnas por encabezado: nombre, cédula, teléfono, dirección (en cualquier
+      orden; se aceptan variantes como "nombre completo", "ci", "celular"...)
+    - normaliza: nombre en mayúsculas, cédula "V-12345678" / "E-12345678",
+      teléfono "04141234567" (quita +58, espacios, guiones y puntos)
+    - carga todo con COPY a una tabla temporal y desde ahí, en la misma
+      transacción:
+        fusiona con los clientes que ya tienen esa cédula (completa teléfono y
+        dirección vacíos) e inserta el resto con códigos correlativos en bloque
+    - devuelve un reporte: insertados, fusionados y rechazados (fila + motivo)
+    - las altas y ediciones del formulario pasan por aquí también (misma
+      normalización, mismo candado y correlativo que la importación)
+
+Uso:
+    python importar_clientes.py --dsn postgresql://... clientes.xlsx
+"""
+import argparse
+import csv
+import io
+import re
+import sys
+import unicodedata
+
+import psycopg2
+
+from migraciones import version_actual
+from sentencias import SQL
+
+CANDADO_CODIGOS = 7_305_002  # pg_advisory_xact_lock: dos importaciones no reparten los mismos códigos
+VERSION_MINIMA = 8  # Migración de normalizar_cedula() y su índice
+
+# Encabezado normalizado (minúsculas, sin acentos ni signos) -> campo
+COLUMNAS = {
+    "nombre": "nombre", "nombre completo": "nombre", "nombre y apellido": "nombre", "cliente": "nombre",
+    "cedula": "cedula", "ci": "cedula", "c i": "cedula", "documento": "cedula", "cedula de identidad": "cedula",
+    "telefono": "telefono", "tlf": "telefono", "celular": "telefono", "movil": "telefono", "whatsapp": "telefono",
+    "direccion": "direccion", "domicilio": "direccion",
+}
+_CEDULA = re.compile(r"^([VE])?0*(\d{5,9})$")
+
+
+def _texto(valor):
+    """Celda -> texto (Excel guarda cédulas y teléfonos como número: 12345678.0 -> '12345678')"""
+    if isinstance(valor, float) and valor.is_integer(): valor = int(valor)
+    return str(valor).strip()
+
+
+def _encabezado(texto):
+    texto = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", texto).split())
+
+
+def normalizar_cedula(texto):
+    """'v 12.345.678', '12345678', 'E-8123456' -> 'V-12345678'... (sin letra = V). None si no sirve.
+    La misma regla está en SQL (normalizar_cedula(), migración 8) para buscar por índice"""
+    m = _CEDULA.match(re.sub(r"[\s.\-_/]", "", str(texto or "")).upper())
+    return f"{m.group(1) or 'V'}-{m.group(2)}" if m else None
+
+
+def normalizar_telefono(texto):
+    """'+58 414-123.45.67', '4141234567', '04141234567' -> '04141234567'. '' si no hay o no sirve"""
+    digitos = re.sub(r"\D", "", str(texto or ""))
+    if digitos.startswith("58") and len(digitos) == 12: digitos = "0" + digitos[2:]
+    elif len(digitos) == 10 and not digitos.startswith("0"): digitos = "0" + digitos
+    return digitos if 7 <= len(digitos) <= 15 else ""
+
+
+def leer_filas(contenido, nombre_archivo):
+    """bytes de un .csv o .xlsx -> lista de filas (la primera es el encabezado)"""
+    if nombre_archivo.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ValueError("Para leer Excel hace falta openpyxl (pip install openpyxl), o guarda el archivo como CSV")
+        libro = openpyxl.load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+        try:
+            return [["" if v is None else v for v in fila] for fila in libro.worksheets[0].iter_rows(values_only=True)]
+        finally:
+            libro.close()
+    try: texto = contenido.decode("utf-8-sig")
+    except UnicodeDecodeError: texto = contenido.decode("latin-1")  # CSV guardado desde Excel en Windows
+    try: dialecto = csv.Sniffer().sniff(texto[:4096], delimiters=",;\t")
+    except csv.Error: dialecto = csv.excel
+    return list(csv.reader(io.StringIO(texto), dialecto))
+
+
+def preparar_filas(filas):
+    """
+    Encabezado + filas -> (válidas, rechazadas).
+    válidas: [(fila, nombre, cedula, telefono, direccion)], una por cédula (manda la primera)
+    rechazadas: [(fila, motivo, texto original)]
+    """
+    if not filas: raise ValueError("El archivo está vacío")
+    campos = [COLUMNAS.get(_encabezado(h)) for h in filas[0]]
+    faltan = [c for c in ("nombre", "cedula") if c not in campos]
+    if faltan: raise ValueError(f"Faltan columnas: {', '.join(faltan)} (encabezados leídos: {', '.join(map(str, filas[0]))})")
+    validas, rechazadas, vistas = [], [], {}
+    for n, fila in enumerate(filas[1:], start=2):  # n = fila de la planilla (la 1 es el encabezado)
+        datos = {}
+        for campo, valor in zip(campos, fila):
+            if campo and campo not in datos: datos[campo] = _texto(valor)
+        if not any(_texto(v) for v in fila): continue
+        original = " | ".join(_texto(v) for v in fila)
+        nombre = " ".join(datos.get("nombre", "").upper().split())
+        cedula = normalizar_cedula(datos.get("cedula"))
+        if not nombre: rechazadas.append((n, "sin nombre", original)); continue
+        if not cedula: rechazadas.append((n, f"cédula no válida: «{datos.get('cedula', '')}»", original)); continue
+        if cedula in vistas: rechazadas.append((n, f"cédula repetida en el archivo (fila {vistas[cedula]})", original)); continue
+        vistas[cedula] = n
+        validas.append((n, nombre, cedula, normalizar_telefono(datos.get("telefono")), " ".join(datos.get("direccion", "").split())))
+    return validas, rechazadas
+
+
+def _copiar(cur, validas):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(validas)
+    buffer.seek(0)
+    cur.execute("""
+        CREATE TEMP TABLE importacion_clientes (fila INT, nombre TEXT, cedula TEXT, telefono TEXT, direccion TEXT)
+        ON COMMIT DROP
+    """)
+    cur.copy_expert("COPY importacion_clientes FROM STDIN WITH (FORMAT csv)", buffer)
+    cur.execute("CREATE INDEX ON importacion_clientes (cedula)")
+    cur.execute("ANALYZE importacion_clientes")
+
+
+def importar(conn, contenido, nombre_archivo):
+    """Importa el archivo en una sola transacción. Devuelve {'insertados', 'fusionados', 'rechazados': [...]}"""
+    validas, rechazadas = preparar_filas(leer_filas(contenido, nombre_archivo))
+    reporte = {"insertados": 0, "fusionados": 0, "rechazados": rechazadas}
+    if not validas: return reporte
+    try:
+        with conn.cursor() as cur:
+            _copiar(cur, validas)
+            # Ya existe alguien con esa cédula: solo se completa lo que le falta
+            cur.execute("""
+                UPDATE clientes c SET
+                    telefono = COALESCE(NULLIF(c.telefono, ''), NULLIF(i.telefono, '')),
+                    direccion = COALESCE(NULLIF(c.direccion, ''), NULLIF(i.direccion, ''))
+                FROM importacion_clientes i WHERE normalizar_cedula(c.cedula) = i.cedula
+                RETURNING i.fila
+            """)
+            reporte["fusionados"] = len({r[0] for r in cur.fetchall()})
+            # Códigos nuevos en bloque, a partir del último (índice de codigo, sin recorrer la tabla)
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (CANDADO_CODIGOS,))
+            cur.execute(SQL["clientes_ultimo_codigo"].sql)
+            base = int(cur.fetchone()[0])
+            cur.execute("""
+                INSERT INTO clientes (codigo, nombre_completo, cedula, telefono, direccion, fecha_registro)
+                SELECT lpad((%s + ROW_NUMBER() OVER (ORDER BY i.fila))::text, 6, '0'), i.nombre, i.cedula, i.telefono, i.direccion, NOW()
+                FROM importacion_clientes i
+                WHERE NOT EXISTS (SELECT 1 FROM clientes c WHERE normalizar_cedula(c.cedula) = i.cedula)
+            """, (base,))
+            reporte["insertados"] = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return reporte
+
+
+def _datos_formulario(nombre, cedula, telefono, direccion):
+    """Campos del formulario normalizados como en la importación. ValueError si la cédula o el teléfono no sirven"""
+    nombre = " ".join((nombre or "").upper().split())
+    if not nombre: raise ValueError("Falta el nombre")
+    cedula_norm = normalizar_cedula(cedula)
+    if not cedula_norm: raise ValueError(f"Cédula no válida: «{cedula}»")
+    telefono_norm = normalizar_telefono(telefono)
+    if (telefono or "").strip() and not telefono_norm: raise ValueError(f"Teléfono no válido: «{telefono}»")
+    return nombre, cedula_norm, telefono_norm, " ".join((direccion or "").split())
+
+
+def _cedula_repetida(cur, cedula, excepto=None):
+    cur.execute(SQL["clientes_por_cedula"].sql, (cedula, excepto))
+    fila = cur.fetchone()
+    if fila: raise ValueError(f"La cédula {cedula} ya es de {fila[1]} ({fila[0] or 'S/C'})")
+
+
+def registrar_cliente(conn, nombre, cedula, telefono, direccion):
+    """Alta desde el formulario: siguiente código bajo el mismo candado que la importación. Devuelve el código"""
+    nombre, cedula, telefono, direccion = _datos_formulario(nombre, cedula, telefono, direccion)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (CANDADO_CODIGOS,))
+            _cedula_repetida(cur, cedula)
+            cur.execute(SQL["clientes_ultimo_codigo"].sql)
+            codigo = f"{int(cur.fetchone()[0]) + 1:06d}"
+            cur.execute("""
+                INSERT INTO clientes (codigo, nombre_completo, cedula, telefono, direccion, fecha_registro)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+            """, (codigo, nombre, cedula, telefono, direccion))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return codigo
+
+
+def actualizar_cliente(conn, cliente_id, nombre, cedula, telefono, direccion):
+    """Edición desde el formulario, con los datos normalizados y sin repetir la cédula de otro cliente"""
+    nombre, cedula, telefono, direccion = _datos_formulario(nombre, cedula, telefono, direccion)
+    try:
+        with conn.cursor() as cur:
+            _cedula_repetida(cur, cedula, excepto=cliente_id)
+            cur.execute("UPDATE clientes SET nombre_completo=%s, cedula=%s, telefono=%s, direccion=%s WHERE id=%s",
+                        (nombre, cedula, telefono, direccion, cliente_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa clientes desde CSV o Excel")
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("archivo")
+    args = parser.parse_args()
+    with open(args.archivo, "rb") as f: contenido = f.read()
+    with psycopg2.connect(args.dsn) as conn:
+        with conn.cursor() as cur:
+            if version_actual(cur) < VERSION_MINIMA:
+                print("⚠️ Falta migrar la base de datos (python migraciones.py --dsn ... migrar)"); return 1
+        try:
+            reporte = importar(conn, contenido, args.archivo)
+        except ValueError as e:
+            print(f"⚠️ {e}"); return 1
+    print(f"✅ Insertados: {reporte['insertados']}   🔗 Fusionados: {reporte['fusionados']}   ❌ Rechazados: {len(reporte['rechazados'])}")
+    for fila, motivo, original in reporte["rechazados"]:
+        print(f"   fila {fila}: {motivo}   [{original[:60]}]")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
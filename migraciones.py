@@ -0,0 +1,448 @@
+"""
+Esquema versionado de la BD: tablas, índices de las consultas calientes y
+funciones. Cada migración se aplica una sola vez y queda anotada en
+esquema_version; las nuevas van siempre al final de MIGRACIONES (nunca se
+edita una ya publicada: se agrega otra).
+
+Además trae un verificador de planes: siembra datos sintéticos grandes en un
+esquema aparte, corre EXPLAIN sobre las consultas calientes (sentencias.py)
+y falla si alguna recorre boletos, historial o configuracion completas.
+Todo ocurre dentro de una transacción que se deshace: no deja rastro.
+
+La app no migra: solo lee la versión y, si va atrás, sigue con las consultas
+sueltas. Las migraciones (DDL, índices únicos, la reconstrucción de agregados
+con boletos bloqueado) se corren desde aquí al desplegar.
+
+Uso:
+    python migraciones.py --dsn postgresql://... migrar
+    python migraciones.py --dsn postgresql://... estado
+    python migraciones.py --dsn postgresql://... verificar --sorteos 200 --boletos 1000
+"""
+import argparse
+import json
+import sys
+
+import psycopg2
+
+from sentencias import SQL
+
+# ============================================================================
+#  MIGRACIONES
+# ============================================================================
+ESQUEMA_BASE = """
+CREATE TABLE IF NOT EXISTS sorteos (
+    id SERIAL PRIMARY KEY, nombre TEXT NOT NULL, precio_boleto NUMERIC(12,2) DEFAULT 0,
+    fecha_sorteo DATE, hora_sorteo TIME, premio1 TEXT, premio2 TEXT, premio3 TEXT,
+    premio_extra1 TEXT, premio_extra2 TEXT,
+    cant_promo1 INT, precio_promo1 NUMERIC(12,2), cant_promo2 INT, precio_promo2 NUMERIC(12,2),
+    cant_promo3 INT, precio_promo3 NUMERIC(12,2), activo BOOLEAN DEFAULT TRUE
+);
+CREATE TABLE IF NOT EXISTS clientes (
+    id SERIAL PRIMARY KEY, codigo TEXT, nombre_completo TEXT NOT NULL, cedula TEXT,
+    telefono TEXT, direccion TEXT, fecha_registro TIMESTAMP DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS boletos (
+    id SERIAL PRIMARY KEY, sorteo_id INT NOT NULL REFERENCES sorteos(id), numero INT NOT NULL,
+    estado TEXT NOT NULL, precio NUMERIC(12,2) DEFAULT 0, cliente_id INT REFERENCES clientes(id),
+    total_abonado NUMERIC(12,2) DEFAULT 0, fecha_asignacion TIMESTAMP DEFAULT NOW(),
+    UNIQUE (sorteo_id, numero)
+);
+CREATE TABLE IF NOT EXISTS historial (
+    id SERIAL PRIMARY KEY, sorteo_id INT, usuario TEXT, accion TEXT, detalle TEXT,
+    monto NUMERIC(12,2), fecha_hora TIMESTAMP DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS configuracion (clave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+
+def _indice_unico(nombre, tabla, columnas):
+    """Crea el índice único salvo que ya haya uno (p. ej. una PK o UNIQUE) sobre esas mismas columnas"""
+    lista = ", ".join(f"'{c}'" for c in columnas)
+    return f"""
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        WHERE i.indrelid = '{tabla}'::regclass AND i.indisunique AND i.indpred IS NULL
+          AND i.indkey::int2[] = ARRAY(
+              SELECT a.attnum FROM unnest(ARRAY[{lista}]) WITH ORDINALITY AS c(nombre, orden)
+              JOIN pg_attribute a ON a.attrelid = '{tabla}'::regclass AND a.attname = c.nombre
+              ORDER BY c.orden)::int2[]
+    ) THEN
+        CREATE UNIQUE INDEX {nombre} ON {tabla} ({", ".join(columnas)});
+    END IF;
+END $$;
+"""
+
+
+INDICES_CALIENTES = (
+    _indice_unico("boletos_sorteo_numero", "boletos", ["sorteo_id", "numero"])   # ocupación, búsqueda por número, ON CONFLICT
+    + _indice_unico("configuracion_clave", "configuracion", ["clave"])          # lecturas y ON CONFLICT (clave)
+    + """
+CREATE INDEX IF NOT EXISTS boletos_sorteo_cliente ON boletos (sorteo_id, cliente_id);  -- boletos del cliente, cobranza
+CREATE INDEX IF NOT EXISTS historial_sorteo_id ON historial (sorteo_id, id);          -- historial del sorteo en orden
+"""
+)
+
+DDL_SNAPSHOT = """
+CREATE OR REPLACE FUNCTION snapshot_sorteo(p_sorteo_id INT)
+RETURNS JSON LANGUAGE plpgsql STABLE AS $$
+DECLARE v_id INT;
+BEGIN
+    SELECT id INTO v_id FROM sorteos WHERE activo = TRUE AND id = p_sorteo_id;
+    IF v_id IS NULL THEN
+        SELECT id INTO v_id FROM sorteos WHERE activo = TRUE ORDER BY id LIMIT 1;
+    END IF;
+    RETURN json_build_object(
+        'sorteo_id', v_id,
+        'sorteos', (
+            SELECT COALESCE(json_agg(json_build_array(
+                id, nombre, precio_boleto, fecha_sorteo, hora_sorteo, premio1, premio2, premio3, premio_extra1, premio_extra2,
+                cant_promo1, precio_promo1, cant_promo2, precio_promo2, cant_promo3, precio_promo3) ORDER BY id), '[]')
+            FROM sorteos WHERE activo = TRUE),
+        'configuracion', (SELECT COALESCE(json_agg(json_build_array(clave, valor)), '[]') FROM configuracion),
+        'max_numero', (SELECT MAX(numero) FROM boletos WHERE sorteo_id = v_id),
+        'ocupacion', (
+            -- Compacta: números ordenados + un carácter de estado por número
+            SELECT json_build_object(
+                'numeros', COALESCE(json_agg(numero ORDER BY numero), '[]'),
+                'estados', COALESCE(string_agg(CASE estado WHEN 'apartado' THEN 'a' WHEN 'abonado' THEN 'b' WHEN 'pagado' THEN 'p' ELSE '?' END, '' ORDER BY numero), ''),
+                'otros', COALESCE(json_object_agg(numero, estado) FILTER (WHERE estado NOT IN ('apartado', 'abonado', 'pagado')), '{}'))
+            FROM boletos WHERE sorteo_id = v_id),
+        'totales', (SELECT json_build_array(COUNT(*), COALESCE(SUM(precio), 0), COALESCE(SUM(total_abonado), 0)) FROM boletos WHERE sorteo_id = v_id),
+        'deudores', (
+            SELECT COALESCE(json_agg(json_build_array(c.nombre_completo, c.telefono, b.numero, b.precio, b.total_abonado) ORDER BY c.nombre_completo, b.numero), '[]')
+            FROM boletos b JOIN clientes c ON b.cliente_id = c.id
+            WHERE b.sorteo_id = v_id AND (b.precio - b.total_abonado) > 0.01 AND b.estado != 'disponible'),
+        'ultimo_historial', (SELECT COALESCE(MAX(id), 0) FROM historial WHERE sorteo_id = v_id)
+    );
+END $$;
+"""
+
+DDL_ARCHIVO = """
+CREATE TABLE IF NOT EXISTS boletos_archivo (LIKE boletos INCLUDING DEFAULTS);
+CREATE TABLE IF NOT EXISTS historial_archivo (LIKE historial INCLUDING DEFAULTS);
+CREATE INDEX IF NOT EXISTS boletos_archivo_sorteo ON boletos_archivo (sorteo_id, numero);
+CREATE INDEX IF NOT EXISTS historial_archivo_sorteo ON historial_archivo (sorteo_id, id);
+CREATE TABLE IF NOT EXISTS sorteos_archivados (
+    sorteo_id INT PRIMARY KEY, archivado TIMESTAMP NOT NULL DEFAULT NOW(), boletos INT NOT NULL, historial INT NOT NULL
+);
+CREATE OR REPLACE VIEW boletos_todos AS
+    SELECT * FROM boletos UNION ALL SELECT * FROM boletos_archivo;
+CREATE OR REPLACE VIEW historial_todos AS
+    SELECT * FROM historial UNION ALL SELECT * FROM historial_archivo;
+"""
+
+DDL_AGREGADOS = """
+CREATE TABLE IF NOT EXISTS agg_sorteo (
+    sorteo_id INT PRIMARY KEY, boletos INT NOT NULL DEFAULT 0, monto NUMERIC(14,2) NOT NULL DEFAULT 0,
+    abonado NUMERIC(14,2) NOT NULL DEFAULT 0, pagados INT NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS agg_cliente (
+    cliente_id INT PRIMARY KEY, boletos INT NOT NULL DEFAULT 0, monto NUMERIC(14,2) NOT NULL DEFAULT 0,
+    abonado NUMERIC(14,2) NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS agg_cliente_monto ON agg_cliente (monto DESC);
+CREATE TABLE IF NOT EXISTS agg_diario (
+    sorteo_id INT NOT NULL, dia DATE NOT NULL, vendidos INT NOT NULL DEFAULT 0, monto_vendido NUMERIC(14,2) NOT NULL DEFAULT 0,
+    liberados INT NOT NULL DEFAULT 0, cobrado NUMERIC(14,2) NOT NULL DEFAULT 0, movimientos INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (sorteo_id, dia)
+);
+CREATE INDEX IF NOT EXISTS agg_diario_dia ON agg_diario (dia);
+"""
+
+
+def _delta_totales(filas):
+    """Suma a agg_sorteo y agg_cliente el delta de una sentencia; filas: SELECT signo, boletos.* ..."""
+    return f"""
+        INSERT INTO agg_sorteo AS a (sorteo_id, boletos, monto, abonado, pagados)
+        SELECT sorteo_id, SUM(signo), SUM(signo * COALESCE(precio, 0)), SUM(signo * COALESCE(total_abonado, 0)),
+               COALESCE(SUM(signo) FILTER (WHERE estado = 'pagado'), 0)
+        FROM ({filas}) AS d GROUP BY sorteo_id ORDER BY sorteo_id
+        ON CONFLICT (sorteo_id) DO UPDATE SET boletos = a.boletos + EXCLUDED.boletos, monto = a.monto + EXCLUDED.monto,
+            abonado = a.abonado + EXCLUDED.abonado, pagados = a.pagados + EXCLUDED.pagados;
+        INSERT INTO agg_cliente AS a (cliente_id, boletos, monto, abonado)
+        SELECT cliente_id, SUM(signo), SUM(signo * COALESCE(precio, 0)), SUM(signo * COALESCE(total_abonado, 0))
+        FROM ({filas}) AS d WHERE cliente_id IS NOT NULL GROUP BY cliente_id ORDER BY cliente_id
+        ON CONFLICT (cliente_id) DO UPDATE SET boletos = a.boletos + EXCLUDED.boletos, monto = a.monto + EXCLUDED.monto,
+            abonado = a.abonado + EXCLUDED.abonado;"""
+
+
+# Un trigger por sentencia (no por fila): un INSERT de 200 boletos es un upsert por
+# sorteo/cliente/día, no tres por boleto. Movimientos del historial por trigger
+# también, en la misma transacción que los escribe.
+DDL_TRIGGERS_AGREGADOS = f"""
+
+CREATE OR REPLACE FUNCTION agg_boletos_sentencia() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    -- Pasar un sorteo al archivo (o restaurarlo) no cambia sus totales
+    IF current_setting('sorteos.archivando', true) = 'on' THEN RETURN NULL; END IF;
+    IF TG_OP = 'INSERT' THEN
+        {_delta_totales("SELECT 1 AS signo, * FROM nuevos")}
+        INSERT INTO agg_diario AS a (sorteo_id, dia, vendidos, monto_vendido, cobrado)
+        SELECT sorteo_id, COALESCE(fecha_asignacion, NOW())::date, COUNT(*), COALESCE(SUM(precio), 0), COALESCE(SUM(total_abonado), 0)
+        FROM nuevos GROUP BY 1, 2 ORDER BY 1, 2
+        ON CONFLICT (sorteo_id, dia) DO UPDATE SET vendidos = a.vendidos + EXCLUDED.vendidos,
+            monto_vendido = a.monto_vendido + EXCLUDED.monto_vendido, cobrado = a.cobrado + EXCLUDED.cobrado;
+    ELSIF TG_OP = 'UPDATE' THEN
+        {_delta_totales("SELECT 1 AS signo, * FROM nuevos UNION ALL SELECT -1, * FROM viejos")}
+        INSERT INTO agg_diario AS a (sorteo_id, dia, cobrado)
+        SELECT n.sorteo_id, CURRENT_DATE, SUM(COALESCE(n.total_abonado, 0) - COALESCE(v.total_abonado, 0))
+        FROM nuevos n JOIN viejos v ON v.id = n.id
+        WHERE n.total_abonado IS DISTINCT FROM v.total_abonado GROUP BY 1 ORDER BY 1
+        ON CONFLICT (sorteo_id, dia) DO UPDATE SET cobrado = a.cobrado + EXCLUDED.cobrado;
+    ELSE
+        {_delta_totales("SELECT -1 AS signo, * FROM viejos")}
+        INSERT INTO agg_diario AS a (sorteo_id, dia, liberados, cobrado)
+        SELECT sorteo_id, CURRENT_DATE, COUNT(*), -COALESCE(SUM(total_abonado), 0)
+        FROM viejos GROUP BY 1 ORDER BY 1
+        ON CONFLICT (sorteo_id, dia) DO UPDATE SET liberados = a.liberados + EXCLUDED.liberados, cobrado = a.cobrado + EXCLUDED.cobrado;
+    END IF;
+    RETURN NULL;
+END $$;
+
+-- Las tablas de transición van con un solo evento por trigger
+CREATE TRIGGER agg_boletos_insert AFTER INSERT ON boletos REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION agg_boletos_sentencia();
+CREATE TRIGGER agg_boletos_update AFTER UPDATE ON boletos REFERENCING OLD TABLE AS viejos NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION agg_boletos_sentencia();
+CREATE TRIGGER agg_boletos_delete AFTER DELETE ON boletos REFERENCING OLD TABLE AS viejos
+    FOR EACH STATEMENT EXECUTE FUNCTION agg_boletos_sentencia();
+
+CREATE OR REPLACE FUNCTION agg_historial_sentencia() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF current_setting('sorteos.archivando', true) = 'on' THEN RETURN NULL; END IF;
+    INSERT INTO agg_diario AS a (sorteo_id, dia, movimientos)
+    SELECT sorteo_id, fecha_hora::date, COUNT(*) FROM nuevos WHERE sorteo_id IS NOT NULL GROUP BY 1, 2 ORDER BY 1, 2
+    ON CONFLICT (sorteo_id, dia) DO UPDATE SET movimientos = a.movimientos + EXCLUDED.movimientos;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER agg_historial AFTER INSERT ON historial REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION agg_historial_sentencia();
+
+"""
+
+# Carga inicial desde lo que ya hay, con boletos e historial bloqueados para escritura
+CARGAR_AGREGADOS = """
+LOCK TABLE boletos, historial IN SHARE ROW EXCLUSIVE MODE;
+INSERT INTO agg_sorteo (sorteo_id, boletos, monto, abonado, pagados)
+SELECT sorteo_id, COUNT(*), COALESCE(SUM(precio), 0), COALESCE(SUM(total_abonado), 0), COUNT(*) FILTER (WHERE estado = 'pagado')
+FROM boletos_todos GROUP BY sorteo_id;
+INSERT INTO agg_cliente (cliente_id, boletos, monto, abonado)
+SELECT cliente_id, COUNT(*), COALESCE(SUM(precio), 0), COALESCE(SUM(total_abonado), 0)
+FROM boletos_todos WHERE cliente_id IS NOT NULL GROUP BY cliente_id;
+INSERT INTO agg_diario (sorteo_id, dia, vendidos, monto_vendido, cobrado)
+SELECT sorteo_id, COALESCE(fecha_asignacion, NOW())::date, COUNT(*), COALESCE(SUM(precio), 0), COALESCE(SUM(total_abonado), 0)
+FROM boletos_todos GROUP BY 1, 2;
+INSERT INTO agg_diario AS a (sorteo_id, dia, movimientos)
+SELECT sorteo_id, fecha_hora::date, COUNT(*) FROM historial_todos WHERE sorteo_id IS NOT NULL GROUP BY 1, 2
+ON CONFLICT (sorteo_id, dia) DO UPDATE SET movimientos = EXCLUDED.movimientos;
+"""
+
+# Misma regla que importar_clientes.normalizar_cedula ('v 12.345.678' -> 'V-12345678', NULL si no sirve).
+# IMMUTABLE para poder indexarla: formulario e importación buscan la cédula por este índice
+DDL_CEDULA_NORMALIZADA = r"""
+CREATE OR REPLACE FUNCTION normalizar_cedula(p TEXT) RETURNS TEXT LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE WHEN c ~ '^[VE]?0*[0-9]{5,9}$'
+                THEN CASE WHEN c LIKE 'E%' THEN 'E-' ELSE 'V-' END || substring(c FROM '^[VE]?0*([0-9]{5,9})$')
+           END
+    FROM (SELECT upper(regexp_replace(p, '[[:space:]._/-]', '', 'g')) AS c) AS t
+$$;
+CREATE INDEX IF NOT EXISTS clientes_cedula_normalizada ON clientes (normalizar_cedula(cedula));
+ANALYZE clientes;
+"""
+
+# (versión, descripción, sql). Solo se agregan al final.
+MIGRACIONES = [
+    (1, "tablas base", ESQUEMA_BASE),
+    (2, "índices de las consultas calientes", INDICES_CALIENTES),
+    (3, "función snapshot_sorteo", DDL_SNAPSHOT),
+    (4, "archivo de sorteos cerrados", DDL_ARCHIVO),
+    (5, "índice del navegador de clientes",
+     "CREATE INDEX IF NOT EXISTS clientes_nombre_id ON clientes (nombre_completo, id);"),  # páginas A-Z por clave
+    (6, "índices de búsqueda exacta de clientes (caja rápida)",
+     "CREATE INDEX IF NOT EXISTS clientes_codigo ON clientes (codigo);"
+     "CREATE INDEX IF NOT EXISTS clientes_cedula ON clientes (cedula);"),
+    (7, "agregados del tablero global", DDL_AGREGADOS + CARGAR_AGREGADOS + DDL_TRIGGERS_AGREGADOS),
+    (8, "cédula normalizada de clientes (índice)", DDL_CEDULA_NORMALIZADA),
+]
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+DDL_VERSIONES = """
+CREATE TABLE IF NOT EXISTS esquema_version (
+    version INT PRIMARY KEY, descripcion TEXT NOT NULL, aplicada TIMESTAMP NOT NULL DEFAULT NOW()
+)
+"""
+CANDADO_MIGRACION = 7_305_001  # pg_advisory_xact_lock: un solo proceso migrando a la vez
+
+
+def version_actual(cur):
+    cur.execute("SELECT to_regclass('esquema_version') IS NOT NULL")
+    if not cur.fetchone()[0]: return 0
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM esquema_version")
+    return cur.fetchone()[0]
+
+
+def migrar(conn):
+    """
+    Aplica las migraciones pendientes en una sola transacción.
+    Devuelve la lista de (versión, descripción) aplicadas (vacía si ya estaba al día).
+    """
+    with conn.cursor() as cur:
+        if version_actual(cur) >= VERSION_ESQUEMA:
+            conn.commit()
+            return []
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (CANDADO_MIGRACION,))
+        cur.execute(DDL_VERSIONES)
+        cur.execute("SELECT version FROM esquema_version")
+        hechas = {r[0] for r in cur.fetchall()}
+        aplicadas = []
+        for version, descripcion, sql in MIGRACIONES:
+            if version in hechas: continue
+            cur.execute(sql)
+            cur.execute("INSERT INTO esquema_version (version, descripcion) VALUES (%s, %s)", (version, descripcion))
+            aplicadas.append((version, descripcion))
+    conn.commit()
+    return aplicadas
+
+
+# ============================================================================
+#  VERIFICADOR DE PLANES (EXPLAIN SOBRE DATOS SINTÉTICOS)
+# ============================================================================
+# Tablas que crecen con los sorteos: ninguna consulta caliente debe recorrerlas enteras.
+# (clientes sí puede aparecer en Seq Scan en los listados que cruzan todo un sorteo)
+TABLAS_GRANDES = {"boletos", "historial", "configuracion"}
+# ...salvo en las páginas del navegador de clientes, que deben ir por índice
+VIGILAR_CLIENTES = {"clientes_pagina_id", "clientes_pagina_nombre", "clientes_resolver", "clientes_ultimo_codigo", "clientes_por_cedula"}
+
+ESQUEMA_VERIFICACION = "verificacion_planes"
+
+
+def _consultas_a_verificar(n_sorteos, n_clientes):
+    sid = n_sorteos // 2
+    consultas = [
+        ("ocupacion", (sid,)), ("max_numero", (sid,)), ("ultimo_historial", (sid,)), ("resumen_ventas", (sid,)),
+        ("boletos_por_numero", (sid, [1, 2, 3])), ("clientes_con_boletos", (sid,)),
+        ("boletos_cliente", (sid, n_clientes // 2)), ("cobranza_estado", (sid,)),
+        ("cobranza_historial", (sid,)), ("deudores", (sid,)),
+        ("clientes_pagina_id", (n_clientes // 2, 16)), ("clientes_pagina_nombre", ("M", 0, 16)),
+        ("clientes_resolver", ([0], ["000042"], [1, 1], ["V-20000042", "E-20000042"], [2], ["CLIENTE 000042"])),
+        ("clientes_ultimo_codigo", ()), ("clientes_por_cedula", ("V-20000042", None)),
+    ]
+    filas = [(nombre, SQL[nombre].sql, params) for nombre, params in consultas]
+    # Escrituras del día a día (EXPLAIN sin ANALYZE: no se ejecutan)
+    filas += [
+        ("actualizar_por_numero", "UPDATE boletos SET estado = 'pagado' WHERE sorteo_id = %s AND numero = %s", (sid, 7)),
+        ("configuracion_clave", "SELECT valor FROM configuracion WHERE clave = %s", (f"capacidad_sorteo_{sid}",)),
+    ]
+    return filas
+
+
+def _sembrar_sintetico(cur, n_sorteos, boletos_por_sorteo, n_clientes):
+    cur.execute("""
+        INSERT INTO sorteos (nombre, precio_boleto, activo)
+        SELECT 'VERIFICACION ' || g, 10, g > %s - 3 FROM generate_series(1, %s) AS g
+    """, (n_sorteos, n_sorteos))
+    cur.execute("""
+        INSERT INTO clientes (codigo, nombre_completo, cedula, telefono)
+        SELECT lpad(g::text, 6, '0'), 'CLIENTE ' || lpad(g::text, 6, '0'), 'V-' || (20000000 + g), '0414' || lpad(g::text, 7, '0')
+        FROM generate_series(1, %s) AS g
+    """, (n_clientes,))
+    cur.execute("""
+        INSERT INTO boletos (sorteo_id, numero, estado, precio, cliente_id, total_abonado)
+        SELECT s, n, (ARRAY['apartado', 'abonado', 'pagado'])[1 + n %% 3], 10, 1 + (s * %s + n) %% %s, (n %% 3) * 5
+        FROM generate_series(1, %s) AS s, generate_series(0, %s - 1) AS n
+    """, (boletos_por_sorteo, n_clientes, n_sorteos, boletos_por_sorteo))
+    cur.execute("""
+        INSERT INTO historial (sorteo_id, usuario, accion, detalle, monto)
+        SELECT s, 'MOVIL', 'VENTA', 'Boleto ' || n, 10
+        FROM generate_series(1, %s) AS s, generate_series(1, %s * 2) AS n
+    """, (n_sorteos, boletos_por_sorteo))
+    cur.execute("""
+        INSERT INTO configuracion (clave, valor)
+        SELECT 'capacidad_sorteo_' || s, %s::text FROM generate_series(1, %s) AS s
+        UNION ALL
+        SELECT 'ajuste_' || k || '_sorteo_' || s, 'x' FROM generate_series(1, %s) AS s, generate_series(1, 20) AS k
+    """, (boletos_por_sorteo, n_sorteos, n_sorteos))
+    cur.execute("ANALYZE sorteos, clientes, boletos, historial, configuracion")
+
+
+def _recorridos_completos(nodo, tablas=TABLAS_GRANDES):
+    """Tablas grandes que el plan recorre con Seq Scan"""
+    encontradas = []
+    if nodo.get("Node Type") == "Seq Scan" and nodo.get("Relation Name") in tablas:
+        encontradas.append(nodo["Relation Name"])
+    for hijo in nodo.get("Plans", []):
+        encontradas += _recorridos_completos(hijo, tablas)
+    return encontradas
+
+
+def verificar_planes(conn, n_sorteos=200, boletos_por_sorteo=1000, n_clientes=20000):
+    """
+    Crea el esquema completo en un esquema aparte, lo llena con datos sintéticos
+    y revisa el plan de cada consulta caliente. Todo se deshace al final.
+    Devuelve [(nombre, [tablas con Seq Scan], plan en texto), ...]
+    """
+    resultados = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {ESQUEMA_VERIFICACION}")
+            cur.execute(f"SET LOCAL search_path TO {ESQUEMA_VERIFICACION}")
+            for _version, _descripcion, sql in MIGRACIONES:
+                cur.execute(sql)
+            _sembrar_sintetico(cur, n_sorteos, boletos_por_sorteo, n_clientes)
+            for nombre, sql, params in _consultas_a_verificar(n_sorteos, n_clientes):
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str): plan = json.loads(plan)
+                cur.execute("EXPLAIN " + sql, params)
+                texto = "\n".join(r[0] for r in cur.fetchall())
+                tablas = TABLAS_GRANDES | {"clientes"} if nombre in VIGILAR_CLIENTES else TABLAS_GRANDES
+                resultados.append((nombre, _recorridos_completos(plan[0]["Plan"], tablas), texto))
+    finally:
+        conn.rollback()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Esquema versionado y verificación de planes")
+    parser.add_argument("--dsn", required=True)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("migrar", help="Aplica las migraciones pendientes")
+    sub.add_parser("estado", help="Versión del esquema y migraciones aplicadas")
+    p_ver = sub.add_parser("verificar", help="EXPLAIN de las consultas calientes sobre datos sintéticos")
+    p_ver.add_argument("--sorteos", type=int, default=200)
+    p_ver.add_argument("--boletos", type=int, default=1000, help="Boletos por sorteo")
+    p_ver.add_argument("--clientes", type=int, default=20000)
+    p_ver.add_argument("--planes", action="store_true", help="Mostrar el plan de cada consulta")
+    args = parser.parse_args()
+
+    with psycopg2.connect(args.dsn) as conn:
+        if args.comando == "migrar":
+            aplicadas = migrar(conn)
+            for version, descripcion in aplicadas: print(f"✅ {version:>3}  {descripcion}")
+            print(f"Esquema en la versión {VERSION_ESQUEMA}" + ("" if aplicadas else " (ya estaba al día)"))
+        elif args.comando == "estado":
+            with conn.cursor() as cur:
+                actual = version_actual(cur)
+                hechas = {}
+                if actual:
+                    cur.execute("SELECT version, aplicada FROM esquema_version")
+                    hechas = dict(cur.fetchall())
+            for version, descripcion, _sql in MIGRACIONES:
+                marca = f"aplicada {hechas[version]:%Y-%m-%d %H:%M}" if version in hechas else "PENDIENTE"
+                print(f"{version:>3}  {descripcion:<40}{marca}")
+        elif args.comando == "verificar":
+            fallas = 0
+            for nombre, recorridos, texto in verificar_planes(conn, args.sorteos, args.boletos, args.clientes):
+                if recorridos: fallas += 1
+                print(f"{'❌' if recorridos else '✅'} {nombre:<24}" + (f"Seq Scan en {', '.join(recorridos)}" if recorridos else ""))
+                if args.planes or recorridos: print("    " + texto.replace("\n", "\n    "))
+            print(f"\n{fallas} consulta(s) con recorrido completo" if fallas else "\nTodas las consultas calientes usan índice")
+            return 1 if fallas else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Reporte Excel de cobranza (Estado General + Historial de Movimientos).
+
+Módulo aparte, sin Streamlit: lo usan la app (pestaña COBRANZA) y la línea
+de comandos (archivo_sorteos.py exportar) sin tener que cargar la app.
+"""
+import io
+
+
+def generar_excel_cobranza(rows_estado, rows_hist, avance=None):
+    """Arma el Excel (Estado General + Historial). Devuelve (buffer, hay_datos)"""
+    import pandas as pd
+    if avance: avance(0.05, "Estado general...")
+    buffer = io.BytesIO()
+    hay_datos = False
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        
+        if rows_estado:
+            df_estado = pd.DataFrame(rows_estado, columns=["Número", "Cliente", "Teléfono", "Cédula", "Estado", "Precio ($)", "Abonado ($)", "Saldo Pendiente ($)", "Fecha Asignación"])
+            try: df_estado["Fecha Asignación"] = pd.to_datetime(df_estado["Fecha Asignación"]).dt.strftime('%d/%m/%Y')
+            except: pass
+            
+            df_estado.to_excel(writer, index=False, sheet_name='Estado General')
+            hay_datos = True
+        else:
+            pd.DataFrame(columns=["Mensaje"]).to_excel(writer, sheet_name='Estado General', index=False)
+
+        if rows_hist:
+            if avance: avance(0.4, "Historial de movimientos...")
+            df_hist = pd.DataFrame(rows_hist, columns=["FechaRaw", "Usuario", "Acción", "Detalle", "MontoRaw"])
+            df_hist.insert(0, "Nro. Transacción", range(1, len(df_hist) + 1))
+            
+            try:
+                df_hist["FechaRaw"] = pd.to_datetime(df_hist["FechaRaw"]) - pd.Timedelta(hours=4)
+                df_hist["Fecha"] = df_hist["FechaRaw"].dt.strftime('%d/%m/%Y')
+                df_hist["Hora"] = df_hist["FechaRaw"].dt.strftime('%I:%M %p') 
+            except:
+                df_hist["Fecha"] = df_hist["FechaRaw"].astype(str)
+                df_hist["Hora"] = ""
+
+            def separar_detalle(texto):
+                boleto = texto
+                cliente = ""
+                if " - " in str(texto):
+                    partes = str(texto).split(" - ", 1)
+                    boleto = partes[0].strip() 
+                    resto = partes[1].strip()  
+                    if " | " in resto:
+                        cliente = resto.split(" | ")[0].strip()
+                    else:
+                        cliente = resto
+                return pd.Series([boleto, cliente])
+
+            df_hist[["Boletos", "Cliente"]] = df_hist["Detalle"].apply(separar_detalle)
+            df_hist["Monto ($)"] = df_hist["MontoRaw"].apply(lambda x: "{:.2f}".format(float(x) if x else 0.0))
+            
+            cols_finales = ["Nro. Transacción", "Fecha", "Hora", "Usuario", "Acción", "Boletos", "Cliente", "Monto ($)"]
+            df_export = df_hist[cols_finales]
+            
+            df_export.to_excel(writer, index=False, sheet_name='Historial Movimientos')
+            
+            worksheet = writer.sheets['Historial Movimientos']
+            worksheet.set_column('A:A', 10) 
+            worksheet.set_column('B:C', 12) 
+            worksheet.set_column('F:F', 15) 
+            worksheet.set_column('G:G', 40) 
+            
+            hay_datos = True
+    buffer.seek(0)
+    return buffer, hay_datos
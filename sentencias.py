@@ -0,0 +1,207 @@
+"""
+Registro de sentencias con nombre para las consultas que corren en casi
+todos los reruns (lista de sorteos, ocupación, totales, búsquedas...).
+
+Cada sentencia se prepara una sola vez por conexión (PREPARE) y luego se
+ejecuta por nombre (EXECUTE), así Postgres no vuelve a analizar ni
+planificar el mismo texto en cada toque. El registro lleva tiempos por
+sentencia para el panel de rendimiento.
+
+Preparar es opcional (preparar=True, SORTEOS_PREPARAR=1): con un pooler en
+modo transacción (p. ej. el puerto 6543 de Supabase) las sentencias preparadas
+no sobreviven entre transacciones, así que por defecto se ejecuta el texto plano.
+PREPARE no es transaccional (un ROLLBACK no lo deshace): se hace dentro de un
+SAVEPOINT en la transacción que haya en curso, sin confirmarla ni deshacerla,
+o directo en conexiones autocommit (la réplica), donde no hay SAVEPOINT.
+"""
+import re
+import threading
+import time
+import weakref
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR
+
+
+class Sentencia:
+    def __init__(self, nombre, sql):
+        self.nombre = nombre
+        self.sql = " ".join(sql.split())
+        self.n_params = self.sql.count("%s")
+        # %s -> $1, $2... para el PREPARE
+        contador = iter(range(1, self.n_params + 1))
+        self.sql_prepare = f"PREPARE {nombre} AS " + re.sub(r"%s", lambda _: f"${next(contador)}", self.sql)
+        self.sql_execute = f"EXECUTE {nombre}" + (" (" + ", ".join(["%s"] * self.n_params) + ")" if self.n_params else "")
+
+    def __str__(self):
+        return self.sql
+
+
+# ============================================================================
+#  CONSULTAS CALIENTES (UN SOLO LUGAR PARA AJUSTARLAS)
+# ============================================================================
+SQL = {s.nombre: s for s in [
+    Sentencia("sorteos_activos", """
+        SELECT id, nombre, precio_boleto, fecha_sorteo, hora_sorteo, premio1, premio2, premio3, premio_extra1, premio_extra2,
+               cant_promo1, precio_promo1, cant_promo2, precio_promo2, cant_promo3, precio_promo3
+        FROM sorteos WHERE activo = TRUE ORDER BY id
+    """),
+    Sentencia("configuracion", "SELECT clave, valor FROM configuracion"),
+    Sentencia("ocupacion", "SELECT numero, estado FROM boletos WHERE sorteo_id = %s"),
+    Sentencia("max_numero", "SELECT MAX(numero) FROM boletos WHERE sorteo_id = %s"),
+    Sentencia("ultimo_historial", "SELECT COALESCE(MAX(id), 0) FROM historial WHERE sorteo_id = %s"),
+    Sentencia("snapshot_sorteo", "SELECT snapshot_sorteo(%s)"),
+    Sentencia("resumen_ventas", "SELECT COUNT(*), SUM(precio) FROM boletos WHERE sorteo_id = %s"),
+    Sentencia("boletos_por_numero", """
+        SELECT b.numero, b.estado, b.precio, b.total_abonado, b.fecha_asignacion, b.id, b.cliente_id,
+               c.nombre_completo, c.telefono, c.cedula, c.direccion, c.codigo
+        FROM boletos b
+        LEFT JOIN clientes c ON b.cliente_id = c.id
+        WHERE b.sorteo_id = %s AND b.numero = ANY(%s)
+    """),
+    Sentencia("clientes_selector", "SELECT id, nombre_completo, codigo FROM clientes ORDER BY nombre_completo"),
+    Sentencia("clientes_con_boletos", """
+        SELECT DISTINCT c.id, c.nombre_completo, c.telefono, c.cedula, c.direccion, c.codigo
+        FROM clientes c
+        JOIN boletos b ON c.id = b.cliente_id
+        WHERE b.sorteo_id = %s ORDER BY c.nombre_completo
+    """),
+    Sentencia("boletos_cliente", """
+        SELECT numero, estado, precio, total_abonado, fecha_asignacion
+        FROM boletos WHERE sorteo_id = %s AND cliente_id = %s ORDER BY numero ASC
+    """),
+    # Navegador de clientes: paginación por clave (el cursor es la última fila vista), nunca OFFSET
+    Sentencia("clientes_pagina_id", """
+        SELECT id, nombre_completo, cedula, telefono, direccion, codigo FROM clientes
+        WHERE id < %s ORDER BY id DESC LIMIT %s
+    """),
+    Sentencia("clientes_pagina_nombre", """
+        SELECT id, nombre_completo, cedula, telefono, direccion, codigo FROM clientes
+        WHERE (nombre_completo, id) > (%s, %s) ORDER BY nombre_completo, id LIMIT %s
+    """),
+    Sentencia("clientes_total", "SELECT COUNT(*) FROM clientes"),
+    # Último código correlativo (000123): el índice de codigo lo encuentra sin recorrer la tabla
+    Sentencia("clientes_ultimo_codigo", "SELECT COALESCE(MAX(codigo), '0') FROM clientes WHERE codigo ~ '^[0-9]{6}$'"),
+    # Otro cliente con la misma cédula normalizada (índice de normalizar_cedula(cedula), migración 8)
+    Sentencia("clientes_por_cedula", """
+        SELECT codigo, nombre_completo FROM clientes
+        WHERE normalizar_cedula(cedula) = %s AND id IS DISTINCT FROM %s LIMIT 1
+    """),
+    # Caja rápida: (índice de línea, valor) por código, cédula y nombre exacto (1, 2, 3 = prioridad); cada rama va por su índice
+    Sentencia("clientes_resolver", """
+        SELECT t.i, 1, c.id, c.nombre_completo, c.codigo FROM unnest(%s::int[], %s::text[]) AS t(i, v) JOIN clientes c ON c.codigo = t.v
+        UNION SELECT t.i, 2, c.id, c.nombre_completo, c.codigo FROM unnest(%s::int[], %s::text[]) AS t(i, v) JOIN clientes c ON c.cedula = t.v
+        UNION SELECT t.i, 3, c.id, c.nombre_completo, c.codigo FROM unnest(%s::int[], %s::text[]) AS t(i, v) JOIN clientes c ON c.nombre_completo = t.v
+    """),
+    Sentencia("clientes_buscar", """
+        SELECT id, nombre_completo, cedula, telefono, direccion, codigo FROM clientes
+        WHERE nombre_completo ILIKE %s OR cedula ILIKE %s ORDER BY id DESC LIMIT 15
+    """),
+    Sentencia("cobranza_estado", """
+        SELECT
+            b.numero as "Número",
+            c.nombre_completo as "Cliente",
+            c.telefono as "Teléfono",
+            c.cedula as "Cédula",
+            UPPER(b.estado) as "Estado",
+            b.precio as "Precio ($)",
+            b.total_abonado as "Abonado ($)",
+            (b.precio - b.total_abonado) as "Saldo Pendiente ($)",
+            b.fecha_asignacion as "Fecha Asignación"
+        FROM boletos b
+        JOIN clientes c ON b.cliente_id = c.id
+        WHERE b.sorteo_id = %s
+        ORDER BY b.numero ASC
+    """),
+    Sentencia("cobranza_historial", """
+        SELECT fecha_hora, usuario, accion, detalle, monto
+        FROM historial
+        WHERE sorteo_id = %s
+        ORDER BY id ASC
+    """),
+    Sentencia("deudores", """
+        SELECT c.nombre_completo, c.telefono, b.numero, b.precio, b.total_abonado
+        FROM boletos b
+        JOIN clientes c ON b.cliente_id = c.id
+        WHERE b.sorteo_id = %s
+          AND (b.precio - b.total_abonado) > 0.01
+          AND b.estado != 'disponible'
+        ORDER BY c.nombre_completo
+    """),
+]}
+
+
+# ============================================================================
+#  REGISTRO (PREPARA POR CONEXIÓN Y MIDE)
+# ============================================================================
+class RegistroSentencias:
+    def __init__(self, preparar=False):
+        self.preparar = preparar
+        self._preparadas = weakref.WeakKeyDictionary()  # conexión -> {nombres ya preparados}
+        self._stats = {}
+        self._candado = threading.Lock()
+
+    def ejecutar(self, cur, sentencia, params=None):
+        """Ejecuta la sentencia en el cursor, por nombre si esta conexión ya la tiene preparada"""
+        t0 = time.perf_counter()
+        preparo = 0
+        conn = cur.connection
+        hechas = self._preparadas.setdefault(conn, set()) if self.preparar else set()
+        estado = conn.info.transaction_status
+        libre = estado == TRANSACTION_STATUS_IDLE
+        if self.preparar and sentencia.nombre not in hechas and estado != TRANSACTION_STATUS_INERROR:
+            preparo = self._preparar(cur, sentencia)
+            hechas.add(sentencia.nombre)
+        if sentencia.nombre in hechas:
+            try:
+                cur.execute(sentencia.sql_execute, params)
+            except psycopg2.errors.InvalidSqlStatementName:
+                # La sesión del servidor ya no la tiene: hay un pooler en modo transacción de por medio
+                self.preparar = False
+                hechas.clear()
+                if not libre: raise  # La transacción en curso ya falló: que la maneje quien la abrió
+                conn.rollback()  # Solo contenía este EXECUTE
+                cur.execute(sentencia.sql, params)
+        else:
+            # Sin preparar (o con la transacción ya fallida: se prepara en una próxima consulta)
+            cur.execute(sentencia.sql, params)
+        self._anotar(sentencia.nombre, (time.perf_counter() - t0) * 1000, preparo)
+
+    @staticmethod
+    def _preparar(cur, sentencia):
+        """PREPARE sin confirmar ni deshacer la transacción en curso. 1 si la preparó, 0 si ya existía"""
+        if cur.connection.autocommit:
+            # Réplica (autocommit): sin bloque de transacción no hay SAVEPOINT, y un error no arrastra nada
+            try:
+                cur.execute(sentencia.sql_prepare)
+                return 1
+            except psycopg2.errors.DuplicatePreparedStatement:
+                return 0  # Ya existía en la sesión (conexión reutilizada)
+        cur.execute("SAVEPOINT preparar_sentencia")
+        try:
+            cur.execute(sentencia.sql_prepare)
+            preparo = 1
+        except psycopg2.errors.DuplicatePreparedStatement:
+            cur.execute("ROLLBACK TO SAVEPOINT preparar_sentencia")
+            preparo = 0
+        else:
+            cur.execute("RELEASE SAVEPOINT preparar_sentencia")
+        return preparo
+
+    def _anotar(self, nombre, ms, preparo):
+        with self._candado:
+            reg = self._stats.setdefault(nombre, {"llamadas": 0, "ms": 0.0, "ms_max": 0.0, "preparaciones": 0})
+            reg["llamadas"] += 1
+            reg["ms"] += ms
+            reg["ms_max"] = max(reg["ms_max"], ms)
+            reg["preparaciones"] += preparo
+
+    def estadisticas(self):
+        """Filas para mostrar: una por sentencia, las más costosas primero"""
+        with self._candado:
+            filas = [
+                {"Sentencia": n, "Llamadas": r["llamadas"], "ms total": round(r["ms"], 1),
+                 "ms prom": round(r["ms"] / r["llamadas"], 2), "ms máx": round(r["ms_max"], 1), "Preparada": r["preparaciones"]}
+                for n, r in self._stats.items()
+            ]
+        return sorted(filas, key=lambda f: f["ms total"], reverse=True)
@@ -0,0 +1,74 @@
+"""
+Almacén de artefactos (almacen_artefactos.py) sobre una carpeta temporal:
+lectura por mmap, generar una sola vez, total acumulado y desalojo de los
+menos usados.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from almacen_artefactos import AlmacenArtefactos
+
+
+def _envejecer(almacen, clave, segundos):
+    """Fecha de uso artificial (mtime) para no depender de la resolución del reloj"""
+    ruta = almacen._archivo(clave)
+    os.utime(ruta, (segundos, segundos))
+
+
+def test_guardar_y_leer(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path))
+    almacen.guardar("tabla-1", b"contenido")
+    datos = almacen.leer("tabla-1")
+    assert isinstance(datos, memoryview)
+    assert bytes(datos) == b"contenido"
+    assert almacen.leer("no-existe") is None
+    assert not any(n.startswith(".tmp-") for _, _, archivos in os.walk(tmp_path) for n in archivos)
+
+
+def test_obtener_o_generar_genera_una_sola_vez(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path))
+    llamadas = []
+    def generar():
+        llamadas.append(1)
+        return b"pdf"
+    assert bytes(almacen.obtener_o_generar("pdf-1", generar)) == b"pdf"
+    assert bytes(almacen.obtener_o_generar("pdf-1", generar)) == b"pdf"
+    assert len(llamadas) == 1
+    # None = no hay nada que guardar
+    assert almacen.obtener_o_generar("vacio", lambda: None) is None
+    assert not almacen.contiene("vacio")
+
+
+def test_otro_proceso_ve_lo_guardado(tmp_path):
+    AlmacenArtefactos(str(tmp_path)).guardar("zip-1", b"z" * 10)
+    otro = AlmacenArtefactos(str(tmp_path))
+    assert bytes(otro.leer("zip-1")) == b"z" * 10
+    assert otro._total == 10
+
+
+def test_reemplazar_no_suma_dos_veces(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path))
+    almacen.guardar("a", b"x" * 100)
+    almacen.guardar("a", b"y" * 40)
+    assert almacen._total == almacen.tamano_total() == 40
+
+
+def test_desaloja_los_menos_usados(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path), max_bytes=300)
+    for i, clave in enumerate(["vieja", "media", "nueva"]):
+        almacen.guardar(clave, b"x" * 100)
+        _envejecer(almacen, clave, 1_000_000 + i)
+    almacen.leer("vieja")  # Leer la vuelve la más reciente
+    almacen.guardar("otra", b"x" * 100)
+    assert not almacen.contiene("media")
+    assert all(almacen.contiene(c) for c in ("vieja", "nueva", "otra"))
+    assert almacen._total == almacen.tamano_total() == 300
+
+
+def test_bajo_el_limite_no_borra_nada(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path), max_bytes=1000)
+    for i in range(5): almacen.guardar(f"k{i}", b"x" * 100)
+    assert almacen.desalojar() == 0
+    assert almacen.tamano_total() == 500
@@ -0,0 +1,48 @@
+"""
+Historial (auditoria.py): todas las filas de una acción salen en un solo
+INSERT de varias filas, con las columnas en el orden del unnest.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auditoria
+from auditoria import SQL_INSERTAR_HISTORIAL
+
+
+class CursorFalso:
+    def __init__(self):
+        self.sentencias = []
+
+    def execute(self, sql, params=None):
+        self.sentencias.append((sql, params))
+
+
+def _fila(i):
+    return (1, "PAGO_COMPLETO", f"Boleto {i:03d}", float(i))
+
+
+def test_varias_filas_van_en_un_solo_insert():
+    cur = CursorFalso()
+    filas = [_fila(i) for i in range(5)]
+    auditoria.escribir(cur, filas)
+    assert len(cur.sentencias) == 1
+    sql, params = cur.sentencias[0]
+    assert sql == SQL_INSERTAR_HISTORIAL
+    # Mismo orden de columnas que el unnest: sorteo, acción, detalle, monto
+    assert list(zip(*params)) == filas
+
+
+def test_una_fila_suelta():
+    cur = CursorFalso()
+    auditoria.escribir(cur, _fila(7))
+    assert cur.sentencias == [(SQL_INSERTAR_HISTORIAL, ([1], ["PAGO_COMPLETO"], ["Boleto 007"], [7.0]))]
+
+
+def test_sin_filas_no_escribe():
+    cur = CursorFalso()
+    auditoria.escribir(cur, None)
+    auditoria.escribir(cur, [])
+    assert cur.sentencias == []
+    assert auditoria.parametros([]) == ([], [], [], [])
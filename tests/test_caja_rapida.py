@@ -0,0 +1,63 @@
+"""
+Caja rápida (caja_rapida.py): lectura de las líneas pegadas, claves de
+búsqueda del cliente y cotización, sin base de datos.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from caja_rapida import claves_cliente, cotizar_lineas, leer_lineas
+
+
+def parsear(texto):
+    """Intérprete mínimo de números: enteros separados por espacios"""
+    numeros, invalidos = [], []
+    for parte in texto.split():
+        if parte.isdigit(): numeros.append(int(parte))
+        else: invalidos.append(parte)
+    return numeros, invalidos
+
+
+def test_leer_lineas():
+    lineas = leer_lineas(
+        "045 067 | PEREZ JUAN | 10$\n"
+        "\n"
+        "# comentario\n"
+        "10 11 | 000123\n"
+        "5 | V-1 | 10 | sobra\n"
+        "abc | PEREZ\n"
+        "| PEREZ\n"
+        "7\n"
+        "8 | PEREZ | diez\n",
+        parsear)
+    assert [l["linea"] for l in lineas] == [1, 4, 5, 6, 7, 8, 9]
+    assert (lineas[0]["numeros"], lineas[0]["cliente_txt"], lineas[0]["abono"], lineas[0]["error"]) == ([45, 67], "PEREZ JUAN", 10.0, None)
+    assert (lineas[1]["numeros"], lineas[1]["abono"], lineas[1]["error"]) == ([10, 11], 0.0, None)  # Sin abono = apartado
+    assert lineas[2]["error"] == "sobran columnas (números | cliente | abono)"
+    assert lineas[3]["error"] == "números no válidos: abc"
+    assert lineas[4]["error"] == "sin números"
+    assert lineas[5]["error"] == "falta el cliente"
+    assert lineas[6]["error"] == "abono no válido: «diez»"
+
+
+def test_montos():
+    lineas = leer_lineas("1 | A | $10\n2 | A | 10,50\n3 | A | 7.5 $", parsear)
+    assert [l["abono"] for l in lineas] == [10.0, 10.5, 7.5]
+
+
+def test_claves_cliente():
+    assert claves_cliente("v-12.345.678") == {"codigo": [], "cedula": ["V-12345678"], "nombre": []}
+    assert claves_cliente("E 8123456") == {"codigo": [], "cedula": ["E-8123456"], "nombre": []}
+    # Solo dígitos: puede ser código o cédula sin letra
+    assert claves_cliente("123") == {"codigo": ["000123"], "cedula": ["V-123", "E-123"], "nombre": []}
+    assert claves_cliente("  perez   juan ") == {"codigo": [], "cedula": [], "nombre": ["PEREZ JUAN"]}
+    assert claves_cliente("") == {"codigo": [], "cedula": [], "nombre": []}
+
+
+def test_cotizar_lineas():
+    lineas = leer_lineas("1 2 | A\n3 4 | B | 5\n5 6 | C | 20\n7 8 | D | 25\nx | E", parsear)
+    cotizar_lineas(lineas, lambda n: 10.0 * n)
+    assert [(l["total"], l["estado"]) for l in lineas[:3]] == [(20.0, "apartado"), (20.0, "abonado"), (20.0, "pagado")]
+    assert lineas[3]["error"] == "abono $25.00 mayor que el total $20.00"
+    assert lineas[4]["estado"] is None  # Las líneas con error no se cotizan
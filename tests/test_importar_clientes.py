@@ -0,0 +1,77 @@
+"""
+Importación de clientes (importar_clientes.py): normalización de cédula y
+teléfono y preparación de las filas (encabezados, rechazos, repetidas).
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from importar_clientes import leer_filas, normalizar_cedula, normalizar_telefono, preparar_filas
+
+
+@pytest.mark.parametrize("texto, esperada", [
+    ("V-12.345.678", "V-12345678"),
+    ("v 12345678", "V-12345678"),
+    ("12345678", "V-12345678"),          # Sin letra = V
+    ("E-8123456", "E-8123456"),
+    ("e_8/123/456", "E-8123456"),
+    ("V0012345678", "V-12345678"),       # Ceros a la izquierda fuera
+    ("0001234", "V-01234"),              # ...pero quedan al menos 5 dígitos
+    ("1234", None),
+    ("1234567890", None),
+    ("X-1234567", None),
+    ("", None),
+    (None, None),
+])
+def test_normalizar_cedula(texto, esperada):
+    assert normalizar_cedula(texto) == esperada
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("+58 414-123.45.67", "04141234567"),
+    ("584141234567", "04141234567"),
+    ("4141234567", "04141234567"),
+    ("04141234567", "04141234567"),
+    ("0414", ""),
+    ("", ""),
+    (None, ""),
+])
+def test_normalizar_telefono(texto, esperado):
+    assert normalizar_telefono(texto) == esperado
+
+
+def test_preparar_filas():
+    filas = [
+        ["Teléfono", "Nombre Completo", "C.I.", "Domicilio"],
+        [4141234567.0, "  perez   juan ", 12345678.0, " calle  1 "],   # Excel: números como float
+        ["", "", "", ""],                                              # Vacía: se salta
+        ["0412", "ANA", "V-12.345.678", ""],
+        ["", "", "E-8123456", ""],
+        ["", "LUIS", "abc", ""],
+        ["", "MARIA", "e 8.123.456", ""],
+    ]
+    validas, rechazadas = preparar_filas(filas)
+    assert validas == [
+        (2, "PEREZ JUAN", "V-12345678", "04141234567", "calle 1"),
+        (7, "MARIA", "E-8123456", "", ""),
+    ]
+    assert rechazadas == [
+        (4, "cédula repetida en el archivo (fila 2)", "0412 | ANA | V-12.345.678 | "),
+        (5, "sin nombre", " |  | E-8123456 | "),
+        (6, "cédula no válida: «abc»", " | LUIS | abc | "),
+    ]
+
+
+def test_preparar_filas_sin_columnas_obligatorias():
+    with pytest.raises(ValueError, match="Faltan columnas: cedula"):
+        preparar_filas([["Nombre", "Teléfono"], ["ANA", "0414"]])
+    with pytest.raises(ValueError, match="vacío"):
+        preparar_filas([])
+
+
+def test_leer_csv_con_punto_y_coma_y_latin1():
+    contenido = "Nombre;Cédula\nJOSÉ;12345678\n".encode("latin-1")
+    assert leer_filas(contenido, "clientes.csv") == [["Nombre", "Cédula"], ["JOSÉ", "12345678"]]
@@ -0,0 +1,90 @@
+"""
+Preparación de sentencias (sentencias.py) contra conexiones falsas: la réplica
+en autocommit (sin SAVEPOINT posible) y la primaria con una transacción de
+lectura abierta, que no se confirma ni se deshace al preparar.
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR, TRANSACTION_STATUS_INTRANS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentencias import RegistroSentencias, Sentencia
+
+SENTENCIA = Sentencia("prueba_por_numero", "SELECT estado FROM boletos WHERE sorteo_id = %s AND numero = %s")
+
+
+class CursorFalso:
+    def __init__(self, conn):
+        self.connection = conn
+
+    def execute(self, sql, params=None):
+        conn = self.connection
+        if sql.startswith("SAVEPOINT") and conn.autocommit:
+            raise psycopg2.errors.NoActiveSqlTransaction("SAVEPOINT can only be used in transaction blocks")
+        if sql.startswith("PREPARE "):
+            nombre = sql.split()[1]
+            if nombre in conn.preparadas: raise psycopg2.errors.DuplicatePreparedStatement(nombre)
+            conn.preparadas.add(nombre)
+        conn.sentencias.append(sql.split()[0])
+
+
+class ConexionFalsa:
+    def __init__(self, autocommit=False, estado=TRANSACTION_STATUS_IDLE, preparadas=()):
+        self.autocommit = autocommit
+        self.info = SimpleNamespace(transaction_status=estado)
+        self.preparadas = set(preparadas)  # Las que ya tiene la sesión del servidor
+        self.sentencias = []
+        self.commits = self.rollbacks = 0
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_replica_autocommit_prepara_sin_savepoint():
+    registro = RegistroSentencias(preparar=True)
+    conn = ConexionFalsa(autocommit=True)
+    registro.ejecutar(conn.cursor(), SENTENCIA, (1, 5))
+    registro.ejecutar(conn.cursor(), SENTENCIA, (1, 6))
+    assert conn.sentencias == ["PREPARE", "EXECUTE", "EXECUTE"]
+    assert registro.estadisticas()[0]["Preparada"] == 1
+
+
+def test_replica_con_la_sentencia_ya_preparada_en_la_sesion():
+    registro = RegistroSentencias(preparar=True)
+    conn = ConexionFalsa(autocommit=True, preparadas={SENTENCIA.nombre})
+    registro.ejecutar(conn.cursor(), SENTENCIA, (1, 5))
+    assert conn.sentencias == ["EXECUTE"]
+    assert registro.estadisticas()[0]["Preparada"] == 0
+
+
+def test_primaria_con_lectura_abierta_prepara_sin_confirmar_ni_deshacer():
+    registro = RegistroSentencias(preparar=True)
+    conn = ConexionFalsa(estado=TRANSACTION_STATUS_INTRANS)
+    registro.ejecutar(conn.cursor(), SENTENCIA, (1, 5))
+    assert conn.sentencias == ["SAVEPOINT", "PREPARE", "RELEASE", "EXECUTE"]
+    assert (conn.commits, conn.rollbacks) == (0, 0)
+
+
+def test_primaria_ya_preparada_vuelve_al_savepoint():
+    registro = RegistroSentencias(preparar=True)
+    conn = ConexionFalsa(estado=TRANSACTION_STATUS_INTRANS, preparadas={SENTENCIA.nombre})
+    registro.ejecutar(conn.cursor(), SENTENCIA, (1, 5))
+    assert conn.sentencias == ["SAVEPOINT", "ROLLBACK", "EXECUTE"]
+    assert (conn.commits, conn.rollbacks) == (0, 0)
+
+
+def test_transaccion_fallida_usa_el_texto_plano():
+    registro = RegistroSentencias(preparar=True)
+    conn = ConexionFalsa(estado=TRANSACTION_STATUS_INERROR)
+    registro.ejecutar(conn.cursor(), SENTENCIA, (1, 5))
+    assert conn.sentencias == ["SELECT"]
@@ -0,0 +1,91 @@
+"""
+Trabajos en segundo plano para exportaciones pesadas (Excel, PDFs en lote,
+tablas en alta resolución).
+
+Un solo GestorTrabajos por proceso (app_movil lo crea con st.cache_resource):
+    - ejecuta en un pool de hilos, sin bloquear el rerun del vendedor
+    - deduplica por clave: pedir lo mismo mientras corre (o ya está listo) devuelve el mismo trabajo
+    - expone progreso (0..1 + mensaje) y el resultado
+    - guarda los resultados terminados solo durante `retencion_s`
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EN_COLA, CORRIENDO, LISTO, ERROR = "en_cola", "corriendo", "listo", "error"
+
+
+class Trabajo:
+    def __init__(self, clave, descripcion):
+        self.clave = clave
+        self.descripcion = descripcion
+        self.estado = EN_COLA
+        self.progreso = 0.0
+        self.mensaje = "En cola..."
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.terminado = None
+
+    @property
+    def pendiente(self):
+        return self.estado in (EN_COLA, CORRIENDO)
+
+    def avance(self, fraccion, mensaje=None):
+        """Callback que recibe la función del trabajo para reportar progreso"""
+        self.progreso = max(0.0, min(1.0, float(fraccion)))
+        if mensaje: self.mensaje = mensaje
+
+
+class GestorTrabajos:
+    def __init__(self, max_hilos=2, retencion_s=900, max_trabajos=50):
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="trabajo")
+        self._trabajos = {}
+        self._candado = threading.Lock()
+        self.retencion_s = retencion_s
+        self.max_trabajos = max_trabajos
+
+    def enviar(self, clave, descripcion, fn, *args, **kwargs):
+        """
+        Encola fn(*args, avance=..., **kwargs). Si ya hay un trabajo con la misma
+        clave pendiente o terminado (y vigente), lo devuelve sin repetir el cálculo.
+        """
+        with self._candado:
+            self._limpiar()
+            existente = self._trabajos.get(clave)
+            if existente and existente.estado != ERROR:
+                return existente
+            trabajo = Trabajo(clave, descripcion)
+            self._trabajos[clave] = trabajo
+        self._pool.submit(self._ejecutar, trabajo, fn, args, kwargs)
+        return trabajo
+
+    def obtener(self, clave):
+        with self._candado:
+            self._limpiar()
+            return self._trabajos.get(clave)
+
+    def _ejecutar(self, trabajo, fn, args, kwargs):
+        trabajo.estado = CORRIENDO
+        trabajo.mensaje = "Procesando..."
+        try:
+            trabajo.resultado = fn(*args, avance=trabajo.avance, **kwargs)
+            trabajo.progreso = 1.0
+            trabajo.mensaje = "Listo"
+            trabajo.estado = LISTO
+        except Exception as e:
+            trabajo.error = str(e)
+            trabajo.mensaje = f"Error: {e}"
+            trabajo.estado = ERROR
+        finally:
+            trabajo.terminado = time.time()
+
+    def _limpiar(self):
+        """Descarta resultados vencidos y, si sobran, los terminados más viejos"""
+        ahora = time.time()
+        for clave, t in list(self._trabajos.items()):
+            if t.terminado and ahora - t.terminado > self.retencion_s:
+                del self._trabajos[clave]
+        terminados = sorted((t for t in self._trabajos.values() if not t.pendiente), key=lambda t: t.terminado)
+        for t in terminados[:max(0, len(self._trabajos) - self.max_trabajos)]:
+            del self._trabajos[t.clave]